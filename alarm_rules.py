@@ -0,0 +1,125 @@
+import time
+
+TEMP = 'Temp'
+SIGNAL_STRENGTH = 'Signal Strength'
+
+# the one definition of these levels, the dashboards colour temperatures
+# with them and event detection and the offline tools count against them
+TEMP_THRESHOLDS = [68, 75, 85]
+# a weapon spins up at SPIN_UP_RPM and has spun down below SPIN_DOWN_RPM
+SPIN_UP_RPM = 2000
+SPIN_DOWN_RPM = 500
+
+
+class AlarmLevel():
+    def __init__(self, name, threshold=None, color=None, alert=False):
+        self.name = name
+        self.threshold = threshold
+        # None means the widget's normal look
+        self.color = color
+        # audible/visual alert when this level is entered from below
+        self.alert = alert
+
+    def get_label_style(self):
+        return 'color: black;' if self.color == None else f"background-color: {self.color};"
+
+
+class AlarmRule():
+    def __init__(self, levels: list[AlarmLevel], below=False, hysteresis=0, debounce=0):
+        # levels[0] is normal, the rest are in increasing severity and are
+        # entered when the value reaches their threshold (or drops below it)
+        self.levels = levels
+        self.below = below
+        # a level is only left once the value is hysteresis past its threshold
+        self.hysteresis = hysteresis
+        # a new level has to hold for debounce seconds before it is applied
+        self.debounce = debounce
+        self.actions = []
+        self.reset()
+
+    def reset(self):
+        self.level_index = 0
+        self.pending_index = None
+        self.pending_since = None
+
+    def get_level(self):
+        return self.levels[self.level_index]
+
+    def add_action(self, action):
+        # called with (new level, escalated) on every transition
+        self.actions.append(action)
+
+    def is_past(self, value, threshold, margin=0):
+        return value - margin < threshold if self.below else value + margin >= threshold
+
+    def get_level_index(self, value):
+        level_index = 0
+        for index, level in enumerate(self.levels[1:], 1):
+            if self.is_past(value, level.threshold):
+                level_index = index
+        if level_index < self.level_index:
+            # stay at the current level until the value clears the hysteresis
+            for index in range(self.level_index, level_index, -1):
+                if self.is_past(value, self.levels[index].threshold, self.hysteresis):
+                    return index
+        return level_index
+
+    def evaluate(self, value, now=None):
+        # returns the new level on a transition, otherwise None
+        if value == None:
+            return None
+        now = time.monotonic() if now == None else now
+
+        level_index = self.get_level_index(value)
+        if level_index == self.level_index:
+            self.pending_index = None
+            return None
+
+        # the debounce timer keeps running while the value stays on the same
+        # side of the current level, e.g. climbing from Hot to Overheating
+        escalating = level_index > self.level_index
+        if self.pending_index == None or escalating != (self.pending_index > self.level_index):
+            self.pending_since = now
+        self.pending_index = level_index
+        if now - self.pending_since < self.debounce:
+            return None
+
+        self.level_index = level_index
+        self.pending_index = None
+        for action in self.actions:
+            action(self.get_level(), escalating)
+        return self.get_level()
+
+
+# shared by telemetry_bars and telemetry_graphs
+ALARM_RULES = {
+    TEMP: {
+        'levels': [
+            AlarmLevel('Normal'),
+            AlarmLevel('Warm', TEMP_THRESHOLDS[0], 'yellow'),
+            AlarmLevel('Hot', TEMP_THRESHOLDS[1], 'orange'),
+            AlarmLevel('Overheating', TEMP_THRESHOLDS[2], 'red', alert=True),
+        ],
+        'hysteresis': 2,
+        'debounce': 0.2,
+    },
+    SIGNAL_STRENGTH: {
+        'levels': [
+            AlarmLevel('Normal'),
+            AlarmLevel('Weak', -70, 'yellow'),
+            AlarmLevel('Poor', -80, 'orange'),
+            AlarmLevel('Losing link', -90, 'red', alert=True),
+        ],
+        'below': True,
+        'hysteresis': 3,
+        'debounce': 0.5,
+    },
+}
+
+
+def create_alarm_rule(measurement_name, rules=ALARM_RULES):
+    config = rules.get(measurement_name)
+    if config == None:
+        return None
+    return AlarmRule(config['levels'], config.get('below', False),
+                     config.get('hysteresis', 0), config.get('debounce', 0))
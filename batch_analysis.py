@@ -0,0 +1,207 @@
+import argparse
+import csv
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from session_files import load_session, find_session_files
+from alarm_rules import TEMP_THRESHOLDS, SPIN_UP_RPM, SPIN_DOWN_RPM
+from event_detection import ThresholdDetector
+
+TEMP = 'Temp'
+RPM = 'RPM'
+CURRENT = 'Current'
+
+SUMMARY_HEADERS = ['Session', 'ESC', 'Measurement', 'Samples', 'Peak', 'Mean', 'P95'] + \
+    [f"Seconds above {threshold}" for threshold in TEMP_THRESHOLDS] + \
+    ['Spin ups', 'Consumption (mAh)']
+
+
+def get_interval_seconds(times):
+    # each sample holds until the next one arrives
+    return np.diff(times, append=times[-1]) if len(times) > 0 else times
+
+
+def integrate_consumption(times, current):
+    present = ~np.isnan(current)
+    if present.sum() < 2:
+        return 0.0
+    current, times = current[present], times[present]
+    amp_seconds = np.sum((current[1:] + current[:-1]) / 2 * np.diff(times))
+    return float(amp_seconds * 1000 / 3600)
+
+
+def summarize_channel(times, values, measurement):
+    present = ~np.isnan(values)
+    present_values = values[present]
+    if len(present_values) == 0:
+        return None
+
+    summary = {
+        'Samples': len(present_values),
+        'Peak': float(present_values.max()),
+        'Mean': float(present_values.mean()),
+        'P95': float(np.percentile(present_values, 95)),
+    }
+    if measurement == TEMP:
+        intervals = get_interval_seconds(times)[present]
+        for threshold in TEMP_THRESHOLDS:
+            summary[f"Seconds above {threshold}"] = float(
+                intervals[present_values >= threshold].sum())
+    elif measurement == RPM:
+        # the same detector the dashboards' event engine uses
+        detector = ThresholdDetector('Spin up', SPIN_UP_RPM, SPIN_DOWN_RPM)
+        summary['Spin ups'] = len(detector.update(
+            None, 0, times[present], present_values))
+    elif measurement == CURRENT:
+        summary['Consumption (mAh)'] = integrate_consumption(times, values)
+    return summary
+
+
+def analyze_session(file_name):
+    session = load_session(file_name)
+    channel_summaries = {}
+    channel_values = {}
+    for (esc, measurement), values in session.channels.items():
+        summary = summarize_channel(session.times, values, measurement)
+        if summary != None:
+            channel_summaries[(esc, measurement)] = summary
+            # returned for the exact aggregate percentiles
+            channel_values[(esc, measurement)] = values[~np.isnan(
+                values)].astype(np.float32)
+
+    return {
+        'name': session.name,
+        'layout': session.layout,
+        'start_time': session.get_start_time(),
+        'duration': session.get_duration(),
+        'num_rows': len(session),
+        'consumption': sum(summary.get('Consumption (mAh)', 0)
+                           for summary in channel_summaries.values()),
+        'channels': channel_summaries,
+        'values': channel_values,
+    }
+
+
+def aggregate_results(results):
+    aggregate = {}
+    all_values = {}
+    for result in results:
+        for channel, summary in result['channels'].items():
+            if not channel in aggregate:
+                aggregate[channel] = {header: 0 for header in SUMMARY_HEADERS[3:]
+                                      if header in summary or header == 'Samples'}
+                aggregate[channel]['Peak'] = summary['Peak']
+                all_values[channel] = []
+            channel_aggregate = aggregate[channel]
+            channel_aggregate['Peak'] = max(
+                channel_aggregate['Peak'], summary['Peak'])
+            for header, value in summary.items():
+                if not header in ['Peak', 'Mean', 'P95']:
+                    channel_aggregate[header] = channel_aggregate.get(
+                        header, 0) + value
+            all_values[channel].append(result['values'][channel])
+
+    for channel, values in all_values.items():
+        values = np.concatenate(values)
+        aggregate[channel]['Mean'] = float(values.mean())
+        aggregate[channel]['P95'] = float(np.percentile(values, 95))
+    return aggregate
+
+
+def format_cell(value):
+    if value == None:
+        return ''
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def get_summary_rows(results, aggregate):
+    rows = []
+    for result in results:
+        for (esc, measurement), summary in result['channels'].items():
+            rows.append([result['name'], esc or '', measurement] +
+                        [format_cell(summary.get(header)) for header in SUMMARY_HEADERS[3:]])
+    for (esc, measurement), summary in aggregate.items():
+        rows.append(['ALL', esc or '', measurement] +
+                    [format_cell(summary.get(header)) for header in SUMMARY_HEADERS[3:]])
+    return rows
+
+
+def write_html_report(file_name, results, aggregate, rows):
+    def table(headers, table_rows):
+        header_html = ''.join(
+            f"<th>{html.escape(str(header))}</th>" for header in headers)
+        rows_html = ''.join(
+            '<tr>' + ''.join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + '</tr>'
+            for row in table_rows)
+        return f"<table><tr>{header_html}</tr>{rows_html}</table>"
+
+    session_rows = [[result['name'], result['layout'], result['start_time'],
+                     round(result['duration'], 1), result['num_rows'],
+                     round(result['consumption'], 1)] for result in results]
+    total_consumption = sum(result['consumption'] for result in results)
+    total_duration = sum(result['duration'] for result in results)
+
+    with open(file_name, 'w', encoding='utf-8') as html_file:
+        html_file.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Telemetry batch summary</title>
+<style>
+body {{ font-family: Bahnschrift, sans-serif; }}
+table {{ border-collapse: collapse; margin-bottom: 24px; }}
+th, td {{ border: 1px solid #cccccc; padding: 4px 8px; text-align: right; }}
+th {{ background-color: #eeeeee; }}
+</style>
+</head>
+<body>
+<h1>Telemetry batch summary</h1>
+<p>{len(results)} sessions, {round(total_duration / 60, 1)} minutes,
+{round(total_consumption, 1)} mAh integrated from current</p>
+<h2>Sessions</h2>
+{table(['Session', 'Layout', 'Start', 'Seconds', 'Rows', 'Consumption (mAh)'], session_rows)}
+<h2>All sessions</h2>
+{table(SUMMARY_HEADERS, [row for row in rows if row[0] == 'ALL'])}
+<h2>Per session</h2>
+{table(SUMMARY_HEADERS, [row for row in rows if row[0] != 'ALL'])}
+</body>
+</html>
+""")
+
+
+def run_batch(paths, output_dir='.', workers=None):
+    file_names = find_session_files(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(analyze_session, file_names))
+    results.sort(key=lambda result: result['start_time'] or datetime.min)
+
+    aggregate = aggregate_results(results)
+    rows = get_summary_rows(results, aggregate)
+
+    now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+    csv_file_name = os.path.join(output_dir, f"batch_summary_{now}.csv")
+    with open(csv_file_name, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(SUMMARY_HEADERS)
+        writer.writerows(rows)
+
+    html_file_name = os.path.join(output_dir, f"batch_summary_{now}.html")
+    write_html_report(html_file_name, results, aggregate, rows)
+    return csv_file_name, html_file_name
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Summarize a directory of exported telemetry sessions')
+    parser.add_argument('paths', nargs='*', default=['.'])
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--workers', type=int,
+                        help='defaults to one process per core')
+    args = parser.parse_args()
+
+    for file_name in run_batch(args.paths, args.output_dir, args.workers):
+        print(f"wrote {file_name}")
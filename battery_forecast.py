@@ -0,0 +1,125 @@
+from collections import deque
+
+# sums are rebuilt from the window this often to stop rounding drift
+RECOMPUTE_EVERY = 1000
+
+
+class SlidingRegression():
+    # least squares line over the last window_seconds, O(1) amortized per sample
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.reset()
+
+    def reset(self):
+        self.samples = deque()
+        self.origin = None
+        self.sum_t = 0.0
+        self.sum_y = 0.0
+        self.sum_tt = 0.0
+        self.sum_ty = 0.0
+        self.num_updates = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, t, y):
+        if self.origin == None:
+            self.origin = t
+        self.samples.append((t, y))
+        self.add_to_sums(t - self.origin, y, 1)
+        while self.samples[0][0] < t - self.window_seconds:
+            old_t, old_y = self.samples.popleft()
+            self.add_to_sums(old_t - self.origin, old_y, -1)
+
+        self.num_updates += 1
+        if self.num_updates % RECOMPUTE_EVERY == 0:
+            self.recompute()
+
+    def add_to_sums(self, t, y, sign):
+        self.sum_t += sign * t
+        self.sum_y += sign * y
+        self.sum_tt += sign * t * t
+        self.sum_ty += sign * t * y
+
+    def recompute(self):
+        self.origin = self.samples[0][0]
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+        for t, y in self.samples:
+            self.add_to_sums(t - self.origin, y, 1)
+
+    def get_slope(self):
+        n = len(self.samples)
+        if n < 2:
+            return None
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 1e-9:
+            return None
+        return (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+    def get_value_at(self, t):
+        slope = self.get_slope()
+        if slope == None:
+            return self.samples[-1][1] if len(self.samples) > 0 else None
+        n = len(self.samples)
+        intercept = (self.sum_y - slope * self.sum_t) / n
+        return intercept + slope * (t - self.origin)
+
+
+class BatteryForecast():
+    def __init__(self, capacity, cutoff_voltage=None, consumption_window=30, voltage_window=10):
+        # capacity in mAh, cutoff_voltage is where the pack counts as empty
+        self.capacity = capacity
+        self.cutoff_voltage = cutoff_voltage
+        self.consumption = SlidingRegression(consumption_window)
+        self.voltage = SlidingRegression(voltage_window)
+        self.last_seconds = None
+        self.last_consumption = None
+
+    def reset(self):
+        self.consumption.reset()
+        self.voltage.reset()
+        self.last_seconds = None
+        self.last_consumption = None
+
+    def add_sample(self, seconds, consumption, voltage=None):
+        self.last_seconds = seconds
+        self.last_consumption = consumption
+        self.consumption.add(seconds, consumption)
+        if voltage != None:
+            self.voltage.add(seconds, voltage)
+
+    def get_consumption_rate(self):
+        # mAh per second
+        return self.consumption.get_slope()
+
+    def get_remaining_seconds(self):
+        # the earlier of running out of capacity and sagging to the cutoff
+        estimates = []
+        rate = self.get_consumption_rate()
+        if rate != None and rate > 1e-6:
+            estimates.append(
+                max(self.capacity - self.last_consumption, 0) / rate)
+
+        sag = self.voltage.get_slope()
+        if self.cutoff_voltage != None and sag != None and sag < -1e-6:
+            voltage = self.voltage.get_value_at(self.last_seconds)
+            estimates.append(max(voltage - self.cutoff_voltage, 0) / -sag)
+
+        return min(estimates) if len(estimates) > 0 else None
+
+    def get_empty_time(self):
+        # seconds from start at which the battery is predicted to be empty
+        remaining = self.get_remaining_seconds()
+        return None if remaining == None else self.last_seconds + remaining
+
+    def get_window_samples(self):
+        return list(self.consumption.samples)
+
+
+def format_remaining(seconds):
+    if seconds == None:
+        return '--:--'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
@@ -0,0 +1,65 @@
+from array import array
+
+import numpy as np
+
+from run_length import RunLengthValues
+
+
+class Calibration():
+    # value = count * scale + offset, rounded to decimals (ints for 0).
+    # calibrations are replaced rather than changed, so a snapshot holding
+    # one keeps the values it was taken with.
+    def __init__(self, scale=1.0, offset=0.0, decimals=0):
+        self.scale = scale
+        self.offset = offset
+        self.decimals = decimals
+
+    def apply(self, counts):
+        # many counts at once, as a list
+        values = np.asarray(counts, dtype=float) * self.scale + self.offset
+        if self.decimals == 0:
+            return np.rint(values).astype(np.int64).tolist()
+        return np.round(values, self.decimals).tolist()
+
+    def apply_value(self, count):
+        value = count * self.scale + self.offset
+        if self.decimals == 0:
+            return round(value)
+        return round(value, self.decimals)
+
+    def to_raw(self, value):
+        return round((value - self.offset) / self.scale)
+
+
+class CalibratedValues():
+    # raw integer counts (an array, or RunLengthValues for slow channels),
+    # read back as calibrated values. the calibration can be swapped at any
+    # time and every later read uses it.
+    def __init__(self, calibration: Calibration, counts):
+        self.calibration = calibration
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def append(self, count):
+        self.counts.append(count)
+
+    def extend(self, counts):
+        self.counts.extend(counts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.calibration.apply(self.counts[index])
+        return self.calibration.apply_value(self.counts[index])
+
+    def __iter__(self):
+        return iter(self.calibration.apply(self.counts[:]))
+
+    def __delitem__(self, index):
+        del self.counts[index]
+
+    def copy(self):
+        if isinstance(self.counts, RunLengthValues):
+            return CalibratedValues(self.calibration, self.counts.copy())
+        return CalibratedValues(self.calibration, array(self.counts.typecode, self.counts))
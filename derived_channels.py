@@ -0,0 +1,42 @@
+import numpy as np
+
+# special input giving the seconds since the previous sample
+INTERVAL = 'Interval'
+
+
+class DerivedChannel():
+    def __init__(self, inputs, expression, accumulate=False, chunk_size=256, decimals=2):
+        # inputs are measurement names (same ESC, or the robot for robot level
+        # channels), (esc name, measurement name) tuples, or INTERVAL
+        self.inputs = inputs
+        self.expression = expression
+        # accumulated channels sum the expression over time, e.g. energy
+        self.accumulate = accumulate
+        self.chunk_size = chunk_size
+        self.decimals = decimals
+        self.carry = 0.0
+
+    def evaluate(self, input_values):
+        # input_values are the new samples of every input, all the same length
+        num_values = len(input_values[0]) if len(input_values) > 0 else 0
+        results = []
+        for start in range(0, num_values, self.chunk_size):
+            stop = min(start + self.chunk_size, num_values)
+            arrays = [np.asarray(values[start:stop], dtype=float)
+                      for values in input_values]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                chunk = np.broadcast_to(
+                    np.asarray(self.expression(*arrays), dtype=float), (stop - start,))
+            chunk = np.nan_to_num(chunk, nan=0.0, posinf=0.0, neginf=0.0)
+            if self.accumulate:
+                chunk = np.cumsum(chunk) + self.carry
+                self.carry = float(chunk[-1])
+            results.append(np.round(chunk, self.decimals))
+        return np.concatenate(results).tolist() if len(results) > 0 else []
+
+    def reset(self):
+        self.carry = 0.0
+
+
+def rpm_per_amp(rpm, current):
+    return np.where(current > 0, rpm / current, 0)
@@ -0,0 +1,249 @@
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from session_files import load_session, find_session_files
+from alarm_rules import SPIN_UP_RPM, SPIN_DOWN_RPM
+
+EVENT_HEADERS = ['Timestamp', 'Seconds from start', 'Channel', 'Event', 'Value', 'Duration']
+
+
+class Event():
+    def __init__(self, name, channel, index, time, value):
+        self.name = name
+        self.channel = channel
+        # global sample index and seconds from start of the event
+        self.index = int(index)
+        self.time = float(time)
+        self.value = float(value)
+        self.end_time = None
+
+    def get_duration(self):
+        return None if self.end_time == None else self.end_time - self.time
+
+
+def get_channel_label(channel):
+    esc, measurement = channel
+    return measurement if esc == None else f"{esc} {measurement}"
+
+
+def forward_fill_indices(decided):
+    # index of the last position where decided was True, -1 before the first
+    indices = np.where(decided, np.arange(len(decided)), -1)
+    np.maximum.accumulate(indices, out=indices)
+    return indices
+
+
+class ThresholdDetector():
+    # enters at on_threshold and leaves at off_threshold, so a value hovering
+    # around one level does not fire repeatedly. on below off detects drops.
+    def __init__(self, name, on_threshold, off_threshold):
+        self.name = name
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.reset()
+
+    def reset(self):
+        self.state = 0.0
+        self.open_event = None
+
+    def update(self, channel, first_index, times, values):
+        if self.on_threshold >= self.off_threshold:
+            turn_on = values >= self.on_threshold
+            turn_off = values <= self.off_threshold
+        else:
+            turn_on = values <= self.on_threshold
+            turn_off = values >= self.off_threshold
+
+        state = np.where(turn_on, 1.0, np.where(turn_off, 0.0, np.nan))
+        decided = forward_fill_indices(~np.isnan(state))
+        state = np.where(decided >= 0, state[np.maximum(decided, 0)], self.state)
+
+        events = []
+        changes = np.flatnonzero(
+            np.diff(np.concatenate(([self.state], state))))
+        for i in changes:
+            if state[i] == 1:
+                self.open_event = Event(self.name, channel, first_index + i,
+                                        times[i], values[i])
+                events.append(self.open_event)
+            elif self.open_event != None:
+                self.open_event.end_time = times[i]
+                self.open_event = None
+        self.state = state[-1]
+        return events
+
+
+class DerivativeDetector():
+    # fires when the slope per second passes the threshold, negative
+    # thresholds detect drops. refractory seconds suppress repeats.
+    def __init__(self, name, threshold, refractory=0.5):
+        self.name = name
+        self.threshold = threshold
+        self.refractory = refractory
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.last_value = None
+        self.was_beyond = False
+        self.last_event_time = None
+
+    def update(self, channel, first_index, times, values):
+        if self.last_time == None:
+            self.last_time, self.last_value = times[0], values[0]
+        all_times = np.concatenate(([self.last_time], times))
+        all_values = np.concatenate(([self.last_value], values))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = np.diff(all_values) / np.diff(all_times)
+        slopes = np.nan_to_num(slopes, nan=0.0, posinf=0.0, neginf=0.0)
+        beyond = slopes >= self.threshold if self.threshold > 0 else slopes <= self.threshold
+
+        edges = np.flatnonzero(
+            beyond & ~np.concatenate(([self.was_beyond], beyond[:-1])))
+        events = []
+        for i in edges:
+            if self.last_event_time != None and times[i] - self.last_event_time < self.refractory:
+                continue
+            events.append(Event(self.name, channel, first_index + i,
+                                times[i], slopes[i]))
+            self.last_event_time = times[i]
+
+        self.last_time, self.last_value = times[-1], values[-1]
+        self.was_beyond = bool(beyond[-1])
+        return events
+
+
+class SustainedDetector():
+    # fires once the value has stayed past level for min_duration seconds
+    def __init__(self, name, level, min_duration, below=True):
+        self.name = name
+        self.level = level
+        self.min_duration = min_duration
+        self.below = below
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.run_start = None
+        self.reached = False
+        self.open_event = None
+
+    def update(self, channel, first_index, times, values):
+        condition = values <= self.level if self.below else values >= self.level
+        previous = np.concatenate(([self.active], condition[:-1]))
+        starts = condition & ~previous
+
+        started = forward_fill_indices(starts)
+        run_starts = np.where(started >= 0, times[np.maximum(started, 0)],
+                              self.run_start if self.run_start != None else np.nan)
+        reached = condition & (times - run_starts >= self.min_duration)
+        previous_reached = np.concatenate(([self.reached], reached[:-1]))
+        # a run keeps "reached" until it ends, so the first True of each run fires
+        first_reached = np.flatnonzero(reached & ~(previous_reached & ~starts))
+        ends = np.flatnonzero(previous & ~condition)
+
+        events = []
+        for i in np.sort(np.concatenate((first_reached, ends))):
+            if condition[i]:
+                self.open_event = Event(self.name, channel, first_index + i,
+                                        run_starts[i], values[i])
+                events.append(self.open_event)
+            elif self.open_event != None:
+                self.open_event.end_time = times[i]
+                self.open_event = None
+
+        self.active = bool(condition[-1])
+        self.run_start = run_starts[-1] if self.active else None
+        self.reached = bool(reached[-1])
+        return events
+
+
+def get_default_rules():
+    return {
+        ('Weapon ESC', 'RPM'): [
+            ThresholdDetector('Spin up', SPIN_UP_RPM, SPIN_DOWN_RPM),
+            DerivativeDetector('Hit (RPM drop)', -20000),
+        ],
+        ('Weapon ESC', 'Current'): [
+            DerivativeDetector('Hit (current spike)', 400),
+        ],
+        ('Arm ESC', 'RPM'): [
+            ThresholdDetector('Spin up', SPIN_UP_RPM, SPIN_DOWN_RPM),
+        ],
+        (None, 'Battery Voltage'): [
+            SustainedDetector('Brownout', 18, 0.2),
+        ],
+    }
+
+
+class EventEngine():
+    def __init__(self, rules=None):
+        self.rules = rules if rules != None else get_default_rules()
+        self.events: list[Event] = []
+        # global number of samples already seen per channel
+        self.processed = {channel: 0 for channel in self.rules}
+
+    def update(self, channel, first_index, times, values):
+        # only the samples from first_index on that were not seen yet are used
+        skip = self.processed[channel] - first_index
+        if skip > 0:
+            times, values = times[skip:], values[skip:]
+            first_index += skip
+        if len(values) == 0:
+            return []
+
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        new_events = []
+        for detector in self.rules[channel]:
+            new_events.extend(detector.update(
+                channel, first_index, times, values))
+        self.processed[channel] = first_index + len(values)
+        self.events.extend(new_events)
+        return new_events
+
+    def reset(self):
+        for detectors in self.rules.values():
+            for detector in detectors:
+                detector.reset()
+        self.events = []
+        self.processed = {channel: 0 for channel in self.rules}
+
+    def get_event_rows(self, start_time):
+        rows = []
+        for event in sorted(self.events, key=lambda event: event.time):
+            timestamp = start_time.timestamp() + event.time
+            rows.append([timestamp, round(event.time, 3), get_channel_label(event.channel),
+                         event.name, round(float(event.value), 2),
+                         '' if event.get_duration() == None else round(event.get_duration(), 3)])
+        return rows
+
+
+def detect_session_events(session, rules=None):
+    engine = EventEngine(rules)
+    seconds = session.get_seconds()
+    for channel in engine.rules:
+        values = session.get_channel(channel[1], channel[0])
+        if values is None:
+            continue
+        present = ~np.isnan(values)
+        engine.update(channel, 0, seconds[present], values[present])
+    return engine
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Detect spin ups, hits and brownouts in exported sessions')
+    parser.add_argument('paths', nargs='*', default=['.'])
+    args = parser.parse_args()
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['Session'] + EVENT_HEADERS[1:])
+    for file_name in find_session_files(args.paths):
+        session = load_session(file_name)
+        engine = detect_session_events(session)
+        for row in engine.get_event_rows(session.get_start_time()):
+            writer.writerow([session.name] + row[1:])
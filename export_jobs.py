@@ -0,0 +1,305 @@
+import csv
+import io
+import math
+import os
+import sqlite3
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, zip_longest
+
+import numpy as np
+
+from retention import SegmentSnapshot, RawSnapshot
+from tracing import traced
+
+CSV = 'csv'
+# the CSV layout with a cell only where the value changed from the row above
+CHANGES = 'changes'
+NPZ = 'npz'
+RAW = 'raw'
+FORMATS = [CSV, CHANGES, NPZ, RAW]
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# progress is reported every this many rows
+PROGRESS_ROWS = 4096
+
+
+class ExportSnapshot():
+    # everything an export needs, taken on the GUI thread so the job never
+    # touches live data. columns are copies (lists, RunLengthValues or
+    # CalibratedValues, which are expanded as rows are written), spill and raw
+    # are snapshots. calibrations turn the raw counts in spilled rows into
+    # values, None for columns spilled as they are.
+    def __init__(self, file_name, start_time, headers, timestamps, columns,
+                 spill: SegmentSnapshot = None, missing_value=-1, calibrations=None):
+        self.file_name = file_name
+        self.start_time = start_time
+        self.headers = headers
+        self.timestamps = timestamps
+        self.columns = columns
+        self.spill = spill
+        self.missing_value = missing_value
+        self.calibrations = calibrations if calibrations != None else [None] * len(headers)
+
+        # global rows [first_row, stop_row) are exported, e.g. one segment
+        self.first_row = 0
+        self.stop_row = None
+
+        self.event_rows = None
+        self.segment_rows = None
+        self.latency = None
+        self.link_quality = None
+        self.connection_rows = None
+        self.memory_rows = None
+        self.raw_spill: RawSnapshot = None
+        self.raw_lines = []
+        self.session_store = None
+
+    def set_raw(self, raw_spill, raw_lines):
+        self.raw_spill = raw_spill
+        self.raw_lines = raw_lines
+
+    def set_row_range(self, first_row, stop_row):
+        self.first_row = first_row
+        self.stop_row = stop_row
+
+    def get_row_range(self):
+        num_spilled = len(self.spill) if self.spill != None else 0
+        total_rows = num_spilled + len(self.timestamps)
+        stop_row = total_rows if self.stop_row == None else min(self.stop_row, total_rows)
+        return min(self.first_row, stop_row), stop_row, num_spilled
+
+    def get_num_rows(self):
+        first_row, stop_row, _ = self.get_row_range()
+        return stop_row - first_row
+
+    def get_rows(self):
+        # (timestamp, values) for the spilled rows, then the hot ones
+        first_row, stop_row, num_spilled = self.get_row_range()
+        num_columns = len(self.headers)
+        if self.spill != None and first_row < num_spilled:
+            for timestamp, values in self.spill.read_rows(first_row, stop_row):
+                yield timestamp, [None if math.isnan(value) else
+                                  calibration.apply_value(value) if calibration != None else
+                                  int(value) if value.is_integer() else value
+                                  for value, calibration in zip(values[:num_columns], self.calibrations)]
+        hot_rows = zip(self.timestamps, zip_longest(*self.columns))
+        for timestamp, values in islice(hot_rows, max(first_row - num_spilled, 0),
+                                        max(stop_row - num_spilled, 0)):
+            # whole numbers are written as ints, like the spilled rows, also
+            # when run length storage keeps them as doubles
+            yield timestamp, [int(value) if isinstance(value, float) and value.is_integer()
+                              else value for value in values]
+
+    def release(self):
+        if self.spill != None:
+            self.spill.close()
+        if self.raw_spill != None:
+            self.raw_spill.close()
+        # finished jobs stay in the queue for their status, not their data
+        self.timestamps = []
+        self.columns = []
+        self.raw_lines = []
+
+
+class ExportJob():
+    def __init__(self, snapshot: ExportSnapshot, formats):
+        self.snapshot = snapshot
+        self.formats = formats
+        self.status = QUEUED
+        # fraction of rows written over all formats
+        self.progress = 0.0
+        self.file_names = []
+        self.error = None
+
+    def get_status_text(self):
+        if self.status == RUNNING:
+            return f"Exporting {round(self.progress * 100)}%"
+        if self.status == FAILED:
+            return f"Export failed: {self.error}"
+        if self.status == DONE:
+            return f"Saved {self.file_names[0] if len(self.file_names) > 0 else self.snapshot.file_name}"
+        return "Export queued"
+
+    @traced('ExportJob.run')
+    def run(self):
+        self.status = RUNNING
+        try:
+            writers = {CSV: self.write_csv, CHANGES: self.write_changes,
+                       NPZ: self.write_npz, RAW: self.write_raw}
+            for index, export_format in enumerate(self.formats):
+                writers[export_format](index)
+            self.status = DONE
+        except Exception as error:
+            self.error = error
+            self.status = FAILED
+            print(f"EXPORT FAILED {self.snapshot.file_name}: {error}")
+        finally:
+            self.snapshot.release()
+        return self
+
+    def set_progress(self, format_index, fraction):
+        self.progress = (format_index + fraction) / len(self.formats)
+
+    def get_csv_row(self, timestamp, values):
+        snapshot = self.snapshot
+        seconds_since_start = round(
+            (timestamp - snapshot.start_time).total_seconds(), 3)
+        return [timestamp.strftime('%H_%M_%S_%f'), seconds_since_start] + [
+            snapshot.missing_value if value == None else value for value in values]
+
+    def write_csv(self, format_index):
+        snapshot = self.snapshot
+        num_rows = max(snapshot.get_num_rows(), 1)
+        with open(snapshot.file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['Timestamp', 'Seconds from start'] + snapshot.headers)
+            for i, (timestamp, values) in enumerate(snapshot.get_rows()):
+                writer.writerow(self.get_csv_row(timestamp, values))
+                if i % PROGRESS_ROWS == 0:
+                    self.set_progress(format_index, i / num_rows)
+        self.file_names.append(snapshot.file_name)
+
+        if snapshot.event_rows != None:
+            events_file_name = snapshot.file_name.replace('.csv', '_events.csv')
+            with open(events_file_name, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerows(snapshot.event_rows)
+            self.file_names.append(events_file_name)
+
+        if snapshot.segment_rows != None:
+            segments_file_name = snapshot.file_name.replace('.csv', '_segments.csv')
+            with open(segments_file_name, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerows(snapshot.segment_rows)
+            self.file_names.append(segments_file_name)
+
+        if snapshot.latency != None:
+            latency_file_name = snapshot.file_name.replace('.csv', '_latency.csv')
+            snapshot.latency.export_csv(latency_file_name)
+            self.file_names.append(latency_file_name)
+
+        if snapshot.memory_rows != None:
+            memory_file_name = snapshot.file_name.replace('.csv', '_memory.csv')
+            with open(memory_file_name, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerows(snapshot.memory_rows)
+            self.file_names.append(memory_file_name)
+
+        if snapshot.link_quality != None:
+            link_file_name = snapshot.file_name.replace('.csv', '_link.csv')
+            snapshot.link_quality.export_csv(link_file_name)
+            if snapshot.connection_rows != None:
+                with open(link_file_name, "a", newline="") as csv_file:
+                    writer = csv.writer(csv_file)
+                    writer.writerow([])
+                    writer.writerows(snapshot.connection_rows)
+            self.file_names.append(link_file_name)
+
+        if snapshot.session_store != None:
+            try:
+                snapshot.session_store.add_session(snapshot.file_name)
+            except (sqlite3.Error, ValueError) as error:
+                print(f"COULD NOT INDEX {snapshot.file_name}: {error}")
+
+    def write_changes(self, format_index):
+        # an empty cell repeats the one above it, so constant and slowly
+        # varying columns cost a comma per row. only for snapshots whose
+        # missing values are written as a value, e.g. -1
+        snapshot = self.snapshot
+        num_rows = max(snapshot.get_num_rows(), 1)
+        file_name = snapshot.file_name.replace('.csv', '_changes.csv')
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['Timestamp', 'Seconds from start'] + snapshot.headers)
+            previous = None
+            for i, (timestamp, values) in enumerate(snapshot.get_rows()):
+                row = self.get_csv_row(timestamp, values)
+                cells = row[2:]
+                if previous != None:
+                    row[2:] = ['' if cell == last_cell else cell
+                               for cell, last_cell in zip(cells, previous)]
+                previous = cells
+                writer.writerow(row)
+                if i % PROGRESS_ROWS == 0:
+                    self.set_progress(format_index, i / num_rows)
+        self.file_names.append(file_name)
+
+    def write_npz(self, format_index):
+        # one float64 array per column with NaN for missing samples and unix
+        # timestamps, so sessions load without parsing strings. the rows are
+        # written PROGRESS_ROWS at a time into one .npy file per column in a
+        # temporary directory, which are then deflated into the npz one
+        # after the other, so a long session never has to fit in memory
+        snapshot = self.snapshot
+        num_rows = snapshot.get_num_rows()
+        num_columns = len(snapshot.headers)
+        file_name = snapshot.file_name.replace('.csv', '.npz')
+        with tempfile.TemporaryDirectory() as directory:
+            names = ['timestamps'] + snapshot.headers
+            file_names = [os.path.join(directory, f"{i}.npy") for i in range(len(names))]
+            arrays = [np.lib.format.open_memmap(name, 'w+', np.float64, (num_rows,))
+                      for name in file_names]
+            chunk = np.full((num_columns + 1, PROGRESS_ROWS), np.nan)
+            chunk_start = 0
+            for i, (timestamp, values) in enumerate(snapshot.get_rows()):
+                row = i - chunk_start
+                chunk[0, row] = timestamp.timestamp()
+                chunk[1:, row] = [math.nan if value == None else value for value in values]
+                if row + 1 == PROGRESS_ROWS:
+                    for column, array in zip(chunk, arrays):
+                        array[chunk_start:i + 1] = column
+                    chunk_start = i + 1
+                    chunk.fill(np.nan)
+                    self.set_progress(format_index, i / max(num_rows, 1) / 2)
+            for column, array in zip(chunk, arrays):
+                array[chunk_start:] = column[:num_rows - chunk_start]
+                array.flush()
+            del arrays
+
+            with zipfile.ZipFile(file_name, 'w', zipfile.ZIP_DEFLATED) as npz:
+                for i, (name, column_file_name) in enumerate(zip(names, file_names)):
+                    npz.write(column_file_name, name + '.npy')
+                    self.set_progress(format_index, 0.5 + i / len(names) / 2)
+                start_time = io.BytesIO()
+                np.save(start_time, np.float64(snapshot.start_time.timestamp()))
+                npz.writestr('start_time.npy', start_time.getvalue())
+        self.file_names.append(file_name)
+
+    def write_raw(self, format_index):
+        # streamed from the raw spill file, then the lines still in memory
+        snapshot = self.snapshot
+        file_name = snapshot.file_name.replace('.csv', '_raw.csv')
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            if snapshot.raw_spill != None:
+                for _, line in snapshot.raw_spill.read_lines():
+                    writer.writerow(line)
+            writer.writerows(snapshot.raw_lines)
+        self.file_names.append(file_name)
+
+
+class ExportQueue():
+    # one worker so exports are written in the order they were requested.
+    # pending jobs finish before the interpreter exits, after the window closed
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='ExportJob')
+        self.jobs: list[ExportJob] = []
+
+    def submit(self, snapshot, formats):
+        job = ExportJob(snapshot, formats)
+        self.jobs.append(job)
+        self.executor.submit(job.run)
+        return job
+
+    def get_latest_job(self):
+        return self.jobs[-1] if len(self.jobs) > 0 else None
+
+    def get_pending_jobs(self):
+        return [job for job in self.jobs if job.status in (QUEUED, RUNNING)]
@@ -0,0 +1,144 @@
+import argparse
+import random
+import re
+import time
+
+FRAME_START = b'Data:'
+NUM_FIELDS = 35
+NUM_ESC_BYTES = 34
+# anything longer without a newline is garbage, resync on the next frame start
+MAX_LINE_LENGTH = 512
+
+# "Data:" followed by the fields and an optional "*XX" xor checksum of
+# everything before the "*"
+FRAME_PATTERN = re.compile(
+    rb'Data:((?: +-?\d{1,3}){%d}) *(?:\*([0-9A-Fa-f]{2}))? *\r?$' % NUM_FIELDS)
+
+REASONS = ['no frame start', 'bad fields', 'out of range',
+           'bad checksum', 'missing checksum', 'too long']
+
+
+def get_checksum(payload):
+    checksum = 0
+    for byte in payload:
+        checksum ^= byte
+    return checksum
+
+
+def get_frame_values(match):
+    values = list(map(int, match.group(1).split()))
+    # ESC bytes are unsigned, signal strength is a signed byte
+    if min(values[:NUM_ESC_BYTES]) < 0 or max(values[:NUM_ESC_BYTES]) > 255 \
+            or not -128 <= values[NUM_ESC_BYTES] <= 127:
+        return None
+    return values
+
+
+def parse_frame(line):
+    # values of a valid "Data:" line, None for anything else
+    if isinstance(line, str):
+        line = line.encode('ascii', 'replace')
+    start = line.rfind(FRAME_START)
+    if start == -1:
+        return None
+    match = FRAME_PATTERN.match(line, start)
+    return get_frame_values(match) if match else None
+
+
+class FrameParser():
+    def __init__(self, require_checksum=False, log_every=100):
+        self.require_checksum = require_checksum
+        self.log_every = log_every
+        self.buffer = bytearray()
+        self.stats = {'frames': 0, 'rejected': 0, 'garbage bytes': 0}
+        self.stats.update({reason: 0 for reason in REASONS})
+
+    def feed(self, data):
+        # (line text, values) for every complete line, values is None for
+        # rejected lines. partial lines wait for the next call.
+        self.buffer += data
+        *lines, rest = self.buffer.split(b'\n')
+        self.buffer = bytearray(rest)
+        if len(self.buffer) > MAX_LINE_LENGTH:
+            start = self.buffer.rfind(FRAME_START)
+            dropped = start if start > 0 else len(self.buffer)
+            self.reject('too long', dropped)
+            del self.buffer[:dropped]
+
+        return [(line.decode('ascii', 'replace').strip(), self.parse_line(line))
+                for line in lines]
+
+    def parse_line(self, line):
+        # a frame cut short by a lost newline is followed by the next
+        # complete one, so the last frame start is the one to parse
+        start = line.rfind(FRAME_START)
+        if start == -1:
+            self.reject('no frame start', len(line))
+            return None
+        if start > 0:
+            self.stats['garbage bytes'] += start
+
+        match = FRAME_PATTERN.match(line, start)
+        if not match:
+            self.reject('bad fields', len(line) - start)
+            return None
+
+        checksum = match.group(2)
+        if checksum != None:
+            payload = line[start:match.start(2) - 1]
+            if get_checksum(payload.rstrip()) != int(checksum, 16):
+                self.reject('bad checksum', len(line) - start)
+                return None
+        elif self.require_checksum:
+            self.reject('missing checksum', len(line) - start)
+            return None
+
+        values = get_frame_values(match)
+        if values == None:
+            self.reject('out of range', len(line) - start)
+            return None
+        self.stats['frames'] += 1
+        return values
+
+    def reject(self, reason, num_bytes):
+        self.stats['rejected'] += 1
+        self.stats[reason] += 1
+        self.stats['garbage bytes'] += num_bytes
+        rejected = self.stats['rejected']
+        if self.log_every != None and (rejected <= 10 or rejected % self.log_every == 0):
+            print(f"REJECTED {reason} ({rejected} total)")
+
+
+def benchmark(num_frames=100000, garbage=0.3, chunk_size=4096, seed=0):
+    rand = random.Random(seed)
+    frame = b'Data: ' + b' '.join(str(rand.randint(0, 255)).encode()
+                                  for _ in range(NUM_ESC_BYTES)) + b' -70\r\n'
+    stream = bytearray()
+    for _ in range(num_frames):
+        if rand.random() < garbage:
+            stream += bytes(rand.randrange(256)
+                            for _ in range(rand.randint(1, 80)))
+            if rand.random() < 0.5:
+                stream += frame[:rand.randint(1, len(frame) - 2)]
+        stream += frame
+
+    parser = FrameParser(log_every=None)
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunk_size):
+        parser.feed(bytes(stream[offset:offset + chunk_size]))
+    elapsed = time.perf_counter() - start
+    return parser.stats, len(stream) / elapsed / 1e6, parser.stats['frames'] / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark frame parsing on a stream with garbage mixed in')
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--garbage', type=float, default=0.3,
+                        help='probability of garbage before each frame')
+    args = parser.parse_args()
+
+    stats, megabytes_per_second, frames_per_second = benchmark(
+        args.frames, args.garbage)
+    print(f"{round(megabytes_per_second, 1)} MB/s, {round(frames_per_second)} good frames/s")
+    print(stats)
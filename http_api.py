@@ -0,0 +1,333 @@
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from time_axis import PLOT_WINDOW_SECONDS
+
+# TELEMETRY_API=8080 serves on localhost, TELEMETRY_API=0.0.0.0:8080 on the LAN
+API_ENV = 'TELEMETRY_API'
+DEFAULT_HOST = '127.0.0.1'
+# range queries return at most this many points unless asked for fewer
+MAX_POINTS = 2000
+# cached responses kept before the oldest are dropped
+MAX_CACHED = 256
+
+
+def get_address(value, default_host=DEFAULT_HOST):
+    # "port" or "host:port"
+    host, _, port = value.rpartition(':')
+    return host or default_host, int(port)
+
+
+def decimate(xs, ys, max_points):
+    # min and max of each bucket so peaks survive, in time order
+    if len(xs) <= max_points:
+        return xs, ys
+    bucket_size = -(-len(xs) // (max_points // 2))
+    num_buckets = len(xs) // bucket_size
+    stop = num_buckets * bucket_size
+    buckets = ys[:stop].reshape(num_buckets, bucket_size)
+    offsets = np.arange(num_buckets) * bucket_size
+    low = offsets + buckets.argmin(axis=1)
+    high = offsets + buckets.argmax(axis=1)
+    indices = np.sort(np.concatenate([low, high, np.arange(stop, len(xs))]))
+    return xs[indices], ys[indices]
+
+
+class ChannelMirror():
+    # the API's copy of one measurement. new samples are appended when the GUI
+    # thread publishes and samples the robot spilled are dropped, older
+    # history comes from the measurement's min/max summary
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.seconds = array('d')
+        self.values = array('d')
+        self.summary_x = []
+        self.summary_values = []
+        # samples of the measurement copied so far, spilled ones included
+        self.num_samples = 0
+        # bumped whenever the channel changes, cached responses keep theirs
+        self.version = 0
+
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+
+    def update(self, measurement, seconds, num_spilled):
+        # seconds are the robot's hot capture times, num_spilled the samples
+        # before seconds[0]
+        if self.num_samples < measurement.num_spilled:
+            # spilled before they were published, only in the summary now
+            self.num_samples = measurement.num_spilled
+        total_samples = measurement.num_spilled + len(measurement.values)
+        num_new = min(total_samples, num_spilled + len(seconds)) - self.num_samples
+        if len(measurement.summary_values) > len(self.summary_values):
+            self.summary_x.extend(measurement.summary_x[len(self.summary_x):])
+            self.summary_values.extend(measurement.calibrate(
+                measurement.summary_values[len(self.summary_values):]))
+            self.version += 1
+        if num_new <= 0:
+            return
+
+        start = self.num_samples - measurement.num_spilled
+        new_values = np.asarray(measurement.values[start:start + num_new], dtype=float)
+        hot_start = self.num_samples - num_spilled
+        self.seconds.extend(seconds[hot_start:hot_start + num_new])
+        self.values.extend(new_values)
+        self.num_samples += num_new
+        self.version += 1
+
+        finite = new_values[np.isfinite(new_values)]
+        if len(finite) > 0:
+            self.count += len(finite)
+            self.total += float(finite.sum())
+            low, high = float(finite.min()), float(finite.max())
+            self.minimum = low if self.minimum == None else min(self.minimum, low)
+            self.maximum = high if self.maximum == None else max(self.maximum, high)
+
+        # the robot's spilled samples are in the summary now
+        first_hot = bisect_left(self.seconds, seconds[0]) if len(seconds) > 0 else len(self.seconds)
+        if first_hot > 0:
+            del self.seconds[:first_hot]
+            del self.values[:first_hot]
+
+    def get_latest(self):
+        return self.values[-1] if len(self.values) > 0 else None
+
+    def get_range(self, min_x, max_x, max_points):
+        # copies the samples in the window, called under the state lock. the
+        # returned function decimates and formats the copy without it
+        first, last = bisect_left(self.summary_x, min_x), bisect_right(self.summary_x, max_x)
+        hot_first, hot_last = bisect_left(self.seconds, min_x), bisect_right(self.seconds, max_x)
+        # the summary only up to where full resolution samples start
+        if len(self.seconds) > 0:
+            last = min(last, bisect_left(self.summary_x, self.seconds[0]))
+        xs = np.concatenate([np.asarray(self.summary_x[first:last], dtype=float),
+                             np.frombuffer(self.seconds, dtype=float)[hot_first:hot_last]])
+        ys = np.concatenate([np.asarray(self.summary_values[first:last], dtype=float),
+                             np.frombuffer(self.values, dtype=float)[hot_first:hot_last]])
+        name, unit, summarized = self.name, self.unit, last > first
+
+        def build():
+            decimated_xs, decimated_ys = decimate(xs, ys, max_points)
+            return {
+                'channel': name, 'unit': unit,
+                'start': min_x, 'stop': max_x,
+                'decimated': len(decimated_xs) < len(xs) or summarized,
+                'seconds': [round(x, 3) for x in decimated_xs.tolist()],
+                'values': [None if y != y else y for y in decimated_ys.tolist()],
+            }
+        return build
+
+    def get_summary(self):
+        return {
+            'unit': self.unit, 'count': self.count,
+            'min': self.minimum, 'max': self.maximum,
+            'mean': self.total / self.count if self.count > 0 else None,
+            'last': self.get_latest(),
+        }
+
+
+class TelemetryState():
+    # everything the API serves. written by the GUI thread in publish(), read
+    # by the server threads, both under the lock. responses are cached per
+    # query with the versions they were built from, and built and encoded
+    # outside the lock so large ones hold up neither publish() nor other
+    # requests.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels: dict[str, ChannelMirror] = {}
+        self.session = {}
+        self.num_samples = 0
+        self.last_seconds = 0.0
+        self.version = 0
+        self.cache = {}
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def publish(self, robot):
+        # called on the GUI thread, copies only the samples added since the
+        # last call. responses built from unchanged channels stay cached.
+        robot.refresh_derived_measurements()
+        num_spilled = len(robot.spill) if robot.spill != None else 0
+        seconds = robot.seconds
+        num_samples = robot.get_num_samples()
+        session = robot.get_session_info()
+        with self.lock:
+            if num_samples < self.num_samples:
+                # the data was cleared
+                self.channels = {}
+                self.cache = {}
+            self.num_samples = num_samples
+            changed = session != self.session
+            for name, measurement in robot.get_named_measurements():
+                if name not in self.channels:
+                    self.channels[name] = ChannelMirror(name, measurement.unit)
+                channel = self.channels[name]
+                version = channel.version
+                channel.update(measurement, seconds, num_spilled)
+                changed = changed or channel.version != version
+            if changed:
+                self.last_seconds = seconds[-1] if len(seconds) > 0 else 0.0
+                self.session = session
+                self.version += 1
+
+    def get_cached(self, prepare):
+        # prepare runs under the lock and returns the cache key, the versions
+        # the response depends on and collect. on a miss collect copies what
+        # the response needs, also under the lock, and returns the function
+        # that builds it from the copy
+        with self.lock:
+            key, versions, collect = prepare()
+            cached = self.cache.get(key)
+            if cached != None and cached[0] == versions:
+                self.num_hits += 1
+                return cached[1]
+            self.num_misses += 1
+            build = collect()
+        body = json.dumps(build()).encode('utf-8')
+        with self.lock:
+            if key not in self.cache and len(self.cache) >= MAX_CACHED:
+                del self.cache[next(iter(self.cache))]
+            self.cache[key] = (versions, body)
+        return body
+
+    def get_snapshot(self):
+        def collect():
+            response = {
+                'seconds': self.last_seconds,
+                'recording': self.session.get('recording'),
+                'values': {name: channel.get_latest() for name, channel in self.channels.items()},
+            }
+            return lambda: response
+        return self.get_cached(lambda: ('snapshot', self.version, collect))
+
+    def get_channels(self):
+        def collect():
+            response = [{'name': name, 'unit': channel.unit}
+                        for name, channel in self.channels.items()]
+            return lambda: response
+        return self.get_cached(lambda: ('channels', len(self.channels), collect))
+
+    def get_range(self, name, start=None, stop=None, last=None, max_points=MAX_POINTS):
+        def prepare():
+            channel = self.channels.get(name)
+            if channel == None:
+                raise KeyError(name)
+            if start == None:
+                # live window, changes with every new sample
+                range_stop = self.last_seconds
+                range_start = range_stop - (last if last != None else PLOT_WINDOW_SECONDS)
+                versions = channel.version
+            else:
+                range_start = start
+                range_stop = self.last_seconds if stop == None else stop
+                # a window that ended before the newest sample no longer
+                # changes, except when its samples move into the summary
+                versions = channel.version if range_stop >= self.last_seconds \
+                    else len(channel.summary_x)
+            key = ('range', name, range_start, range_stop, max_points)
+            return key, versions, lambda: channel.get_range(range_start, range_stop, max_points)
+        return self.get_cached(prepare)
+
+    def get_summary(self):
+        def collect():
+            response = {
+                'session': dict(self.session),
+                'channels': {name: channel.get_summary()
+                             for name, channel in self.channels.items()},
+            }
+            return lambda: response
+        return self.get_cached(lambda: ('summary', self.version, collect))
+
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.num_hits, 'misses': self.num_misses, 'cached': len(self.cache)}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    # GET /api/snapshot, /api/channels, /api/summary and
+    # /api/range?channel=<name>&last=<seconds> or &start=<s>&stop=<s>, with
+    # optional &points=<max points>. times are seconds from the session start
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        state: TelemetryState = self.server.state
+        try:
+            if url.path == '/api/snapshot':
+                body = state.get_snapshot()
+            elif url.path == '/api/channels':
+                body = state.get_channels()
+            elif url.path == '/api/summary':
+                body = state.get_summary()
+            elif url.path == '/api/range':
+                body = state.get_range(
+                    query['channel'],
+                    float(query['start']) if 'start' in query else None,
+                    float(query['stop']) if 'stop' in query else None,
+                    float(query['last']) if 'last' in query else None,
+                    max(min(int(query.get('points', MAX_POINTS)), MAX_POINTS), 2))
+            else:
+                self.send_error(404, 'Unknown endpoint')
+                return
+        except KeyError as error:
+            self.send_error(404, f"Unknown channel or missing parameter {error}")
+            return
+        except ValueError as error:
+            self.send_error(400, str(error))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # polling clients would flood the console
+        pass
+
+
+class TelemetryServer():
+    # serves a TelemetryState over HTTP from its own threads, one per request
+    def __init__(self, host=DEFAULT_HOST, port=8080):
+        self.state = TelemetryState()
+        self.server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self.thread = None
+
+    def get_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='TelemetryServer', daemon=True)
+        self.thread.start()
+        print(f"API {self.get_url()}/api/snapshot")
+        return self
+
+    def publish(self, robot):
+        self.state.publish(robot)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_from_env():
+    # the server when TELEMETRY_API is set, else None
+    value = os.environ.get(API_ENV)
+    if not value:
+        return None
+    return TelemetryServer(*get_address(value)).start()
@@ -0,0 +1,172 @@
+import copy
+import csv
+import math
+import time
+from collections import deque
+
+from PyQt5.QtWidgets import QLabel
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt
+
+# a frame is captured when its bytes come out of the serial port, then goes
+# through these stages before the dashboard shows it
+READ = 'read'
+SIGNAL = 'signal'
+DECODE = 'decode'
+STORE = 'store'
+PAINT = 'paint'
+TOTAL = 'total'
+STAGES = [READ, SIGNAL, DECODE, STORE, PAINT, TOTAL]
+
+# log spaced buckets from 10 us to 10 s, 20 per decade
+MIN_LATENCY = 1e-5
+BUCKETS_PER_DECADE = 20
+NUM_BUCKETS = 6 * BUCKETS_PER_DECADE
+# frames stored while painting is paused are only kept up to this many
+MAX_PENDING = 10000
+
+LATENCY_HEADERS = ['Stage', 'Count', 'Mean ms', 'p50 ms',
+                   'p95 ms', 'p99 ms', 'Max ms']
+
+
+def get_bucket_edge(index):
+    return MIN_LATENCY * 10 ** (index / BUCKETS_PER_DECADE)
+
+
+class LatencyHistogram():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # the last bucket also holds everything slower than 10 s
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        seconds = max(seconds, 0.0)
+        index = 0 if seconds <= MIN_LATENCY else int(
+            math.log10(seconds / MIN_LATENCY) * BUCKETS_PER_DECADE)
+        self.counts[min(index, NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def get_mean(self):
+        return self.total / self.count if self.count > 0 else None
+
+    def get_percentile(self, percentile):
+        # upper edge of the bucket holding the percentile, so it is never
+        # reported lower than it was
+        if self.count == 0:
+            return None
+        rank = percentile / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(get_bucket_edge(index + 1), self.max)
+        return self.max
+
+
+class LatencyTracker():
+    def __init__(self, target=0.1):
+        # p99 of the total latency should stay below target seconds
+        self.target = target
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        # (capture time, stored time) of frames not painted yet
+        self.pending = deque(maxlen=MAX_PENDING)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.pending.clear()
+
+    def get_snapshot(self):
+        # copy of the histograms that later frames do not change, for exports
+        snapshot = LatencyTracker(self.target)
+        snapshot.histograms = copy.deepcopy(self.histograms)
+        return snapshot
+
+    def record_frame(self, capture_time, emit_time, received_time, decoded_time, stored_time):
+        # all times are time.perf_counter() values
+        self.histograms[READ].add(emit_time - capture_time)
+        self.histograms[SIGNAL].add(received_time - emit_time)
+        self.histograms[DECODE].add(decoded_time - received_time)
+        self.histograms[STORE].add(stored_time - decoded_time)
+        self.pending.append((capture_time, stored_time))
+
+    def record_paint(self, painted_time=None):
+        # every frame stored since the last paint was first shown by this one
+        painted_time = time.perf_counter() if painted_time == None else painted_time
+        paint = self.histograms[PAINT]
+        total = self.histograms[TOTAL]
+        for capture_time, stored_time in self.pending:
+            paint.add(painted_time - stored_time)
+            total.add(painted_time - capture_time)
+        self.pending.clear()
+
+    def get_rows(self):
+        rows = []
+        for stage, histogram in self.histograms.items():
+            values = [histogram.get_mean(), histogram.get_percentile(50),
+                      histogram.get_percentile(95), histogram.get_percentile(99),
+                      histogram.max if histogram.count > 0 else None]
+            rows.append([stage, histogram.count] + [
+                '' if value == None else round(value * 1000, 2) for value in values])
+        return rows
+
+    def is_within_target(self):
+        p99 = self.histograms[TOTAL].get_percentile(99)
+        return p99 == None or p99 < self.target
+
+    def get_summary(self):
+        lines = [f"{'stage':<7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  ms"]
+        for row in self.get_rows():
+            stage, _, _, p50, p95, p99, maximum = row
+            lines.append(
+                f"{stage:<7}" + ''.join(f"{str(value):>8}" for value in [p50, p95, p99, maximum]))
+        state = 'ok' if self.is_within_target() else 'OVER'
+        lines.append(f"target p99 < {round(self.target * 1000)} ms: {state}")
+        return '\n'.join(lines)
+
+    def export_csv(self, file_name):
+        # percentiles per stage, then the raw bucket counts
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(LATENCY_HEADERS)
+            writer.writerows(self.get_rows())
+            writer.writerow([])
+            writer.writerow(['Bucket upper ms'] + STAGES)
+            for index in range(NUM_BUCKETS):
+                counts = [self.histograms[stage].counts[index]
+                          for stage in STAGES]
+                if sum(counts) > 0:
+                    writer.writerow(
+                        [round(get_bucket_edge(index + 1) * 1000, 4)] + counts)
+
+
+class LatencyOverlay(QLabel):
+    # monospace table in the top right corner of parent, toggled with F3
+    def __init__(self, tracker: LatencyTracker, parent):
+        super().__init__(parent)
+        self.tracker = tracker
+        self.setFont(QFont('Courier', 10))
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hide()
+
+    def toggle(self):
+        self.setVisible(not self.isVisible())
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        color = '#ccffcc' if self.tracker.is_within_target() else '#ffcccc'
+        self.setStyleSheet(
+            f"background-color: {color}; border: 1px solid black; padding: 4px;")
+        self.setText(self.tracker.get_summary())
+        self.adjustSize()
+        self.move(self.parentWidget().width() - self.width() - 8, 8)
+        self.raise_()
@@ -0,0 +1,214 @@
+import copy
+import csv
+import math
+from collections import deque
+from statistics import median
+
+import numpy as np
+from PyQt5.QtWidgets import QLabel
+from PyQt5.QtGui import QFont
+
+from latency import LatencyHistogram
+
+# the frame period is the median of this many intervals when not given
+ESTIMATE_INTERVALS = 20
+# an interval this many periods long means frames were lost
+GAP_PERIODS = 1.5
+# loss and jitter shown live are over the last this many seconds
+ROLLING_SECONDS = 10
+# loss is related to the signal strength in bins of this many dBm
+SIGNAL_BIN_DBM = 5
+# percentiles of the rolling jitter, computed together
+JITTER_PERCENTILES = [50, 95, 99]
+# rolling loss above these is shown as a warning or an alert
+WARNING_LOSS = 0.02
+ALERT_LOSS = 0.1
+
+LINK_HEADERS = ['Frames', 'Lost', 'Loss %', 'Gaps', 'Longest burst',
+                'Frame period ms', 'Jitter p50 ms', 'Jitter p95 ms', 'Jitter p99 ms']
+SIGNAL_HEADERS = ['Signal dBm', 'Frames', 'Lost', 'Loss %']
+
+
+def spread_capture_times(last_time, capture_time, num_frames):
+    # frames that came in one read were received since the frame before
+    # them, not all at capture_time. without an earlier frame they share it
+    if last_time == None or num_frames < 2:
+        return [capture_time] * num_frames
+    step = (capture_time - last_time) / num_frames
+    return [last_time + step * (i + 1) for i in range(num_frames)]
+
+
+def get_loss_percent(received, lost):
+    total = received + lost
+    return round(100 * lost / total, 2) if total > 0 else ''
+
+
+class LinkQuality():
+    # packet loss and jitter of the radio link from the capture times of the
+    # frames, so it is not affected by how fast the dashboard paints. lost
+    # frames are inferred from gaps against the expected frame period.
+    def __init__(self, frame_period=None, rolling_seconds=ROLLING_SECONDS):
+        self.fixed_frame_period = frame_period
+        self.rolling_seconds = rolling_seconds
+        self.reset()
+
+    def reset(self):
+        self.frame_period = self.fixed_frame_period
+        self.last_time = None
+        self.last_signal = None
+        # frames seen before the period is known, replayed once it is
+        self.unprocessed = []
+
+        self.num_received = 0
+        self.num_lost = 0
+        self.num_gaps = 0
+        # burst length -> number of gaps that lost that many frames
+        self.bursts: dict[int, int] = {}
+        # |interval - frame period| of frames that arrived on time
+        self.jitter = LatencyHistogram()
+        # signal bin -> [received, lost]
+        self.signal_bins: dict[int, list[int]] = {}
+
+        # (time, lost, jitter or None) for the rolling window
+        self.recent = deque()
+        self.recent_received = 0
+        self.recent_lost = 0
+        # JITTER_PERCENTILES of the window, until the next frame
+        self.rolling_jitter = None
+
+    def restart(self):
+        # after the serial port was down, the time without frames is not
+        # radio loss
+        self.last_time = None
+        self.last_signal = None
+
+    def add_frame(self, capture_time, signal_strength):
+        # capture_time is time.perf_counter() of the read the frame came from
+        if self.frame_period == None:
+            self.unprocessed.append((capture_time, signal_strength))
+            if len(self.unprocessed) > ESTIMATE_INTERVALS:
+                times = [time for time, _ in self.unprocessed]
+                # frames of one read share a time, that is not a period
+                intervals = [b - a for a, b in zip(times, times[1:]) if b > a]
+                self.frame_period = median(intervals) if len(intervals) > 0 else None
+                if self.frame_period != None:
+                    unprocessed, self.unprocessed = self.unprocessed, []
+                    for frame in unprocessed:
+                        self.process_frame(*frame)
+                else:
+                    del self.unprocessed[0]
+            return
+        self.process_frame(capture_time, signal_strength)
+
+    def process_frame(self, capture_time, signal_strength):
+        lost = 0
+        jitter = None
+        # frames of one read that share a time were neither late nor lost
+        if self.last_time != None and capture_time > self.last_time:
+            interval = capture_time - self.last_time
+            if interval > GAP_PERIODS * self.frame_period:
+                lost = round(interval / self.frame_period) - 1
+            else:
+                jitter = abs(interval - self.frame_period)
+                self.jitter.add(jitter)
+        self.last_time = capture_time
+
+        self.num_received += 1
+        self.add_to_signal_bin(signal_strength, 1, 0)
+        if lost > 0:
+            self.num_lost += lost
+            self.num_gaps += 1
+            self.bursts[lost] = self.bursts.get(lost, 0) + 1
+            # the frames were lost at the weaker of the signals around them
+            weakest = signal_strength if self.last_signal == None else min(
+                signal_strength, self.last_signal)
+            self.add_to_signal_bin(weakest, 0, lost)
+        self.last_signal = signal_strength
+
+        self.rolling_jitter = None
+        self.recent.append((capture_time, lost, jitter))
+        self.recent_received += 1
+        self.recent_lost += lost
+        while self.recent[0][0] < capture_time - self.rolling_seconds:
+            _, old_lost, _ = self.recent.popleft()
+            self.recent_received -= 1
+            self.recent_lost -= old_lost
+
+    def add_to_signal_bin(self, signal_strength, received, lost):
+        signal_bin = math.floor(signal_strength / SIGNAL_BIN_DBM) * SIGNAL_BIN_DBM
+        counts = self.signal_bins.setdefault(signal_bin, [0, 0])
+        counts[0] += received
+        counts[1] += lost
+
+    def get_rolling_loss(self):
+        total = self.recent_received + self.recent_lost
+        return self.recent_lost / total if total > 0 else 0.0
+
+    def get_rolling_jitter(self):
+        # JITTER_PERCENTILES of the window in one sort, None without jitter
+        if self.rolling_jitter == None:
+            jitters = [jitter for _, _, jitter in self.recent if jitter != None]
+            self.rolling_jitter = np.percentile(jitters, JITTER_PERCENTILES).tolist() \
+                if len(jitters) > 0 else [None] * len(JITTER_PERCENTILES)
+        return self.rolling_jitter
+
+    def get_longest_burst(self):
+        return max(self.bursts) if len(self.bursts) > 0 else 0
+
+    def get_snapshot(self):
+        # copy that later frames do not change, for exports
+        return copy.deepcopy(self)
+
+    def get_row(self):
+        def ms(seconds):
+            return '' if seconds == None else round(seconds * 1000, 2)
+
+        return [self.num_received, self.num_lost,
+                get_loss_percent(self.num_received, self.num_lost),
+                self.num_gaps, self.get_longest_burst(), ms(self.frame_period),
+                ms(self.jitter.get_percentile(50)), ms(self.jitter.get_percentile(95)),
+                ms(self.jitter.get_percentile(99))]
+
+    def get_signal_rows(self):
+        return [[signal_bin, received, lost, get_loss_percent(received, lost)]
+                for signal_bin, (received, lost) in sorted(self.signal_bins.items())]
+
+    def get_status_text(self):
+        if self.frame_period == None:
+            return "Link: measuring"
+        _, p95, _ = self.get_rolling_jitter()
+        jitter = '' if p95 == None else f", jitter p95 {round(p95 * 1000, 1)} ms"
+        return (f"Link: {round(100 * self.get_rolling_loss(), 1)}% lost"
+                f"{jitter}, {self.num_gaps} gaps")
+
+    def export_csv(self, file_name):
+        # the session totals, then loss by signal strength and burst lengths
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(LINK_HEADERS)
+            writer.writerow(self.get_row())
+            writer.writerow([])
+            writer.writerow(SIGNAL_HEADERS)
+            writer.writerows(self.get_signal_rows())
+            writer.writerow([])
+            writer.writerow(['Burst length', 'Gaps'])
+            writer.writerows(sorted(self.bursts.items()))
+
+
+class LinkQualityLabel(QLabel):
+    # one line under the robot values, colored by the rolling loss
+    def __init__(self, link_quality: LinkQuality, parent=None):
+        super().__init__(parent)
+        self.link_quality = link_quality
+        self.setFont(QFont('Bahnschrift', 14))
+        self.color = None
+        self.refresh()
+
+    def refresh(self):
+        loss = self.link_quality.get_rolling_loss()
+        color = '#ffcccc' if loss >= ALERT_LOSS else '#ffeeaa' if loss >= WARNING_LOSS else '#ccffcc'
+        # a new style sheet re-polishes the label, only set it on a change
+        if color != self.color:
+            self.color = color
+            self.setStyleSheet(f"background-color: {color}; padding: 2px;")
+        self.setText(self.link_quality.get_status_text())
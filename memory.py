@@ -0,0 +1,287 @@
+import csv
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import deque
+from itertools import islice
+
+import numpy as np
+from PyQt5.QtWidgets import QLabel
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import QObject, Qt
+
+from run_length import RunLengthValues
+from calibration import CalibratedValues
+
+# TELEMETRY_TRACEMALLOC=1 also compares tracemalloc snapshots between samples
+TRACEMALLOC_ENV = 'TELEMETRY_TRACEMALLOC'
+# long containers are sized from this many evenly spaced items
+SAMPLE_ITEMS = 100
+# samples kept per entry for its growth rate
+HISTORY = 360
+# an entry that grew in each of this many samples in a row is flagged
+UNBOUNDED_SAMPLES = 6
+# growing allocation sites shown from the tracemalloc comparison
+NUM_SITES = 5
+
+MEMORY_HEADERS = ['Seconds', 'Subsystem', 'Channel', 'Bytes', 'Bytes per hour']
+
+# total bytes the dashboards report as over budget. a full hot window of every
+# channel is a few MB, so this leaves hours of spilled summaries before it
+DEFAULT_BUDGET = 256 * 1024 * 1024
+# every sample is appended to <session>_memory_log.csv next to the exports
+LOG_SUFFIX = '_memory_log.csv'
+
+
+def get_size(obj, seen=None):
+    # estimated bytes held by obj and what it references. Qt objects are not
+    # followed, they are counted separately as plot items
+    seen = set() if seen == None else seen
+    # scalars are counted wherever they are referenced. small ints and
+    # interned strings are shared, skipping repeats would make the sampled
+    # estimate of a container jump between samples
+    if obj is None or isinstance(obj, (str, bytes, int, float, bool)):
+        return sys.getsizeof(obj)
+    if id(obj) in seen or isinstance(obj, (type, QObject)) or callable(obj):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, array):
+        return sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+    if isinstance(obj, RunLengthValues):
+        return sys.getsizeof(obj) + get_size(obj.starts, seen) + get_size(obj.run_values, seen)
+    if isinstance(obj, CalibratedValues):
+        return sys.getsizeof(obj) + get_size(obj.counts, seen)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + get_items_size(obj.keys(), len(obj), seen) \
+            + get_items_size(obj.values(), len(obj), seen)
+    if isinstance(obj, (list, tuple, deque, set)):
+        return sys.getsizeof(obj) + get_items_size(obj, len(obj), seen)
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + get_size(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def get_items_size(items, num_items, seen):
+    # every item of short containers, an even sample of long ones
+    if num_items == 0:
+        return 0
+    step = max(num_items // SAMPLE_ITEMS, 1)
+    sizes = [get_size(item, seen) for item in islice(items, 0, None, step)]
+    return round(sum(sizes) * num_items / len(sizes))
+
+
+class MemoryEntry():
+    # bytes of one subsystem or channel over time
+    def __init__(self, subsystem, channel='', window_seconds=0, grows=False):
+        self.subsystem = subsystem
+        self.channel = channel
+        # structures that fill a time window grow until it is full
+        self.window_seconds = window_seconds
+        # ones that grow with the session by design, e.g. the min/max
+        # summaries of spilled data, are only held to the budget
+        self.grows = grows
+        self.samples = deque(maxlen=HISTORY)
+
+    def get_bytes(self):
+        return self.samples[-1][1] if len(self.samples) > 0 else 0
+
+    def get_growth(self):
+        # bytes per hour over the kept samples
+        if len(self.samples) < 2:
+            return 0.0
+        (first_time, first_bytes), (last_time, last_bytes) = self.samples[0], self.samples[-1]
+        if last_time <= first_time:
+            return 0.0
+        return (last_bytes - first_bytes) / (last_time - first_time) * 3600
+
+    def is_unbounded(self):
+        # grew at every one of the recent samples, for longer than its window
+        # takes to fill. a window that has filled up stays flat
+        if self.grows:
+            return False
+        samples = list(self.samples)
+        first = len(samples) - 1
+        while first > 0 and samples[first][1] > samples[first - 1][1]:
+            first -= 1
+        return len(samples) - 1 - first >= UNBOUNDED_SAMPLES \
+            and samples[-1][0] - samples[first][0] > self.window_seconds
+
+
+class MemoryMonitor():
+    # bytes per subsystem and channel, sampled on demand or on a timer, with
+    # growth rates, unbounded structures and budgets. sample() walks live
+    # data, so it runs on the thread that owns it (the GUI thread), or in a
+    # headless loop between frames.
+    def __init__(self, budget=None, trace=None, log_file=None):
+        # budget is total bytes, or {subsystem: bytes}
+        self.budget = budget
+        self.log_file = log_file
+        self.start_time = time.perf_counter()
+        # subsystem -> (callable returning an object or {channel: object},
+        # per_channel, window_seconds, grows)
+        self.sources = {}
+        # name -> callable returning a count, e.g. plot items
+        self.counters = {}
+        self.entries: dict[tuple, MemoryEntry] = {}
+        self.counts = {}
+
+        self.trace = os.environ.get(TRACEMALLOC_ENV) == '1' if trace == None else trace
+        self.last_snapshot = None
+        # (site, bytes grown since the last sample, growing samples in a row)
+        self.growing_sites = []
+        self.site_streaks = {}
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add_source(self, subsystem, get_objects, per_channel=False, window_seconds=0,
+                   grows=False):
+        # window_seconds for sources that fill a time window, e.g. the
+        # retention hot window, so they are not flagged while it fills.
+        # grows for ones that grow with the session by design
+        self.sources[subsystem] = (get_objects, per_channel, window_seconds, grows)
+
+    def add_counter(self, name, get_count):
+        self.counters[name] = get_count
+
+    def sample(self):
+        now = time.perf_counter() - self.start_time
+        for subsystem, (get_objects, per_channel, window_seconds, grows) in self.sources.items():
+            objects = get_objects()
+            if per_channel:
+                for channel, obj in objects.items():
+                    self.add_sample(subsystem, channel, now, get_size(obj), window_seconds, grows)
+            else:
+                self.add_sample(subsystem, '', now, get_size(objects), window_seconds, grows)
+        self.counts = {name: get_count() for name, get_count in self.counters.items()}
+        if self.trace:
+            self.compare_snapshots()
+        if self.log_file != None:
+            self.append_log(now)
+        for name in self.get_over_budget():
+            print(f"MEMORY OVER BUDGET {name}")
+        return self
+
+    def add_sample(self, subsystem, channel, now, num_bytes, window_seconds=0, grows=False):
+        key = (subsystem, channel)
+        if key not in self.entries:
+            self.entries[key] = MemoryEntry(subsystem, channel, window_seconds, grows)
+        self.entries[key].samples.append((now, num_bytes))
+
+    def compare_snapshots(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')])
+        if self.last_snapshot != None:
+            growing = [stat for stat in snapshot.compare_to(self.last_snapshot, 'lineno')
+                       if stat.size_diff > 0]
+            growing_sites = set(str(stat.traceback) for stat in growing)
+            self.site_streaks = {site: self.site_streaks.get(site, 0) + 1
+                                 for site in growing_sites}
+            self.growing_sites = [(str(stat.traceback), stat.size_diff,
+                                   self.site_streaks[str(stat.traceback)])
+                                  for stat in growing[:NUM_SITES]]
+        self.last_snapshot = snapshot
+
+    def get_subsystem_bytes(self):
+        totals = {}
+        for (subsystem, _), entry in self.entries.items():
+            totals[subsystem] = totals.get(subsystem, 0) + entry.get_bytes()
+        return totals
+
+    def get_subsystem_growth(self):
+        growth = {}
+        for (subsystem, _), entry in self.entries.items():
+            growth[subsystem] = growth.get(subsystem, 0.0) + entry.get_growth()
+        return growth
+
+    def get_total_bytes(self):
+        return sum(self.get_subsystem_bytes().values())
+
+    def get_unbounded(self):
+        return [' '.join(filter(None, key)) for key, entry in self.entries.items()
+                if entry.is_unbounded()]
+
+    def get_over_budget(self):
+        if self.budget == None:
+            return []
+        if isinstance(self.budget, dict):
+            totals = self.get_subsystem_bytes()
+            return [subsystem for subsystem, budget in self.budget.items()
+                    if totals.get(subsystem, 0) > budget]
+        return ['total'] if self.get_total_bytes() > self.budget else []
+
+    def get_rows(self):
+        now = time.perf_counter() - self.start_time
+        return [[round(now, 1), entry.subsystem, entry.channel, entry.get_bytes(),
+                 round(entry.get_growth())] for entry in self.entries.values()]
+
+    def get_summary(self):
+        totals = self.get_subsystem_bytes()
+        growth = self.get_subsystem_growth()
+        lines = [f"{'memory':<16}{'MB':>8}{'MB/h':>8}"]
+        for subsystem in sorted(totals, key=totals.get, reverse=True):
+            lines.append(f"{subsystem:<16}{totals[subsystem] / 1e6:>8.2f}"
+                         f"{growth[subsystem] / 1e6:>+8.2f}")
+        lines.append(f"{'total':<16}{self.get_total_bytes() / 1e6:>8.2f}")
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"{'traced':<16}{current / 1e6:>8.2f}  peak {peak / 1e6:.2f}")
+        for name, count in self.counts.items():
+            lines.append(f"{name:<16}{count:>8}")
+        unbounded = self.get_unbounded()
+        if len(unbounded) > 0:
+            lines.append("growing: " + ', '.join(unbounded))
+        for site, size_diff, streak in self.growing_sites:
+            lines.append(f"+{size_diff / 1e3:.1f} kB x{streak} {site}")
+        over = self.get_over_budget()
+        if len(over) > 0:
+            lines.append("OVER BUDGET: " + ', '.join(over))
+        return '\n'.join(lines)
+
+    def append_log(self, now):
+        is_new = not os.path.exists(self.log_file)
+        with open(self.log_file, "a", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            if is_new:
+                writer.writerow(MEMORY_HEADERS)
+            writer.writerows(self.get_rows())
+
+    def export_csv(self, file_name):
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(MEMORY_HEADERS)
+            writer.writerows(self.get_rows())
+            writer.writerow([])
+            writer.writerow(['Counter', 'Count'])
+            writer.writerows(self.counts.items())
+
+
+class MemoryOverlay(QLabel):
+    # monospace report in the top left corner of parent, toggled with F5
+    def __init__(self, monitor: MemoryMonitor, parent):
+        super().__init__(parent)
+        self.monitor = monitor
+        self.setFont(QFont('Courier', 10))
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hide()
+
+    def toggle(self):
+        self.setVisible(not self.isVisible())
+        if self.isVisible():
+            self.monitor.sample()
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        color = '#ffcccc' if len(self.monitor.get_over_budget()) > 0 else '#eeeeff'
+        self.setStyleSheet(
+            f"background-color: {color}; border: 1px solid black; padding: 4px;")
+        self.setText(self.monitor.get_summary())
+        self.adjustSize()
+        self.move(8, 8)
+        self.raise_()
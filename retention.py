@@ -0,0 +1,197 @@
+import itertools
+import math
+import os
+import threading
+from array import array
+from datetime import datetime
+
+# spill files are numbered so a segment started after a clear never reopens
+# a file an export is still reading
+spill_numbers = itertools.count(1)
+
+
+class RetentionPolicy():
+    def __init__(self, hot_window_seconds=300, summary_bucket_size=50, spill_dir='.', run_length=()):
+        # samples newer than the hot window stay in memory at full resolution,
+        # older ones are written to disk and kept in memory as min/max buckets
+        self.hot_window_seconds = hot_window_seconds
+        self.summary_bucket_size = summary_bucket_size
+        self.spill_dir = spill_dir
+        # names of slowly varying measurements whose hot values are stored as
+        # runs of equal values, see run_length.py. noisy channels are cheaper
+        # as plain lists.
+        self.run_length = run_length
+
+    def get_spill_file_name(self, prefix, start_time, extension):
+        start = start_time.strftime('%Y_%m_%d_%H_%M_%S')
+        while True:
+            file_name = os.path.join(
+                self.spill_dir, f"{prefix}_{start}_{next(spill_numbers)}_spill.{extension}")
+            if not os.path.exists(file_name):
+                return file_name
+
+
+class SpillFile():
+    # a spill file can outlive close() while snapshots still read it, it is
+    # deleted once the last one is released
+    def __init__(self, file_name, mode, encoding=None):
+        self.file_name = file_name
+        self.file = open(file_name, mode, encoding=encoding)
+        self.lock = threading.Lock()
+        self.num_readers = 0
+        self.closed = False
+        self.delete_on_close = False
+
+    def acquire(self):
+        with self.lock:
+            self.num_readers += 1
+
+    def release(self):
+        with self.lock:
+            self.num_readers -= 1
+            self.remove_if_unused()
+
+    def close(self, delete=True):
+        self.file.close()
+        with self.lock:
+            self.closed = True
+            self.delete_on_close = delete
+            self.remove_if_unused()
+
+    def remove_if_unused(self):
+        if self.closed and self.delete_on_close and self.num_readers == 0 \
+                and os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+
+def read_segment_rows(file, row_width, start, stop, chunk_rows=4096):
+    for chunk_start in range(start, stop, chunk_rows):
+        num_rows = min(chunk_rows, stop - chunk_start)
+        file.seek(chunk_start * row_width * 8)
+        chunk = array('d')
+        chunk.fromfile(file, num_rows * row_width)
+        for r in range(num_rows):
+            row = chunk[r * row_width:(r + 1) * row_width]
+            yield datetime.fromtimestamp(row[0]), list(row[1:])
+
+
+class SpillSegment(SpillFile):
+    # fixed width binary rows (timestamp + one double per column) so any row
+    # can be read back without scanning the file
+    def __init__(self, file_name, num_columns):
+        super().__init__(file_name, 'w+b')
+        self.num_columns = num_columns
+        self.row_width = num_columns + 1
+        self.num_rows = 0
+
+    def __len__(self):
+        return self.num_rows
+
+    def append_rows(self, timestamps, columns):
+        rows = array('d')
+        for i, timestamp in enumerate(timestamps):
+            rows.append(timestamp.timestamp())
+            for values in columns:
+                rows.append(values[i] if len(values) > i else math.nan)
+        self.file.seek(0, os.SEEK_END)
+        rows.tofile(self.file)
+        self.file.flush()
+        self.num_rows += len(timestamps)
+
+    def read_rows(self, start=0, stop=None, chunk_rows=4096):
+        stop = self.num_rows if stop == None else min(stop, self.num_rows)
+        return read_segment_rows(self.file, self.row_width, start, stop, chunk_rows)
+
+    def get_snapshot(self):
+        return SegmentSnapshot(self)
+
+
+class SegmentSnapshot():
+    # the rows written so far, read through a separate handle so another
+    # thread can read while the segment keeps growing
+    def __init__(self, segment: SpillSegment):
+        self.segment = segment
+        self.num_rows = len(segment)
+        self.row_width = segment.row_width
+        segment.acquire()
+        self.file = open(segment.file_name, 'rb')
+
+    def __len__(self):
+        return self.num_rows
+
+    def read_rows(self, start=0, stop=None, chunk_rows=4096):
+        stop = self.num_rows if stop == None else min(stop, self.num_rows)
+        return read_segment_rows(self.file, self.row_width, start, stop, chunk_rows)
+
+    def close(self):
+        self.file.close()
+        self.segment.release()
+
+
+class RawSpill(SpillFile):
+    # append-only text file of "<unix timestamp> <line>" for raw serial lines
+    def __init__(self, file_name):
+        super().__init__(file_name, 'w+', 'utf-8')
+        self.num_lines = 0
+
+    def __len__(self):
+        return self.num_lines
+
+    def append_lines(self, timestamps, lines):
+        self.file.seek(0, os.SEEK_END)
+        for timestamp, line in zip(timestamps, lines):
+            self.file.write(f"{timestamp.timestamp()} {line}\n")
+        self.file.flush()
+        self.num_lines += len(lines)
+
+    def read_lines(self):
+        return read_raw_lines(self.file)
+
+    def get_snapshot(self):
+        return RawSnapshot(self)
+
+
+def read_raw_lines(file, num_lines=None):
+    file.seek(0)
+    for i, spilled_line in enumerate(file):
+        if num_lines != None and i >= num_lines:
+            return
+        timestamp, _, line = spilled_line.rstrip('\n').partition(' ')
+        yield datetime.fromtimestamp(float(timestamp)), line
+
+
+class RawSnapshot():
+    def __init__(self, spill: RawSpill):
+        self.spill = spill
+        self.num_lines = len(spill)
+        spill.acquire()
+        self.file = open(spill.file_name, 'r', encoding='utf-8')
+
+    def __len__(self):
+        return self.num_lines
+
+    def read_lines(self):
+        return read_raw_lines(self.file, self.num_lines)
+
+    def close(self):
+        self.file.close()
+        self.spill.release()
+
+
+def summarize(values, bucket_size, first_index=0):
+    # min/max per bucket, interleaved so plotting the points draws an envelope
+    summary_x = []
+    summary_values = []
+    for start in range(0, len(values), bucket_size):
+        bucket = values[start:start + bucket_size]
+        summary_x.append(first_index + start)
+        summary_x.append(first_index + start + len(bucket) - 1)
+        summary_values.append(min(bucket))
+        summary_values.append(max(bucket))
+    return summary_x, summary_values
+
+
+def format_spilled_value(value):
+    if math.isnan(value):
+        return -1
+    return int(value) if value.is_integer() else value
@@ -0,0 +1,94 @@
+from array import array
+from bisect import bisect_right
+from itertools import repeat
+
+
+class RunLengthValues():
+    # list-like storage keeping one entry per run of equal values, so a
+    # channel that sits at -1 or on a plateau costs almost nothing. indexing
+    # bisects the run starts, slices and iteration expand lazily. a run costs
+    # 8 bytes for its start plus one value of typecode, e.g. 10 bytes for raw
+    # 16-bit counts, so it only pays off when runs are long.
+    def __init__(self, values=(), typecode='d'):
+        # global index where each run starts, and its value
+        self.starts = array('q')
+        self.run_values = array(typecode)
+        # global index of values[0] and one past the last value, deleting a
+        # prefix only moves first so the starts never have to be rewritten
+        self.first = 0
+        self.end = 0
+        self.extend(values)
+
+    def __len__(self):
+        return self.end - self.first
+
+    def append(self, value):
+        if len(self.run_values) > 0 and self.run_values[-1] == value:
+            self.end += 1
+            return
+        self.starts.append(self.end)
+        self.run_values.append(value)
+        self.end += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def get_run_index(self, index):
+        return bisect_right(self.starts, index) - 1
+
+    def get_run_end(self, run_index):
+        return self.starts[run_index + 1] if run_index + 1 < len(self.starts) else self.end
+
+    def iterate(self, start, stop):
+        # values from start to stop, positions relative to first
+        start += self.first
+        stop += self.first
+        run_index = self.get_run_index(start)
+        while start < stop:
+            run_stop = min(self.get_run_end(run_index), stop)
+            yield from repeat(self.run_values[run_index], run_stop - start)
+            start = run_stop
+            run_index += 1
+
+    def __iter__(self):
+        return self.iterate(0, len(self))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return list(self.iterate(start, max(stop, start)))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('run length index out of range')
+        return self.run_values[self.get_run_index(self.first + index)]
+
+    def __delitem__(self, index):
+        # only deleting from the front is needed, when values are spilled
+        if not isinstance(index, slice) or index.start not in (None, 0) or index.step not in (None, 1):
+            raise ValueError('only a prefix of run length values can be deleted')
+        _, stop, _ = index.indices(len(self))
+        self.first += stop
+        num_dropped = max(self.get_run_index(self.first), 0)
+        if self.first == self.end:
+            num_dropped = len(self.starts)
+        del self.starts[:num_dropped]
+        del self.run_values[:num_dropped]
+
+    @property
+    def typecode(self):
+        return self.run_values.typecode
+
+    def copy(self):
+        values = RunLengthValues(typecode=self.typecode)
+        values.starts = array('q', self.starts)
+        values.run_values = array(self.typecode, self.run_values)
+        values.first = self.first
+        values.end = self.end
+        return values
+
+    def get_num_runs(self):
+        return len(self.run_values)
@@ -0,0 +1,110 @@
+import math
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+SEGMENT = 'Segment'
+BOOKMARK = 'Bookmark'
+SEGMENT_HEADERS = ['Type', 'Name', 'Start index', 'Stop index',
+                   'Start seconds', 'Stop seconds']
+
+
+class Segment():
+    def __init__(self, name, start_index, start_time: datetime):
+        # indices are global sample indices, stop_index is exclusive
+        self.name = name
+        self.start_index = start_index
+        self.start_time = start_time
+        self.stop_index = None
+        self.stop_time = None
+
+    def is_open(self):
+        return self.stop_index == None
+
+
+class Bookmark():
+    def __init__(self, name, index, time: datetime):
+        self.name = name
+        self.index = index
+        self.time = time
+
+
+class SessionIndex():
+    # segments and bookmarks are added in sample order, so both lists stay
+    # sorted and every lookup is a bisect
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.segments: list[Segment] = []
+        self.segment_starts = []
+        self.bookmarks: list[Bookmark] = []
+        self.bookmark_indices = []
+
+    def get_open_segment(self):
+        if len(self.segments) > 0 and self.segments[-1].is_open():
+            return self.segments[-1]
+        return None
+
+    def start_segment(self, name, index, time):
+        self.stop_segment(index, time)
+        if name == None or name == '':
+            name = f"Segment {len(self.segments) + 1}"
+        segment = Segment(name, index, time)
+        self.segments.append(segment)
+        self.segment_starts.append(index)
+        return segment
+
+    def stop_segment(self, index, time):
+        segment = self.get_open_segment()
+        if segment == None:
+            return None
+        if index == segment.start_index:
+            # nothing was recorded, forget it
+            self.segments.pop()
+            self.segment_starts.pop()
+            return None
+        segment.stop_index = index
+        segment.stop_time = time
+        return segment
+
+    def add_bookmark(self, name, index, time):
+        if name == None or name == '':
+            name = f"Bookmark {len(self.bookmarks) + 1}"
+        bookmark = Bookmark(name, index, time)
+        self.bookmarks.append(bookmark)
+        self.bookmark_indices.append(index)
+        return bookmark
+
+    def get_segments(self, start_index, stop_index):
+        # segments overlapping the samples start_index to stop_index
+        first = max(bisect_right(self.segment_starts, start_index) - 1, 0)
+        last = bisect_left(self.segment_starts, stop_index)
+        return [segment for segment in self.segments[first:last]
+                if segment.is_open() or segment.stop_index > start_index]
+
+    def find(self, name):
+        # the latest segment or bookmark with this name
+        for item in reversed(self.segments + self.bookmarks):
+            if item.name == name:
+                return item
+        return None
+
+    def get_bookmarks(self, start_index, stop_index):
+        first = bisect_left(self.bookmark_indices, start_index)
+        last = bisect_left(self.bookmark_indices, stop_index)
+        return self.bookmarks[first:last]
+
+    def get_rows(self, start_time, start_index=0, stop_index=math.inf):
+        # the segments and bookmarks of the exported samples
+        def seconds(time):
+            return '' if time == None else round((time - start_time).total_seconds(), 3)
+
+        rows = [SEGMENT_HEADERS]
+        for segment in self.get_segments(start_index, stop_index):
+            rows.append([SEGMENT, segment.name, segment.start_index,
+                         '' if segment.stop_index == None else segment.stop_index,
+                         seconds(segment.start_time), seconds(segment.stop_time)])
+        for bookmark in self.get_bookmarks(start_index, stop_index):
+            rows.append([BOOKMARK, bookmark.name, bookmark.index, '',
+                         seconds(bookmark.time), ''])
+        return rows
@@ -0,0 +1,242 @@
+import copy
+import threading
+import time
+
+import serial
+from serial.tools import list_ports
+from PyQt5.QtWidgets import QComboBox
+
+from latency import LatencyHistogram
+
+CONNECTED = 'connected'
+RECONNECTING = 'reconnecting'
+NO_PORT = 'no port'
+
+# seconds between reconnect attempts, doubled after every failed one
+MIN_BACKOFF = 0.1
+MAX_BACKOFF = 5.0
+# how long read waits for the first byte, so the loop does not spin
+READ_TIMEOUT = 0.05
+
+CONNECTION_HEADERS = ['Port', 'Disconnects', 'Reconnects', 'Port switches',
+                      'Downtime s', 'Reconnect p50 ms', 'Reconnect max ms']
+
+
+def find_port(port, serial_number=None):
+    # the device to open for port, following the adapter by its serial number
+    # when it came back under another name, e.g. COM5 -> COM6
+    ports = list_ports.comports()
+    for info in ports:
+        if port in (info.name, info.device):
+            return info.device, info.serial_number
+    if serial_number != None:
+        for info in ports:
+            if info.serial_number == serial_number:
+                return info.device, info.serial_number
+    # not enumerated, e.g. a pty from serial_simulator, it is opened as is
+    return port, serial_number
+
+
+class ConnectionMetrics():
+    def __init__(self):
+        self.num_disconnects = 0
+        self.num_reconnects = 0
+        self.num_switches = 0
+        # total seconds a port was set but could not be read
+        self.downtime = 0.0
+        # from noticing a disconnect to reading from the reopened port
+        self.reconnect_latency = LatencyHistogram()
+
+    def get_row(self, port):
+        p50 = self.reconnect_latency.get_percentile(50)
+        maximum = self.reconnect_latency.max if self.reconnect_latency.count > 0 else None
+        return [port, self.num_disconnects, self.num_reconnects, self.num_switches,
+                round(self.downtime, 3),
+                '' if p50 == None else round(p50 * 1000, 1),
+                '' if maximum == None else round(maximum * 1000, 1)]
+
+
+class SerialConnection():
+    # owns the serial port of a reader thread. read() is only called from
+    # that thread, which also does the reconnecting, so the GUI never blocks
+    # on a port. set_port() can be called from any thread and is applied
+    # before the next read.
+    def __init__(self, port, baudrate=115200):
+        self.port = port
+        # what port resolved to, another name once the adapter was followed
+        self.device = port
+        self.baudrate = baudrate
+        self.serial_port: serial.Serial = None
+        self.serial_number = None
+        self.lock = threading.Lock()
+        self.requested_port = None
+
+        self.state = NO_PORT if port == None else RECONNECTING
+        self.disconnect_time = None
+        self.backoff = MIN_BACKOFF
+        self.next_attempt = 0.0
+        self.num_attempts = 0
+        self.last_error = None
+        self.metrics = ConnectionMetrics()
+        # set by the reader, called from its thread with the new state
+        self.on_state_change = None
+
+        if port != None:
+            self.open()
+
+    def set_port(self, port):
+        with self.lock:
+            self.requested_port = port
+
+    def read(self):
+        # the bytes available, b'' while there are none or the port is down
+        self.apply_requested_port()
+        if self.serial_port == None:
+            if self.port != None and time.perf_counter() >= self.next_attempt:
+                self.open()
+            else:
+                time.sleep(READ_TIMEOUT)
+            return b''
+        try:
+            data = self.serial_port.read(max(self.serial_port.in_waiting, 1))
+        except (serial.SerialException, OSError) as error:
+            self.disconnect(error)
+            return b''
+        return data
+
+    def apply_requested_port(self):
+        with self.lock:
+            port, self.requested_port = self.requested_port, None
+        if port == None or port == self.port:
+            return
+        self.close()
+        self.end_outage()
+        self.metrics.num_switches += 1
+        self.port = port
+        self.device = port
+        self.serial_number = None
+        self.backoff = MIN_BACKOFF
+        self.num_attempts = 0
+        # switching is not downtime, only failing to open the new port is
+        self.open()
+
+    def open(self):
+        self.num_attempts += 1
+        try:
+            device, self.serial_number = find_port(self.port, self.serial_number)
+            self.serial_port = serial.Serial(
+                device, self.baudrate, timeout=READ_TIMEOUT)
+            self.device = device
+            self.serial_port.reset_input_buffer()
+        except (serial.SerialException, OSError, ValueError) as error:
+            self.serial_port = None
+            self.last_error = error
+            if self.disconnect_time == None:
+                self.disconnect_time = time.perf_counter()
+            self.next_attempt = time.perf_counter() + self.backoff
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+            self.set_state(RECONNECTING)
+            return False
+
+        down = self.end_outage()
+        if self.metrics.num_disconnects > self.metrics.num_reconnects:
+            # a first open that failed is not a reconnect
+            self.metrics.reconnect_latency.add(down)
+            self.metrics.num_reconnects += 1
+        self.backoff = MIN_BACKOFF
+        self.num_attempts = 0
+        self.last_error = None
+        self.set_state(CONNECTED)
+        return True
+
+    def end_outage(self):
+        # seconds since the port went down, added to the downtime
+        if self.disconnect_time == None:
+            return 0.0
+        down = time.perf_counter() - self.disconnect_time
+        self.metrics.downtime += down
+        self.disconnect_time = None
+        return down
+
+    def disconnect(self, error):
+        print(f"DISCONNECTED {self.device}: {error}")
+        self.close()
+        self.last_error = error
+        self.metrics.num_disconnects += 1
+        self.disconnect_time = time.perf_counter()
+        self.next_attempt = self.disconnect_time
+        self.backoff = MIN_BACKOFF
+        self.set_state(RECONNECTING)
+
+    def close(self):
+        if self.serial_port != None:
+            try:
+                self.serial_port.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.serial_port = None
+
+    def set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state_change != None:
+            self.on_state_change(state)
+
+    def get_downtime(self):
+        # including the current outage
+        current = time.perf_counter() - self.disconnect_time \
+            if self.disconnect_time != None and self.state == RECONNECTING else 0.0
+        return self.metrics.downtime + current
+
+    def get_rows(self):
+        # the metrics so far, for exports
+        metrics = copy.deepcopy(self.metrics)
+        metrics.downtime = self.get_downtime()
+        return [CONNECTION_HEADERS, metrics.get_row(self.device)]
+
+    def get_status_text(self):
+        if self.state == NO_PORT:
+            return "No port"
+        if self.state == CONNECTED:
+            return f"Connected to {self.device}"
+        down = '' if self.disconnect_time == None else \
+            f", down {round(time.perf_counter() - self.disconnect_time, 1)} s"
+        return f"Reconnecting to {self.device} (attempt {self.num_attempts}{down})"
+
+
+class PortDropdown(QComboBox):
+    # the serial ports by name. they are enumerated again when the list is
+    # opened and on every reconnect attempt, so an adapter plugged in or
+    # renamed after startup shows up without a restart
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.port_names = []
+        self.num_attempts = None
+        self.refresh()
+
+    def refresh(self):
+        port_names = [port.name for port in list_ports.comports()]
+        if port_names == self.port_names:
+            return
+        # activated is only emitted for the user's choices, so rebuilding the
+        # items does not switch ports
+        selected = self.currentText()
+        self.port_names = port_names
+        self.clear()
+        self.addItems(port_names)
+        if selected in port_names:
+            self.setCurrentIndex(port_names.index(selected))
+
+    def showPopup(self):
+        self.refresh()
+        super().showPopup()
+
+    def refresh_on_attempt(self, connection: SerialConnection):
+        # called on every repaint with the reader's connection, or None
+        if connection == None or connection.state != RECONNECTING:
+            self.num_attempts = None
+            return
+        if connection.num_attempts != self.num_attempts:
+            self.num_attempts = connection.num_attempts
+            self.refresh()
@@ -0,0 +1,269 @@
+import argparse
+import errno
+import math
+import os
+import random
+import threading
+import time
+
+# which ESC the bytes 18:26 and 26:34 belong to differs between the dashboards
+BARS_LAYOUT = 'bars'
+GRAPHS_LAYOUT = 'graphs'
+
+
+def split_bytes(value):
+    value = max(0, min(int(round(value)), 0xFFFF))
+    return [value >> 8, value & 0xFF]
+
+
+def encode_drive_esc(temp, voltage, current, consumption, rpm):
+    # KISS style telemetry, 9 bytes
+    return [max(0, min(int(round(temp)), 255))] + split_bytes(voltage * 100) + \
+        split_bytes(current * 100) + split_bytes(consumption) + \
+        split_bytes(rpm * 6 / 100)
+
+
+def encode_scaled_esc(temp, voltage, current, rpm):
+    # 8 bytes, every value scaled against 2042 full scale
+    scale_val = 2042
+    return split_bytes(temp / 30 * scale_val) + split_bytes(voltage / 20 * scale_val) + \
+        split_bytes(current / 50 * scale_val) + \
+        split_bytes(rpm * 7 / 20416.66 * scale_val)
+
+
+class RobotModel():
+    # simple first order physics: the weapon spins up and down, draws current
+    # while accelerating, heats with I^2 and sags the pack voltage
+    def __init__(self, seed=None, capacity=12000):
+        self.random = random.Random(seed)
+        self.capacity = capacity
+        self.time = 0.0
+
+        self.weapon_rpm = 0.0
+        self.weapon_target = 0.0
+        self.next_toggle = 1.0
+        self.weapon_current = 0.0
+        self.weapon_temp = 30.0
+
+        self.arm_rpm = 0.0
+        self.arm_current = 0.0
+        self.arm_temp = 30.0
+
+        self.consumption = 0.0
+        self.voltage = 25.2
+        self.signal_strength = -60.0
+
+    def step(self, dt):
+        self.time += dt
+        rand = self.random
+
+        if self.time >= self.next_toggle:
+            self.weapon_target = 0.0 if self.weapon_target > 0 else rand.uniform(
+                8000, 14000)
+            self.next_toggle = self.time + rand.uniform(2, 8)
+
+        tau = 0.6 if self.weapon_target > self.weapon_rpm else 1.5
+        previous_rpm = self.weapon_rpm
+        self.weapon_rpm += (self.weapon_target - self.weapon_rpm) * \
+            (1 - math.exp(-dt / tau))
+        hit_current = 0.0
+        if self.weapon_rpm > 5000 and rand.random() < 0.3 * dt:
+            # impact: the weapon loses speed and the ESC pulls a spike
+            self.weapon_rpm *= rand.uniform(0.4, 0.8)
+            hit_current = rand.uniform(80, 200)
+        acceleration = max(self.weapon_rpm - previous_rpm, 0) / dt
+        self.weapon_current = 2 + 0.002 * self.weapon_rpm + \
+            0.004 * acceleration + hit_current + rand.gauss(0, 0.5)
+        self.weapon_current = max(self.weapon_current, 0)
+
+        if rand.random() < 0.5 * dt:
+            self.arm_rpm = rand.uniform(0, 6000)
+        self.arm_rpm *= math.exp(-dt / 0.5)
+        self.arm_current = max(0.5 + 0.003 * self.arm_rpm +
+                               rand.gauss(0, 0.2), 0)
+
+        for current, attribute in [(self.weapon_current, 'weapon_temp'), (self.arm_current, 'arm_temp')]:
+            temp = getattr(self, attribute)
+            temp += (current * current * 0.0004 - (temp - 28) * 0.01) * dt
+            setattr(self, attribute, temp)
+
+        total_current = self.weapon_current + self.arm_current
+        self.consumption += total_current * dt * 1000 / 3600
+        state_of_charge = max(1 - self.consumption / self.capacity, 0)
+        self.voltage = 21 + 4.2 * state_of_charge - 0.008 * total_current + \
+            rand.gauss(0, 0.03)
+
+        self.signal_strength += rand.gauss(0, 0.8) + \
+            (-65 - self.signal_strength) * 0.05
+        if rand.random() < 0.05 * dt:
+            self.signal_strength = rand.uniform(-100, -85)
+        self.signal_strength = max(min(self.signal_strength, -30), -110)
+
+    def get_frame(self, layout=BARS_LAYOUT):
+        drive_esc = encode_drive_esc(0, 0, 0, 0, 0)
+        weapon_esc = encode_scaled_esc(
+            self.weapon_temp, self.voltage, self.weapon_current, self.weapon_rpm)
+        arm_esc = encode_scaled_esc(
+            self.arm_temp, self.voltage, self.arm_current, self.arm_rpm)
+        scaled_escs = arm_esc + weapon_esc if layout == BARS_LAYOUT else weapon_esc + arm_esc
+        data = drive_esc + drive_esc + scaled_escs + \
+            [int(round(self.signal_strength))]
+        return 'Data: ' + ' '.join(map(str, data))
+
+
+class FaultConfig():
+    def __init__(self, garbage=0.0, truncate=0.0, burst=0.0, silence=0.0,
+                 burst_frames=50, silence_seconds=(0.5, 3.0)):
+        # per frame probabilities of each fault
+        self.garbage = garbage
+        self.truncate = truncate
+        self.burst = burst
+        self.silence = silence
+        self.burst_frames = burst_frames
+        self.silence_seconds = silence_seconds
+
+
+class SerialSimulator(threading.Thread):
+    def __init__(self, rate=20, layout=BARS_LAYOUT, faults: FaultConfig = None, seed=None):
+        super().__init__(daemon=True)
+        self.rate = rate
+        self.layout = layout
+        self.faults = faults if faults != None else FaultConfig()
+        self.random = random.Random(seed)
+        self.model = RobotModel(seed)
+        self.stop_event = threading.Event()
+        self.backlog = bytearray()
+        self.max_backlog = 64 * 1024
+
+        self.stats = {
+            'frames': 0,
+            'bytes': 0,
+            'dropped': 0,
+            'garbage': 0,
+            'truncated': 0,
+            'bursts': 0,
+            'silences': 0,
+        }
+        self.open_pty()
+
+    def open_pty(self):
+        # the reader opens port_name exactly like a real serial port. tty is
+        # posix only, on Windows use a virtual COM port pair instead
+        import tty
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port_name = os.ttyname(self.slave_fd)
+
+    def write(self, data, num_frames):
+        if len(self.backlog) + len(data) > self.max_backlog:
+            # reader is not keeping up, whole frames are dropped like a
+            # radio with a full buffer would
+            self.stats['dropped'] += num_frames
+        else:
+            self.backlog += data
+        self.flush()
+
+    def flush(self):
+        try:
+            written = os.write(self.master_fd, self.backlog)
+        except OSError as error:
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        self.stats['bytes'] += written
+        del self.backlog[:written]
+
+    def get_fault_bytes(self, frame):
+        faults = self.faults
+        roll = self.random.random()
+        if roll < faults.garbage:
+            self.stats['garbage'] += 1
+            garbage = bytes(self.random.randrange(256)
+                            for _ in range(self.random.randint(1, 40)))
+            return garbage + (b'\n' if self.random.random() < 0.5 else b'')
+        roll -= faults.garbage
+        if roll < faults.truncate:
+            self.stats['truncated'] += 1
+            cut = self.random.randint(1, len(frame) - 1)
+            return frame[:cut].encode() + (b'\n' if self.random.random() < 0.5 else b'')
+        return None
+
+    def run(self):
+        dt = 1 / self.rate
+        next_time = time.perf_counter()
+        burst_left = 0
+        while not self.stop_event.is_set():
+            now = time.perf_counter()
+            if burst_left == 0 and now < next_time:
+                if len(self.backlog) > 0:
+                    self.flush()
+                time.sleep(min(next_time - now, 0.01))
+                continue
+
+            if burst_left == 0 and self.random.random() < self.faults.silence:
+                self.stats['silences'] += 1
+                silence = self.random.uniform(*self.faults.silence_seconds)
+                self.stop_event.wait(silence)
+                next_time = time.perf_counter()
+                continue
+            if burst_left == 0 and self.random.random() < self.faults.burst:
+                self.stats['bursts'] += 1
+                burst_left = self.faults.burst_frames
+
+            # frames that are due are written together to keep up at kHz rates
+            chunks = []
+            while (burst_left > 0 or next_time <= now) and len(chunks) < 1000:
+                self.model.step(dt)
+                frame = self.model.get_frame(self.layout)
+                fault_bytes = self.get_fault_bytes(frame)
+                chunks.append(fault_bytes if fault_bytes != None else (
+                    frame + '\r\n').encode())
+                self.stats['frames'] += 1
+                if burst_left > 0:
+                    burst_left -= 1
+                else:
+                    next_time += dt
+            self.write(b''.join(chunks), len(chunks))
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Emit telemetry frames on a pseudo terminal for load and soak tests')
+    parser.add_argument('--rate', type=float, default=20,
+                        help='frames per second')
+    parser.add_argument('--layout', choices=[BARS_LAYOUT, GRAPHS_LAYOUT],
+                        default=BARS_LAYOUT)
+    parser.add_argument('--garbage', type=float, default=0.0,
+                        help='probability per frame of random bytes')
+    parser.add_argument('--truncate', type=float, default=0.0,
+                        help='probability per frame of a truncated line')
+    parser.add_argument('--burst', type=float, default=0.0,
+                        help='probability per frame of a burst of back to back frames')
+    parser.add_argument('--silence', type=float, default=0.0,
+                        help='probability per frame of a silent gap')
+    parser.add_argument('--duration', type=float,
+                        help='seconds to run, forever by default')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    simulator = SerialSimulator(args.rate, args.layout, FaultConfig(
+        args.garbage, args.truncate, args.burst, args.silence), args.seed)
+    simulator.start()
+    print(f"PORT {simulator.port_name}")
+
+    start = time.monotonic()
+    try:
+        while args.duration == None or time.monotonic() - start < args.duration:
+            time.sleep(5)
+            print(' '.join(f"{key} {value}" for key,
+                  value in simulator.stats.items()))
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
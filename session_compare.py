@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QComboBox
+from PyQt5.QtGui import QFont
+
+from session_files import load_session, split_channel_header
+from alarm_rules import SPIN_UP_RPM
+
+FONT_FAMILY = 'Bahnschrift'
+
+SPIN_UP = 'Weapon spin up'
+MATCH_START = 'Match start'
+MARKER = 'Marker'
+RECORDING_START = 'Recording start'
+ALIGN_EVENTS = [SPIN_UP, MATCH_START, MARKER, RECORDING_START]
+
+OVERLAY = 'Overlay'
+DIFFERENCE = 'Difference from first'
+
+MATCH_START_CURRENT = 5
+
+DEFAULT_CHANNELS = ['Weapon ESC RPM', 'Weapon ESC Current',
+                    'Weapon ESC Temp', 'Weapon ESC Voltage']
+
+SESSION_COLORS = ['k', 'r', 'b', 'g', 'm', 'c']
+
+
+def first_index_at_or_above(values, threshold):
+    above = np.nan_to_num(values, nan=-np.inf) >= threshold
+    return int(np.argmax(above)) if above.any() else None
+
+
+class SessionComparison():
+    def __init__(self, sessions, resolution=0.05, max_gap=1.0):
+        self.sessions = sessions
+        self.resolution = resolution
+        # source gaps longer than this stay gaps instead of being interpolated
+        self.max_gap = max_gap
+        self.markers: dict[str, float] = {}
+
+    def set_marker(self, session_name, seconds_from_start):
+        self.markers[session_name] = seconds_from_start
+
+    def get_event_time(self, session, event):
+        times = session.times
+        if event == SPIN_UP:
+            rpm = session.get_channel('RPM', 'Weapon ESC')
+            index = first_index_at_or_above(
+                rpm, SPIN_UP_RPM) if rpm is not None else None
+            return times[index] if index != None else None
+        if event == MATCH_START:
+            currents = [values for (esc, measurement), values in session.channels.items()
+                        if esc != None and measurement == 'Current']
+            if len(currents) == 0:
+                return None
+            total_current = np.nansum(np.vstack(currents), axis=0)
+            index = first_index_at_or_above(total_current, MATCH_START_CURRENT)
+            return times[index] if index != None else None
+        if event == MARKER:
+            marker = self.markers.get(session.name)
+            return times[0] + marker if marker != None else None
+        return times[0]
+
+    def get_zero_times(self, event):
+        # sessions without the event fall back to their recording start
+        zero_times = []
+        for session in self.sessions:
+            event_time = self.get_event_time(session, event)
+            zero_times.append(
+                event_time if event_time != None else session.times[0])
+        return zero_times
+
+    def get_time_base(self, event):
+        zero_times = self.get_zero_times(event)
+        start = min(session.times[0] - zero for session,
+                    zero in zip(self.sessions, zero_times))
+        end = max(session.times[-1] - zero for session,
+                  zero in zip(self.sessions, zero_times))
+        return np.arange(start, end + self.resolution, self.resolution), zero_times
+
+    def resample_session(self, session, zero_time, time_base, measurement, esc=None):
+        values = session.get_channel(measurement, esc)
+        if values is None:
+            return np.full(len(time_base), np.nan)
+
+        present = ~np.isnan(values)
+        relative_times = session.times[present] - zero_time
+        values = values[present]
+        if len(values) < 2:
+            return np.full(len(time_base), np.nan)
+
+        resampled = np.interp(time_base, relative_times, values,
+                              left=np.nan, right=np.nan)
+        after = np.clip(np.searchsorted(relative_times, time_base),
+                        1, len(relative_times) - 1)
+        gaps = relative_times[after] - relative_times[after - 1]
+        resampled[gaps > self.max_gap] = np.nan
+        return resampled
+
+    def resample(self, measurement, esc=None, event=RECORDING_START):
+        time_base, zero_times = self.get_time_base(event)
+        return time_base, [
+            self.resample_session(session, zero_time,
+                                  time_base, measurement, esc)
+            for session, zero_time in zip(self.sessions, zero_times)
+        ]
+
+    def difference(self, measurement, esc=None, event=RECORDING_START):
+        time_base, resampled = self.resample(measurement, esc, event)
+        return time_base, [values - resampled[0] for values in resampled[1:]]
+
+
+class ComparisonWindow(QWidget):
+    def __init__(self, comparison: SessionComparison, channel_headers=DEFAULT_CHANNELS):
+        super().__init__()
+        self.setWindowTitle('Session comparison')
+        self.setStyleSheet("background-color: white;")
+        self.comparison = comparison
+        self.channels = [split_channel_header(header)
+                         for header in channel_headers]
+
+        main_layout = QVBoxLayout()
+        self.setLayout(main_layout)
+
+        controls = QHBoxLayout()
+        main_layout.addLayout(controls)
+
+        align_label = QLabel('Align on')
+        align_label.setFont(QFont(FONT_FAMILY, 14, QFont.Bold))
+        controls.addWidget(align_label)
+        self.align_dropdown = QComboBox()
+        self.align_dropdown.addItems(ALIGN_EVENTS)
+        self.align_dropdown.currentIndexChanged.connect(self.update_plots)
+        controls.addWidget(self.align_dropdown)
+
+        self.mode_dropdown = QComboBox()
+        self.mode_dropdown.addItems([OVERLAY, DIFFERENCE])
+        self.mode_dropdown.currentIndexChanged.connect(self.update_plots)
+        controls.addWidget(self.mode_dropdown)
+
+        for s_index, session in enumerate(comparison.sessions):
+            session_label = QLabel(session.name)
+            session_label.setFont(QFont(FONT_FAMILY, 12))
+            session_label.setStyleSheet(
+                f"color: {pg.mkColor(SESSION_COLORS[s_index % len(SESSION_COLORS)]).name()};")
+            controls.addWidget(session_label)
+        controls.addStretch(1)
+
+        pg.setConfigOption('background', 'w')
+        self.graphs = []
+        for esc, measurement in self.channels:
+            graph = pg.PlotWidget(
+                title=f"{esc} {measurement}" if esc != None else measurement)
+            graph.showGrid(x=True, y=True)
+            if len(self.graphs) > 0:
+                graph.setXLink(self.graphs[0])
+            main_layout.addWidget(graph, 1)
+            self.graphs.append(graph)
+
+        self.update_plots()
+
+    def update_plots(self):
+        event = self.align_dropdown.currentText()
+        is_difference = self.mode_dropdown.currentText() == DIFFERENCE
+        for graph, (esc, measurement) in zip(self.graphs, self.channels):
+            graph.clear()
+            if is_difference:
+                time_base, series = self.comparison.difference(
+                    measurement, esc, event)
+                first_color = 1
+            else:
+                time_base, series = self.comparison.resample(
+                    measurement, esc, event)
+                first_color = 0
+            for s_index, values in enumerate(series):
+                color = SESSION_COLORS[(s_index + first_color) %
+                                       len(SESSION_COLORS)]
+                graph.plot(time_base, values, pen=pg.mkPen(
+                    color, width=1), connect='finite')
+            graph.addItem(pg.InfiniteLine(0, pen=pg.mkPen(
+                'k', width=1, style=pg.QtCore.Qt.DashLine)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Overlay exported telemetry sessions aligned on an event')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--channels', nargs='+', default=DEFAULT_CHANNELS,
+                        help='column headers, e.g. "Weapon ESC RPM"')
+    parser.add_argument('--marker', action='append', default=[],
+                        help='FILE=SECONDS manual alignment marker, repeatable')
+    parser.add_argument('--resolution', type=float, default=0.05)
+    args = parser.parse_args()
+
+    comparison = SessionComparison(
+        [load_session(file_name) for file_name in args.files], args.resolution)
+    for marker in args.marker:
+        file_name, _, seconds = marker.rpartition('=')
+        comparison.set_marker(os.path.basename(file_name), float(seconds))
+
+    app = QApplication(sys.argv)
+    window = ComparisonWindow(comparison, args.channels)
+    window.showMaximized()
+    sys.exit(app.exec_())
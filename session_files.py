@@ -0,0 +1,120 @@
+import csv
+import glob
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+ESC_NAMES = ['Drive ESC 1', 'Drive ESC 2', 'Weapon ESC', 'Arm ESC']
+
+TIMESTAMP_HEADER = 'Timestamp'
+SECONDS_HEADER = 'Seconds from start'
+INPUT_SIGNAL = 'Input Signal'
+
+# telemetry_bars writes -1 for ESCs that were not active
+MISSING_VALUE = -1
+
+SESSION_PATTERNS = ['telemetry_*.csv', 'avian_data_*.csv']
+
+
+class SessionData():
+    def __init__(self, file_name, layout, times, channels):
+        self.file_name = file_name
+        self.name = os.path.basename(file_name)
+        self.layout = layout
+        # unix seconds per row and one float array per (esc, measurement),
+        # esc is None for robot level channels
+        self.times = times
+        self.channels: dict[tuple, np.ndarray] = channels
+
+    def __len__(self):
+        return len(self.times)
+
+    def get_start_time(self):
+        return datetime.fromtimestamp(self.times[0]) if len(self) > 0 else None
+
+    def get_seconds(self):
+        return self.times - self.times[0] if len(self) > 0 else self.times
+
+    def get_duration(self):
+        return float(self.times[-1] - self.times[0]) if len(self) > 0 else 0
+
+    def get_channel(self, measurement, esc=None):
+        return self.channels.get((esc, measurement))
+
+    def get_channel_names(self):
+        return list(self.channels.keys())
+
+
+def split_channel_header(header):
+    for esc in ESC_NAMES:
+        if header.startswith(esc + ' '):
+            return esc, header[len(esc) + 1:]
+    return None, header
+
+
+def get_file_date(file_name):
+    match = re.search(r'(\d{4}_\d{2}_\d{2})_\d{2}_\d{2}_\d{2}',
+                      os.path.basename(file_name))
+    if match:
+        return datetime.strptime(match.group(1), '%Y_%m_%d')
+    return datetime.fromtimestamp(os.path.getmtime(file_name))
+
+
+def parse_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_times(timestamps, file_date):
+    day_start = file_date.replace(
+        hour=0, minute=0, second=0, microsecond=0).timestamp()
+    times = np.empty(len(timestamps))
+    for i, timestamp in enumerate(timestamps):
+        hours, minutes, seconds, microseconds = timestamp.split('_')
+        times[i] = (int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+                    + int(microseconds) / 1e6)
+    # recordings that run past midnight
+    wraps = np.cumsum(np.diff(times, prepend=times[:1]) < -43200)
+    return day_start + times + wraps * 86400
+
+
+def load_session(file_name):
+    with open(file_name, newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+
+    headers = rows[0]
+    rows = [row for row in rows[1:] if len(row) == len(headers)]
+    layout = 'bars' if any(header.endswith(INPUT_SIGNAL)
+                           for header in headers) else 'graphs'
+
+    times = parse_times([row[0] for row in rows], get_file_date(file_name))
+    values = np.array([[parse_value(text) for text in row[1:]]
+                      for row in rows]).reshape(len(rows), len(headers) - 1)
+    if layout == 'bars':
+        values[values == MISSING_VALUE] = np.nan
+
+    channels = {}
+    for column, header in enumerate(headers[1:]):
+        if header == SECONDS_HEADER:
+            continue
+        channels[split_channel_header(header)] = values[:, column]
+
+    return SessionData(file_name, layout, times, channels)
+
+
+def find_session_files(paths, patterns=SESSION_PATTERNS):
+    file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in patterns:
+                file_names.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            file_names.append(path)
+    return sorted(set(file_name for file_name in file_names
+                      if not file_name.endswith(('_raw.csv', '_events.csv', '_latency.csv',
+                                                 '_segments.csv', '_link.csv', '_memory.csv',
+                                                 '_changes.csv', '_memory_log.csv'))))
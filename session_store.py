@@ -0,0 +1,292 @@
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+
+from session_files import load_session, find_session_files
+
+SESSION_STORE_FILE = 'telemetry_sessions.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT UNIQUE,
+    name TEXT,
+    layout TEXT,
+    start_time REAL,
+    end_time REAL,
+    num_rows INTEGER,
+    file_size INTEGER,
+    file_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions (start_time, end_time);
+
+CREATE TABLE IF NOT EXISTS channels (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES sessions (id) ON DELETE CASCADE,
+    esc TEXT,
+    measurement TEXT,
+    count INTEGER,
+    minimum REAL,
+    maximum REAL,
+    total REAL
+);
+CREATE INDEX IF NOT EXISTS channels_by_name ON channels (measurement, esc, session_id);
+
+CREATE TABLE IF NOT EXISTS samples (
+    channel_id INTEGER REFERENCES channels (id) ON DELETE CASCADE,
+    time REAL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_by_channel_time ON samples (channel_id, time);
+"""
+
+AGGREGATES = {
+    'max': 'MAX(value)',
+    'min': 'MIN(value)',
+    'mean': 'AVG(value)',
+    'count': 'COUNT(value)',
+}
+
+
+def to_unix_time(time):
+    return time.timestamp() if isinstance(time, datetime) else time
+
+
+class SessionStore():
+    def __init__(self, file_name=SESSION_STORE_FILE):
+        self.file_name = file_name
+        with closing(self.connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self):
+        # one short lived connection per call so the store can be used from
+        # the GUI thread and from export/ingest threads alike
+        connection = sqlite3.connect(self.file_name)
+        connection.execute('PRAGMA foreign_keys = ON')
+        return connection
+
+    def add_session(self, file_name):
+        file_name = os.path.abspath(file_name)
+        stat = os.stat(file_name)
+        with closing(self.connect()) as connection, connection:
+            existing = connection.execute(
+                'SELECT id, file_size, file_mtime FROM sessions WHERE file_name = ?',
+                (file_name,)).fetchone()
+            if existing != None:
+                if existing[1] == stat.st_size and existing[2] == stat.st_mtime:
+                    return False
+                connection.execute(
+                    'DELETE FROM sessions WHERE id = ?', (existing[0],))
+
+            session = load_session(file_name)
+            if len(session) == 0:
+                return False
+
+            # an export of part of a session, or an earlier export of one
+            # still recording, would count its samples twice. the longest
+            # export of a time range is kept
+            start_time, end_time = float(session.times[0]), float(session.times[-1])
+            if connection.execute(
+                    'SELECT 1 FROM sessions WHERE start_time <= ? AND end_time >= ?',
+                    (start_time, end_time)).fetchone() != None:
+                return False
+            connection.execute(
+                'DELETE FROM sessions WHERE start_time >= ? AND end_time <= ?',
+                (start_time, end_time))
+
+            session_id = connection.execute(
+                'INSERT INTO sessions (file_name, name, layout, start_time, end_time, '
+                'num_rows, file_size, file_mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (file_name, session.name, session.layout, start_time,
+                 end_time, len(session), stat.st_size, stat.st_mtime)
+            ).lastrowid
+
+            for (esc, measurement), values in session.channels.items():
+                present = ~np.isnan(values)
+                if not present.any():
+                    continue
+                present_values = values[present]
+                channel_id = connection.execute(
+                    'INSERT INTO channels (session_id, esc, measurement, count, '
+                    'minimum, maximum, total) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (session_id, esc or '', measurement, int(present.sum()),
+                     float(present_values.min()), float(present_values.max()),
+                     float(present_values.sum()))
+                ).lastrowid
+                connection.executemany(
+                    'INSERT INTO samples (channel_id, time, value) VALUES (?, ?, ?)',
+                    zip([channel_id] * len(present_values),
+                        session.times[present].tolist(), present_values.tolist()))
+        return True
+
+    def ingest(self, paths):
+        num_added = 0
+        for file_name in find_session_files(paths):
+            try:
+                if self.add_session(file_name):
+                    num_added += 1
+            except (OSError, ValueError, IndexError) as error:
+                print(f"SKIPPED {file_name}: {error}")
+        return num_added
+
+    def get_session_filter(self, start=None, end=None, sessions=None):
+        conditions = []
+        params = []
+        if start != None:
+            conditions.append('sessions.end_time >= ?')
+            params.append(to_unix_time(start))
+        if end != None:
+            conditions.append('sessions.start_time <= ?')
+            params.append(to_unix_time(end))
+        if sessions != None:
+            conditions.append(
+                f"sessions.name IN ({', '.join('?' * len(sessions))})")
+            params.extend(sessions)
+        return conditions, params
+
+    def list_sessions(self, start=None, end=None, layout=None):
+        conditions, params = self.get_session_filter(start, end)
+        if layout != None:
+            conditions.append('layout = ?')
+            params.append(layout)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with closing(self.connect()) as connection:
+            rows = connection.execute(
+                'SELECT name, file_name, layout, start_time, end_time, num_rows '
+                f"FROM sessions {where} ORDER BY start_time", params).fetchall()
+        return [{
+            'name': name,
+            'file_name': file_name,
+            'layout': layout,
+            'start_time': datetime.fromtimestamp(start_time),
+            'end_time': datetime.fromtimestamp(end_time),
+            'num_rows': num_rows,
+        } for name, file_name, layout, start_time, end_time, num_rows in rows]
+
+    def get_channel_ids(self, connection, measurement, esc=None, start=None, end=None, sessions=None):
+        conditions, params = self.get_session_filter(start, end, sessions)
+        conditions = ['channels.measurement = ?',
+                      'channels.esc = ?'] + conditions
+        params = [measurement, esc or ''] + params
+        return connection.execute(
+            'SELECT channels.id, sessions.name FROM channels '
+            'JOIN sessions ON sessions.id = channels.session_id '
+            f"WHERE {' AND '.join(conditions)}", params).fetchall()
+
+    def query(self, measurement, esc=None, start=None, end=None, sessions=None):
+        # rows of (session name, datetime, value) ordered by time
+        results = []
+        with closing(self.connect()) as connection:
+            for channel_id, session_name in self.get_channel_ids(
+                    connection, measurement, esc, start, end, sessions):
+                rows = connection.execute(
+                    'SELECT time, value FROM samples WHERE channel_id = ? '
+                    'AND time BETWEEN ? AND ? ORDER BY time',
+                    (channel_id,
+                     to_unix_time(start) if start != None else float('-inf'),
+                     to_unix_time(end) if end != None else float('inf'))
+                ).fetchall()
+                results.extend((session_name, datetime.fromtimestamp(time), value)
+                               for time, value in rows)
+        results.sort(key=lambda row: row[1])
+        return results
+
+    def aggregate(self, measurement, esc=None, func='max', start=None, end=None, sessions=None):
+        with closing(self.connect()) as connection:
+            if start == None and end == None:
+                # whole sessions are answered from the per channel summaries
+                summary = {
+                    'max': 'MAX(maximum)',
+                    'min': 'MIN(minimum)',
+                    'mean': 'SUM(total) / SUM(count)',
+                    'count': 'SUM(count)',
+                }[func]
+                conditions, params = self.get_session_filter(
+                    sessions=sessions)
+                conditions = ['channels.measurement = ?',
+                              'channels.esc = ?'] + conditions
+                return connection.execute(
+                    f"SELECT {summary} FROM channels "
+                    'JOIN sessions ON sessions.id = channels.session_id '
+                    f"WHERE {' AND '.join(conditions)}",
+                    [measurement, esc or ''] + params).fetchone()[0]
+
+            channel_ids = [channel_id for channel_id, _ in self.get_channel_ids(
+                connection, measurement, esc, start, end, sessions)]
+            if len(channel_ids) == 0:
+                return None
+            return connection.execute(
+                f"SELECT {AGGREGATES[func]} FROM samples "
+                f"WHERE channel_id IN ({', '.join('?' * len(channel_ids))}) "
+                'AND time BETWEEN ? AND ?',
+                channel_ids + [
+                    to_unix_time(start) if start != None else float('-inf'),
+                    to_unix_time(end) if end != None else float('inf')]
+            ).fetchone()[0]
+
+    def session_summaries(self, measurement, esc=None, start=None, end=None, sessions=None):
+        conditions, params = self.get_session_filter(start, end, sessions)
+        conditions = ['channels.measurement = ?',
+                      'channels.esc = ?'] + conditions
+        with closing(self.connect()) as connection:
+            rows = connection.execute(
+                'SELECT sessions.name, channels.minimum, channels.maximum, '
+                'channels.total / channels.count, channels.count FROM channels '
+                'JOIN sessions ON sessions.id = channels.session_id '
+                f"WHERE {' AND '.join(conditions)} ORDER BY sessions.start_time",
+                [measurement, esc or ''] + params).fetchall()
+        return [{'name': name, 'min': minimum, 'max': maximum, 'mean': mean, 'count': count}
+                for name, minimum, maximum, mean, count in rows]
+
+
+def parse_time_arg(text):
+    return datetime.strptime(text, '%Y_%m_%d_%H_%M_%S') if text != None else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Index exported telemetry sessions and query them')
+    parser.add_argument('--db', default=SESSION_STORE_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest')
+    ingest_parser.add_argument('paths', nargs='*', default=['.'])
+
+    sessions_parser = commands.add_parser('sessions')
+
+    query_parser = commands.add_parser('query')
+    query_parser.add_argument('measurement')
+    query_parser.add_argument('--esc')
+    query_parser.add_argument('--func', choices=list(AGGREGATES.keys()))
+    query_parser.add_argument('--per-session', action='store_true')
+    query_parser.add_argument(
+        '--start', help='YYYY_MM_DD_HH_MM_SS, same as export file names')
+    query_parser.add_argument('--end')
+
+    args = parser.parse_args()
+    store = SessionStore(args.db)
+
+    if args.command == 'ingest':
+        print(f"added {store.ingest(args.paths)} sessions to {args.db}")
+    elif args.command == 'sessions':
+        for session in store.list_sessions():
+            print(f"{session['name']}  {session['start_time']}  {session['layout']}  "
+                  f"{session['num_rows']} rows")
+    elif args.command == 'query':
+        start, end = parse_time_arg(args.start), parse_time_arg(args.end)
+        if args.per_session:
+            for summary in store.session_summaries(args.measurement, args.esc, start, end):
+                print(f"{summary['name']}  min {summary['min']}  max {summary['max']}  "
+                      f"mean {round(summary['mean'], 2)}")
+        elif args.func != None:
+            print(store.aggregate(args.measurement,
+                  args.esc, args.func, start, end))
+        else:
+            writer = sys.stdout
+            for session_name, time, value in store.query(args.measurement, args.esc, start, end):
+                writer.write(f"{session_name},{time.isoformat()},{value}\n")
@@ -1,47 +1,133 @@
-from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QComboBox, QProgressBar, QSizePolicy
-from PyQt5.QtGui import QFont, QPainter, QPixmap
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QComboBox, QProgressBar, QSizePolicy, QLineEdit
+from PyQt5.QtGui import QFont, QPainter, QPixmap, QColor
 from PyQt5.QtCore import QTimer, QThread, pyqtSignal, Qt
 import pyqtgraph as pg
-import csv
-import serial
+import os
+import signal
 import sys
+import re
+import threading
+import time
+from bisect import bisect_left
 from serial.tools import list_ports
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
+from array import array
+
+from retention import RetentionPolicy, SpillSegment, RawSpill, summarize
+from run_length import RunLengthValues
+from calibration import Calibration, CalibratedValues
+from segments import SessionIndex, Segment
+from time_axis import PLOT_WINDOW_SECONDS, get_window, get_live_range, break_gaps
+from session_store import SessionStore
+from derived_channels import DerivedChannel, INTERVAL, rpm_per_amp
+from event_detection import EventEngine, Event, EVENT_HEADERS
+from alarm_rules import AlarmRule, create_alarm_rule
+from framing import FrameParser, parse_frame
+from battery_forecast import BatteryForecast, format_remaining
+from latency import LatencyTracker, LatencyOverlay
+from link_quality import LinkQuality, LinkQualityLabel, spread_capture_times
+from tracing import TRACER, traced
+from views import PlotView
+from memory import MemoryMonitor, MemoryOverlay, MEMORY_HEADERS, DEFAULT_BUDGET, LOG_SUFFIX
+from http_api import TelemetryServer, start_from_env
+from export_jobs import ExportQueue, ExportSnapshot, CSV, CHANGES, NPZ, RAW
+from serial_connection import SerialConnection, PortDropdown, CONNECTED
 
 
 class SerialReaderThread(QThread):
-    new_data = pyqtSignal(str)
-    timestamps = []
-    raw_data = []
+    # line, its parsed values, capture time and emit time (time.perf_counter)
+    new_data = pyqtSignal(str, object, float, float)
+    # connection state, see serial_connection.py
+    connection_changed = pyqtSignal(str)
 
-    def __init__(self, port, parent=None):
+    def __init__(self, port, retention=None, parent=None):
         super().__init__(parent)
-        self.baudrate = 115200
-        self.serial_port = serial.Serial(port, self.baudrate)
-        self.serial_port.flushInput()
+        self.connection = SerialConnection(port)
+        self.connection.on_state_change = self.on_state_change
+        # capture time of the last frame, the next read's frames are spread
+        # after it
+        self.last_frame_time = None
+
+        self.timestamps = []
+        self.raw_data = []
+        self.retention = retention if retention != None else RetentionPolicy()
+        self.raw_spill = None
+        self.raw_lock = threading.Lock()
+        self.start_time = datetime.now()
+        self.frame_parser = FrameParser()
+
+    def on_state_change(self, state):
+        # frames after an outage are not spread over it
+        self.last_frame_time = None
+        self.connection_changed.emit(state)
 
     def set_port(self, port):
-        self.serial_port = serial.Serial(port, self.baudrate)
-        self.serial_port.flushInput()
+        # switched by the reader thread before its next read
+        self.connection.set_port(port)
 
     def run(self):
+        # QThreads show up as Dummy-n otherwise
+        threading.current_thread().name = 'SerialReaderThread'
         while True:
-            if self.serial_port.in_waiting:
-                line = self.serial_port.readline().decode().strip()
-                self.new_data.emit(line)
-                now = datetime.now()
+            # waits for data, or reconnects while the port is down
+            data = self.connection.read()
+            if len(data) > 0:
+                with TRACER.span('SerialReaderThread.read'):
+                    self.read_lines(data)
+
+    def read_lines(self, data):
+        capture_time = time.perf_counter()
+        now = datetime.now()
+        lines = self.frame_parser.feed(data)
+        capture_times = iter(self.get_capture_times(lines, capture_time))
+        # only validated frames reach the GUI, everything is kept raw
+        for line, values in lines:
+            if values != None:
+                self.new_data.emit(line, values, next(capture_times), time.perf_counter())
+            with self.raw_lock:
                 self.timestamps.append(now)
                 self.raw_data.append(line)
-                now_str = f"{now.strftime('%H_%M_%S.')}{round(now.microsecond / 10000):02d}"
-                print(f"{now_str} {line}")
+                if len(self.raw_data) % self.retention.summary_bucket_size == 0:
+                    self.spill_raw_data(now)
+            now_str = f"{now.strftime('%H_%M_%S.')}{round(now.microsecond / 10000):02d}"
+            print(f"{now_str} {line}")
+
+    def get_capture_times(self, lines, capture_time):
+        # one per valid frame, a read often holds several
+        num_frames = sum(values != None for _, values in lines)
+        capture_times = spread_capture_times(self.last_frame_time, capture_time, num_frames)
+        if num_frames > 0:
+            self.last_frame_time = capture_time
+        return capture_times
+
+    def spill_raw_data(self, now):
+        cutoff = now - timedelta(seconds=self.retention.hot_window_seconds)
+        num_spilled = bisect_left(self.timestamps, cutoff)
+        if num_spilled == 0:
+            return
 
-    def export_raw_data(self):
-        now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-        file_name = f"telemetry_{now}_raw.csv"
-        with open(file_name, "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerows(self.raw_data)
+        if self.raw_spill == None:
+            self.raw_spill = RawSpill(self.retention.get_spill_file_name(
+                'telemetry', self.start_time, 'raw.txt'))
+        self.raw_spill.append_lines(
+            self.timestamps[:num_spilled], self.raw_data[:num_spilled])
+        del self.timestamps[:num_spilled]
+        del self.raw_data[:num_spilled]
+
+    def get_raw_snapshot(self):
+        # spilled lines are read later by the export job, without the lock
+        with self.raw_lock:
+            raw_spill = None if self.raw_spill == None else self.raw_spill.get_snapshot()
+            return raw_spill, list(self.raw_data)
+
+    def clear_raw_data(self):
+        with self.raw_lock:
+            self.timestamps = []
+            self.raw_data = []
+            if self.raw_spill != None:
+                self.raw_spill.close()
+                self.raw_spill = None
 
 
 DRIVE_ESC_1 = 'Drive ESC 1'
@@ -61,8 +147,72 @@ TOTAL_CURRENT = 'Total Current'
 TOTAL_CONSUMPTION = 'Total Consumption'
 SIGNAL_STRENGTH = 'Signal Strength'
 
+POWER = 'Power'
+ENERGY = 'Energy'
+EFFICIENCY = 'Efficiency'
+TOTAL_POWER = 'Total Power'
+BATTERY_PERCENTAGE = 'Battery'
+
+BATTERY_CAPACITY = 12000  # mAh, default when a robot does not set one
+BATTERY_CUTOFF_VOLTAGE = 19.8  # 6S at 3.3 V per cell
+
 FONT_FAMILY = 'Bahnschrift'
 
+# run against serial_simulator instead of a radio: python telemetry_bars.py simulate
+SIMULATE_ARG = 'simulate'
+# no window, only recording and the memory report printed every
+# MEMORY_INTERVAL_MS, e.g. for soak tests: python telemetry_bars.py simulate headless
+HEADLESS_ARG = 'headless'
+
+# change slowly enough that storing only the changes saves memory
+SLOW_MEASUREMENTS = [TEMP, CONSUMPTION, VOLTAGE, INPUT_SIGNAL, ENERGY,
+                     BATTERY_VOLTAGE, TOTAL_CONSUMPTION, BATTERY_PERCENTAGE]
+# a run costs its 8 byte start plus the value, so a slow channel whose raw
+# counts change more often than this (e.g. the weapon ESC's temperature
+# counts, which flicker between neighbours) goes back to a plain array
+MAX_RUN_FRACTION = 0.1
+# checked every this many samples, once there are at least this many
+RUN_CHECK_SAMPLES = 1000
+
+# the memory report is sampled this often, see memory.py
+MEMORY_INTERVAL_MS = 10000
+
+# jump dropdown entry that follows the incoming data
+LIVE_VIEW = 'Live'
+
+# raw serial lines are saved alongside every export
+EXPORT_OPTIONS = {
+    'CSV': [CSV, RAW],
+    'Compressed (npz)': [NPZ, RAW],
+    'CSV + compressed': [CSV, NPZ, RAW],
+    'CSV, changes only': [CHANGES, RAW],
+}
+
+# raw counts in a frame to values. the drive ESCs send hundredths of a volt
+# or amp and eRPM / 6 per 100, the weapon and arm ESCs send fractions of
+# 2042 counts full scale. signal strength is a signed dBm count.
+WEAPON_SCALE = 2042
+DRIVE_CALIBRATION = {
+    TEMP: Calibration(),
+    VOLTAGE: Calibration(1 / 100, decimals=2),
+    CURRENT: Calibration(1 / 100, decimals=2),
+    CONSUMPTION: Calibration(),
+    RPM: Calibration(100 / 6),
+}
+WEAPON_CALIBRATION = {
+    TEMP: Calibration(30 / WEAPON_SCALE, decimals=1),
+    VOLTAGE: Calibration(20 / WEAPON_SCALE, decimals=2),
+    CURRENT: Calibration(50 / WEAPON_SCALE, decimals=2),
+    RPM: Calibration(20416.66 / 7 / WEAPON_SCALE),
+}
+FRAME_CALIBRATIONS = {
+    DRIVE_ESC_1: DRIVE_CALIBRATION,
+    DRIVE_ESC_2: DRIVE_CALIBRATION,
+    WEAPON_ESC: WEAPON_CALIBRATION,
+    ARM_ESC: WEAPON_CALIBRATION,
+}
+SIGNAL_STRENGTH_CALIBRATION = Calibration()
+
 UNITS = {
     TEMP: "°C",
     RPM: "",
@@ -73,7 +223,12 @@ UNITS = {
     BATTERY_VOLTAGE: "V",
     TOTAL_CURRENT: "A",
     TOTAL_CONSUMPTION: "mAh",
-    SIGNAL_STRENGTH: "dBm"
+    SIGNAL_STRENGTH: "dBm",
+    POWER: "W",
+    ENERGY: "Wh",
+    EFFICIENCY: "RPM/A",
+    TOTAL_POWER: "W",
+    BATTERY_PERCENTAGE: "%"
 }
 
 
@@ -83,12 +238,17 @@ class CustomProgressBar(QProgressBar):
         self.setTextVisible(False)
         self.unclamped_value = 0
         self.unit = unit
+        self.alarm_color = None
 
     def set_value(self, value):
-        super().setValue(self.clamp_value(value))
+        super().setValue(round(self.clamp_value(value)))
         self.unclamped_value = value
         self.update()
 
+    def set_alarm_color(self, color):
+        self.alarm_color = color
+        self.update()
+
     def clamp_value(self, unclamped_value):
         max_value = self.maximum()
         min_value = self.minimum()
@@ -105,8 +265,12 @@ class CustomProgressBar(QProgressBar):
             (max_value - min_value)
         fill_width = int(self.width() * proportion)
 
-        bar_color = self.palette().highlight(
-        ) if self.unclamped_value <= max_value else Qt.red
+        if self.unclamped_value > max_value:
+            bar_color = Qt.red
+        elif self.alarm_color != None:
+            bar_color = QColor(self.alarm_color)
+        else:
+            bar_color = self.palette().highlight()
         painter.fillRect(0, 0, fill_width, self.height(), bar_color)
 
         painter.setPen(self.palette().color(self.palette().WindowText))
@@ -122,14 +286,27 @@ class CustomProgressBar(QProgressBar):
 
 
 class Measurement():
-    def __init__(self, name, minimum=0, maximum=100, is_shown=True, should_plot=True):
+    def __init__(self, name, minimum=0, maximum=100, is_shown=True, should_plot=True,
+                 alarm_rule: AlarmRule = None):
         self.name = name
         self.unit = UNITS[name]
 
+        self.run_length = False
+        # set for values decoded from frames, which then store the raw counts
+        self.calibration: Calibration = None
+        self.typecode = 'H'
         self.values = []
         self.minimum = minimum
         self.maximum = maximum
 
+        # older values live in the robot's spill segment, only a decimated
+        # summary of them stays in memory for plotting the full history
+        self.num_spilled = 0
+        self.summary_x = []
+        self.summary_values = []
+
+        self.event_markers: list[Event] = []
+
         self.is_shown = is_shown
         self.should_plot = should_plot
 
@@ -140,11 +317,77 @@ class Measurement():
 
         self.init_plot()
 
+        self.alarm_rule = alarm_rule
+        if self.alarm_rule != None:
+            self.alarm_rule.add_action(self.on_alarm_level)
+
     def get_current_value(self):
         return self.values[-1] if len(self.values) > 0 else self.minimum
 
     def add_value(self, value):
         self.values.append(value)
+        if self.run_length and len(self.values) % RUN_CHECK_SAMPLES == 0:
+            self.check_run_length()
+
+    def check_run_length(self):
+        stored_values = self.get_stored_values()
+        if len(stored_values) >= RUN_CHECK_SAMPLES and \
+                stored_values.get_num_runs() > MAX_RUN_FRACTION * len(stored_values):
+            self.set_run_length(False)
+
+    def set_run_length(self, run_length):
+        # values are only stored when they change, see RunLengthValues
+        stored_values = self.get_stored_values()
+        self.run_length = run_length
+        self.values = self.new_values(stored_values)
+
+    def set_calibration(self, calibration, typecode='H'):
+        # the first calibration switches storage to raw counts in a compact
+        # array of typecode, later ones only change how they are read, so a
+        # wrong scale can be fixed after recording
+        if self.calibration != None:
+            self.calibration = calibration
+            self.values.calibration = calibration
+            return
+        values = self.values
+        self.calibration = calibration
+        self.typecode = typecode
+        self.values = self.new_values(
+            [calibration.to_raw(value) for value in values])
+
+    def new_values(self, stored_values=()):
+        if self.run_length:
+            # raw counts keep their integer type, computed values are doubles
+            stored_values = RunLengthValues(
+                stored_values, self.typecode if self.calibration != None else 'd')
+        elif self.calibration != None:
+            stored_values = array(self.typecode, stored_values)
+        else:
+            stored_values = list(stored_values)
+        if self.calibration == None:
+            return stored_values
+        return CalibratedValues(self.calibration, stored_values)
+
+    def get_stored_values(self):
+        # what is kept in memory and spilled, raw counts when calibrated
+        return self.values.counts if self.calibration != None else self.values
+
+    def calibrate(self, stored_values):
+        if self.calibration == None:
+            return stored_values
+        return self.calibration.apply(stored_values)
+
+    def spill_values(self, num_spilled, bucket_size, seconds):
+        # seconds are the capture times of the spilled values. the summary
+        # keeps raw counts too and is calibrated when plotted
+        spilled_values = self.get_stored_values()[:num_spilled]
+        if len(spilled_values) > 0:
+            summary_x, summary_values = summarize(
+                spilled_values, bucket_size)
+            self.summary_x.extend(seconds[x] for x in summary_x)
+            self.summary_values.extend(summary_values)
+        self.num_spilled += len(spilled_values)
+        del self.values[:num_spilled]
 
     def init_name_label(self, name):
         self.name_label = QLabel(name + "  ")
@@ -199,23 +442,70 @@ class Measurement():
         pg.setConfigOption('background', 'w')
         self.graph = pg.PlotWidget()
         self.pen_options = pg.mkPen('k', width=1)
+        self.marker_pen = pg.mkPen('r', width=1, style=Qt.DashLine)
 
+    def add_event_marker(self, event):
+        self.event_markers.append(event)
+
+    @traced('Measurement.update_value_bar', lambda measurement, *args: {'name': measurement.name})
     def update_value_bar(self):
         self.value_bar.set_value(self.get_current_value())
 
+    def update_alarm(self):
+        # styles are only touched when the rule changes level
+        if self.alarm_rule != None and len(self.values) > 0:
+            self.alarm_rule.evaluate(self.values[-1])
+
+    def on_alarm_level(self, level, escalated):
+        self.value_label.setStyleSheet(level.get_label_style())
+        self.value_bar.set_alarm_color(level.color)
+        if escalated and level.alert:
+            QApplication.beep()
+
     def update_value_label(self):
         self.value_label.setText(f"{self.get_current_value()} {self.unit}")
 
-    def update_plot(self):
+    def get_plot_data(self, seconds, x_range):
+        # seconds are the capture times of the hot values, x_range is the
+        # (min, max) seconds from start to show. only the samples inside it
+        # are read, found by bisecting the sorted times, so every view pays
+        # for its own window and nothing is copied beyond it.
+        # returns the summary and hot (xs, ys), and the events in the window.
+        min_x, max_x = x_range
+        summary = None
+        if len(self.summary_values) > 0:
+            first, last = get_window(self.summary_x, min_x, max_x)
+            first, last = max(first - 1, 0), min(last + 1, len(self.summary_x))
+            summary = (self.summary_x[first:last],
+                       self.calibrate(self.summary_values[first:last]))
+
+        # one sample past each edge so the line reaches the border
+        hot = None
+        first, last = get_window(seconds, min_x, max_x)
+        first, last = max(first - 1, 0), min(last + 1, len(seconds), len(self.values))
+        if last > first:
+            hot = break_gaps(seconds[first:last], self.values[first:last])
+
+        events = [event for event in self.event_markers
+                  if min_x <= event.time <= max_x]
+        return summary, hot, events
+
+    @traced('Measurement.update_plot', lambda measurement, *args: {'name': measurement.name})
+    def update_plot(self, seconds, x_range):
         self.graph.clear()
-        self.graph.plot(self.values, pen=self.pen_options)
-        num_values = len(self.values)
-        n = 50
-        min_x = max(num_values-1-n, 0)
-        max_x = num_values-1
+        min_x, max_x = x_range
+        summary, hot, events = self.get_plot_data(seconds, x_range)
+        if summary != None:
+            self.graph.plot(*summary, pen=self.pen_options)
+        if hot != None:
+            self.graph.plot(*hot, pen=self.pen_options, connect='finite')
         min_y = self.minimum
         max_y = self.maximum
 
+        for event in events:
+            self.graph.addItem(pg.InfiniteLine(
+                event.time, pen=self.marker_pen, label=event.name))
+
         self.graph.getPlotItem().getViewBox().setRange(
             xRange=(min_x, max_x), yRange=(min_y, max_y))
 
@@ -224,40 +514,108 @@ class Measurement():
             self.minimum,
             round(self.maximum * 1.2)
         )
+        if self.calibration != None:
+            random_value = self.calibration.to_raw(random_value)
         self.add_value(random_value)
 
     def clear_values(self):
-        self.values = []
+        self.values = self.new_values()
+        self.num_spilled = 0
+        self.summary_x = []
+        self.summary_values = []
+        self.event_markers = []
+        if self.alarm_rule != None and self.alarm_rule.level_index != 0:
+            self.alarm_rule.reset()
+            self.on_alarm_level(self.alarm_rule.get_level(), False)
 
 
 class SignalStrengthMeasurement(Measurement):
     def __init__(self, name, minimum=0, maximum=100, is_shown=True):
-        super().__init__(name, minimum, maximum, is_shown)
-
-    def update_value_label(self):
-        value = self.get_current_value()
-        if value < -90:
-            self.value_label.setStyleSheet('background-color: red;')
-        elif value < -80:
-            self.value_label.setStyleSheet('background-color: orange;')
-        elif value < -70:
-            self.value_label.setStyleSheet('background-color: yellow;')
-        super().update_value_label()
+        super().__init__(name, minimum, maximum, is_shown,
+                         alarm_rule=create_alarm_rule(SIGNAL_STRENGTH))
 
 
 class TemperatureMeasurement(Measurement):
     def __init__(self, name, minimum=0, maximum=100, is_shown=True):
+        super().__init__(name, minimum, maximum, is_shown,
+                         alarm_rule=create_alarm_rule(TEMP))
+
+
+class DerivedMeasurement(Measurement):
+    def __init__(self, name, inputs, expression, minimum=0, maximum=100, is_shown=True, accumulate=False):
+        self.channel = DerivedChannel(inputs, expression, accumulate)
+        self.input_measurements: list[Measurement] = []
+        self.robot = None
+        self.last_timestamp = None
         super().__init__(name, minimum, maximum, is_shown)
 
-    def update_value_label(self):
-        value = self.get_current_value()
-        if value >= 85:
-            self.value_label.setStyleSheet('background-color: red;')
-        elif value >= 75:
-            self.value_label.setStyleSheet('background-color: orange;')
-        elif value >= 68:
-            self.value_label.setStyleSheet('background-color: yellow;')
-        super().update_value_label()
+    def bind(self, input_measurements, robot):
+        # None stands for the INTERVAL input, taken from the robot timestamps
+        self.input_measurements = input_measurements
+        self.robot = robot
+
+    def refresh(self):
+        # only samples that arrived since the last read are computed
+        if self.robot == None:
+            return
+        for measurement in self.input_measurements:
+            if isinstance(measurement, DerivedMeasurement):
+                measurement.refresh()
+
+        timestamps = self.robot.timestamps
+        start = len(self.values)
+        stop = min([len(timestamps)] + [len(measurement.values)
+                   for measurement in self.input_measurements if measurement != None])
+        if stop <= start:
+            return
+
+        input_values = []
+        for measurement in self.input_measurements:
+            if measurement == None:
+                input_values.append(self.get_intervals(timestamps, start, stop))
+            else:
+                input_values.append(measurement.values[start:stop])
+        self.values.extend(self.channel.evaluate(input_values))
+        self.last_timestamp = timestamps[stop - 1]
+        if self.run_length:
+            self.check_run_length()
+
+    def get_intervals(self, timestamps, start, stop):
+        previous = timestamps[start - 1] if start > 0 else self.last_timestamp
+        intervals = []
+        for timestamp in timestamps[start:stop]:
+            intervals.append((timestamp - previous).total_seconds()
+                             if previous != None else 0)
+            previous = timestamp
+        return intervals
+
+    def get_current_value(self):
+        self.refresh()
+        return super().get_current_value()
+
+    def get_plot_data(self, seconds, x_range):
+        self.refresh()
+        return super().get_plot_data(seconds, x_range)
+
+    def add_random_value(self):
+        # computed from the random base values on the next read
+        pass
+
+    def clear_values(self):
+        super().clear_values()
+        self.channel.reset()
+        self.last_timestamp = None
+
+
+def get_derived_esc_measurements():
+    return [
+        DerivedMeasurement(POWER, [VOLTAGE, CURRENT],
+                           lambda voltage, current: voltage * current, 0, 2000, False),
+        DerivedMeasurement(ENERGY, [POWER, INTERVAL],
+                           lambda power, interval: power * interval / 3600, 0, 100, False,
+                           accumulate=True),
+        DerivedMeasurement(EFFICIENCY, [RPM, CURRENT], rpm_per_amp, 0, 1000, False),
+    ]
 
 
 class ESC():
@@ -300,7 +658,9 @@ class ESC():
 
 
 class Robot():
-    def __init__(self, name, escs: list[ESC], serial_port):
+    def __init__(self, name, escs: list[ESC], serial_port, retention: RetentionPolicy = None,
+                 session_store: SessionStore = None, battery_capacity=BATTERY_CAPACITY,
+                 battery_cutoff_voltage=BATTERY_CUTOFF_VOLTAGE):
 
         self.name = name
         self.escs: dict[str, ESC] = {}
@@ -308,53 +668,312 @@ class Robot():
             self.escs[esc.name] = esc
 
         self.timestamps = []
+        self.seconds = []
         self.start_time = datetime.now()
 
+        self.retention = retention if retention != None else RetentionPolicy()
+        self.spill: SpillSegment = None
+
+        self.battery_capacity = battery_capacity
+        self.battery_forecast = BatteryForecast(
+            battery_capacity, battery_cutoff_voltage)
+
+        self.event_engine = EventEngine()
+
+        # frames are only stored while recording, into named segments
+        self.session_index = SessionIndex()
+        self.is_recording = True
+        self.session_index.start_segment(None, 0, self.start_time)
+        # (min, max) seconds from start the plots show, None follows the
+        # latest PLOT_WINDOW_SECONDS
+        self.view_range = None
+        self.latency = LatencyTracker()
+        self.link_quality = LinkQuality()
+        # other views reading this robot's data, see views.py
+        self.views: list[PlotView] = []
+        # optional HTTP API, published to on every repaint
+        self.api_server: TelemetryServer = None
+        self.memory = MemoryMonitor(DEFAULT_BUDGET, log_file=self.get_memory_log_file_name())
+        self.add_memory_sources()
+        self.export_queue = ExportQueue()
+
+        # every export is indexed so past sessions can be queried together.
+        # the default store is created by the first export, see get_session_store
+        self.session_store = session_store
+
         self.measurements: dict[str, Measurement] = {
             BATTERY_VOLTAGE: Measurement(BATTERY_VOLTAGE, 5, 28, True),
             TOTAL_CURRENT: Measurement(TOTAL_CURRENT, 0, 400, False),
-            TOTAL_CONSUMPTION: Measurement(TOTAL_CONSUMPTION, 0, 12000, False),
+            TOTAL_CONSUMPTION: Measurement(TOTAL_CONSUMPTION, 0, battery_capacity, False),
             SIGNAL_STRENGTH: SignalStrengthMeasurement(SIGNAL_STRENGTH, -100, 0, True),
+            BATTERY_PERCENTAGE: DerivedMeasurement(
+                BATTERY_PERCENTAGE, [TOTAL_CONSUMPTION],
+                lambda consumption: 100 - 100 * consumption / self.battery_capacity, 0, 100, True),
         }
 
+        esc_powers = [(esc.name, POWER) for esc in self
+                      if esc.active and POWER in esc.measurements]
+        if len(esc_powers) > 0:
+            self.measurements[TOTAL_POWER] = DerivedMeasurement(
+                TOTAL_POWER, esc_powers, lambda *powers: sum(powers), 0, 4000, False)
+        self.bind_derived_measurements()
+        for esc in self:
+            for name, calibration in FRAME_CALIBRATIONS[esc.name].items():
+                if name in esc.measurements:
+                    esc.measurements[name].set_calibration(calibration)
+        # the battery is read from the weapon ESC's voltage counts
+        self.measurements[BATTERY_VOLTAGE].set_calibration(
+            WEAPON_CALIBRATION[VOLTAGE])
+        self.measurements[SIGNAL_STRENGTH].set_calibration(
+            SIGNAL_STRENGTH_CALIBRATION, 'h')
+        for measurement in self.get_all_measurements():
+            if measurement.name in self.retention.run_length:
+                measurement.set_run_length(True)
+
         if serial_port != None:
-            self.serial_reader = SerialReaderThread(serial_port)
-            self.serial_reader.new_data.connect(self.handle_data)
-            self.serial_reader.start()
+            self.start_serial_reader(serial_port)
         else:
             print("NO PORT")
 
+    def start_serial_reader(self, port):
+        self.serial_reader = SerialReaderThread(port, self.retention)
+        self.serial_reader.new_data.connect(self.handle_data)
+        self.serial_reader.connection_changed.connect(self.on_connection_changed)
+        self.serial_reader.start()
+
+    def set_port(self, port):
+        # the reader and all data are kept, only the port changes
+        if hasattr(self, 'serial_reader'):
+            self.serial_reader.set_port(port)
+        else:
+            self.start_serial_reader(port)
+
+    def on_connection_changed(self, state):
+        if state == CONNECTED:
+            self.link_quality.restart()
+
+    def get_connection(self):
+        return self.serial_reader.connection if hasattr(self, 'serial_reader') else None
+
+    def get_connection_status(self):
+        if not hasattr(self, 'serial_reader'):
+            return "No port"
+        return self.serial_reader.connection.get_status_text()
+
     def __iter__(self):
         return iter(self.escs.values())
 
+    def add_view(self, view):
+        self.views.append(view)
+
+    def remove_view(self, view):
+        if view in self.views:
+            self.views.remove(view)
+
+    def add_memory_sources(self):
+        # what a long session accumulates, sized on every memory sample. the
+        # hot data fills the retention window before it levels off, summaries,
+        # events and the index grow with the session and are only budgeted
+        memory = self.memory
+        hot_window = self.retention.hot_window_seconds
+        memory.add_source('measurements', lambda: {
+            name: measurement.values for name, measurement in self.get_named_measurements()},
+            per_channel=True, window_seconds=hot_window)
+        memory.add_source('summaries', lambda: {
+            name: (measurement.summary_x, measurement.summary_values, measurement.event_markers)
+            for name, measurement in self.get_named_measurements()},
+            per_channel=True, grows=True)
+        memory.add_source('timestamps', lambda: (self.timestamps, self.seconds),
+                          window_seconds=hot_window)
+        memory.add_source('serial raw', lambda: (
+            self.serial_reader.timestamps, self.serial_reader.raw_data)
+            if hasattr(self, 'serial_reader') else (), window_seconds=hot_window)
+        memory.add_source('events', lambda: self.event_engine, grows=True)
+        memory.add_source('session index', lambda: self.session_index, grows=True)
+        memory.add_source('battery', lambda: self.battery_forecast,
+                          window_seconds=self.battery_forecast.consumption.window_seconds)
+        memory.add_source('latency', lambda: self.latency)
+        memory.add_source('link quality', lambda: self.link_quality)
+        memory.add_source('export jobs', lambda: self.export_queue.jobs)
+        # mirrors the hot data and the summaries
+        memory.add_source('api', lambda: self.api_server.state
+                          if self.api_server != None else None, grows=True)
+        memory.add_source('tracing', lambda: TRACER.buffer)
+        memory.add_counter('plot items', lambda: sum(
+            len(measurement.graph.getPlotItem().items)
+            for measurement in self.get_all_measurements()) + sum(
+            len(plot.graph.getPlotItem().items) for view in self.views for plot in view.plots))
+        memory.add_counter('export jobs', lambda: len(self.export_queue.jobs))
+
+    def get_memory_log_file_name(self):
+        return f"telemetry_{self.start_time.strftime('%Y_%m_%d_%H_%M_%S')}{LOG_SUFFIX}"
+
+    def get_named_measurements(self):
+        # (column name, measurement) of everything recorded, as exported
+        return [(f"{esc.name} {measurement.name}", measurement) for esc in self if esc.active
+                for measurement in esc] + list(self.measurements.items())
+
+    def get_session_info(self):
+        link_row = self.link_quality.get_row()
+        return {
+            'robot': self.name,
+            'start_time': self.start_time.isoformat(),
+            'recording': self.is_recording,
+            'samples': self.get_num_samples(),
+            'seconds': self.seconds[-1] if len(self.seconds) > 0 else 0,
+            'segments': [segment.name for segment in self.session_index.segments],
+            'bookmarks': [bookmark.name for bookmark in self.session_index.bookmarks],
+            'events': sum(len(measurement.event_markers)
+                          for measurement in self.get_all_measurements()),
+            'link': dict(zip(['frames', 'lost', 'loss_percent', 'gaps'], link_row[:4])),
+            'connection': self.get_connection_status(),
+        }
+
+    def start_api(self, host='127.0.0.1', port=8080):
+        self.api_server = TelemetryServer(host, port).start()
+        self.api_server.publish(self)
+        return self.api_server
+
+    def get_plot_channels(self):
+        # every plotted measurement of the active ESCs, then the robot's
+        channels = [(esc.name, measurement.name) for esc in self if esc.active
+                    for measurement in esc if measurement.should_plot]
+        return channels + [(None, name) for name, measurement in self.measurements.items()
+                           if measurement.should_plot]
+
+    def resolve_input(self, name, esc=None):
+        if name == INTERVAL:
+            return None
+        if isinstance(name, tuple):
+            esc_name, measurement_name = name
+            return self.escs[esc_name].measurements[measurement_name]
+        return esc.measurements[name] if esc != None else self.measurements[name]
+
+    def bind_derived_measurements(self):
+        for esc in self:
+            for measurement in esc:
+                if isinstance(measurement, DerivedMeasurement):
+                    measurement.bind([self.resolve_input(name, esc)
+                                      for name in measurement.channel.inputs], self)
+        for measurement in self.measurements.values():
+            if isinstance(measurement, DerivedMeasurement):
+                measurement.bind([self.resolve_input(name)
+                                  for name in measurement.channel.inputs], self)
+
+    def set_calibration(self, esc_name, measurement_name, calibration: Calibration):
+        # recalibrates the stored counts, hot and spilled, for plots, labels
+        # and later exports. derived values already computed from the old
+        # calibration are kept.
+        measurement = self.get_measurement(esc_name, measurement_name)
+        if measurement == None or measurement.calibration == None:
+            raise ValueError(f"{measurement_name} does not store raw counts")
+        measurement.set_calibration(calibration)
+
+    def get_measurement(self, esc_name, measurement_name):
+        if esc_name == None:
+            return self.measurements.get(measurement_name)
+        if not esc_name in self.escs:
+            return None
+        return self.escs[esc_name].measurements.get(measurement_name)
+
+    def detect_events(self):
+        # runs the detectors over the samples they have not seen yet
+        for channel in self.event_engine.rules:
+            measurement = self.get_measurement(*channel)
+            if measurement == None:
+                continue
+            hot_start = max(
+                self.event_engine.processed[channel] - measurement.num_spilled, 0)
+            seconds = self.seconds[hot_start:len(measurement.values)]
+            if len(seconds) == 0:
+                continue
+            values = measurement.values[hot_start:hot_start + len(seconds)]
+            for event in self.event_engine.update(
+                    channel, measurement.num_spilled + hot_start, seconds, values):
+                measurement.add_event_marker(event)
+
+    def refresh_derived_measurements(self):
+        for measurement in self.get_all_measurements():
+            if isinstance(measurement, DerivedMeasurement):
+                measurement.refresh()
+
+    def get_esc_measurements(self):
+        return [measurement for esc in self for measurement in esc]
+
+    def get_all_measurements(self):
+        return self.get_esc_measurements() + list(self.measurements.values())
+
+    def apply_retention(self, now):
+        # spill whole summary buckets of samples older than the hot window
+        bucket_size = self.retention.summary_bucket_size
+        cutoff = now - timedelta(seconds=self.retention.hot_window_seconds)
+        num_old = bisect_left(self.timestamps, cutoff)
+        num_spilled = num_old - num_old % bucket_size
+        if num_spilled == 0:
+            return
+
+        # derived values have to be caught up so all columns spill together
+        self.refresh_derived_measurements()
+        self.detect_events()
+        measurements = self.get_all_measurements()
+        if self.spill == None:
+            self.spill = SpillSegment(self.retention.get_spill_file_name(
+                'telemetry', self.start_time, 'bin'), len(measurements))
+        self.spill.append_rows(
+            self.timestamps[:num_spilled],
+            [measurement.get_stored_values() for measurement in measurements])
+        for measurement in measurements:
+            measurement.spill_values(
+                num_spilled, bucket_size, self.seconds[:num_spilled])
+        del self.timestamps[:num_spilled]
+        del self.seconds[:num_spilled]
+
+    def close_spill(self):
+        if self.spill != None:
+            self.spill.close()
+            self.spill = None
+        if hasattr(self, 'serial_reader'):
+            self.serial_reader.clear_raw_data()
+
+    @traced('Robot.add_parsed_data')
     def add_parsed_data(self, parsed_esc_data, signal_strength):
+        # parsed_esc_data holds raw counts, except the integrated weapon and
+        # arm consumption. only the totals are calibrated here.
         total_current = 0
         total_consumption = 0
         for esc, data in parsed_esc_data.items():
             if (self.escs[esc].active):
-                total_current += data[CURRENT]
-                total_consumption += data[CONSUMPTION]
+                measurements = self.escs[esc].measurements
                 for measurement in data:
-                    value = data[measurement]
-                    rounded_value = round(value)
-                    self.add_value(esc, measurement, rounded_value)
+                    self.add_value(esc, measurement, data[measurement])
                     # print(esc, data)
+                total_current += measurements[CURRENT].get_current_value()
+                total_consumption += measurements[CONSUMPTION].get_current_value()
 
         self.measurements[BATTERY_VOLTAGE].add_value(
-            round(parsed_esc_data[WEAPON_ESC][VOLTAGE]))
-        self.measurements[TOTAL_CURRENT].add_value(round(total_current))
+            parsed_esc_data[WEAPON_ESC][VOLTAGE])
+        self.measurements[TOTAL_CURRENT].add_value(round(total_current, 2))
         self.measurements[TOTAL_CONSUMPTION].add_value(
-            round(total_consumption))
+            round(total_consumption, 2))
         self.measurements[SIGNAL_STRENGTH].add_value(signal_strength)
 
-    def handle_data(self, received_data):
-        if (not "Data:" in received_data):
+    @traced('Robot.handle_data')
+    def handle_data(self, received_data, raw_data=None, capture_time=None, emit_time=None):
+        # raw_data are the values the reader already parsed, lines from
+        # elsewhere are parsed here
+        received_time = time.perf_counter()
+        if raw_data == None:
+            raw_data = parse_frame(received_data)
+        if raw_data == None:
+            return
+        # the link is measured while paused too
+        if capture_time != None:
+            self.link_quality.add_frame(capture_time, raw_data[34])
+        if not self.is_recording:
             return
 
         now = datetime.now()
-        self.timestamps.append(now)
-
-        raw_data = list(map(lambda str: int(str), received_data.split()[1:]))
+        self.add_timestamp(now)
         split_data = {
             DRIVE_ESC_1: raw_data[0:9],  # first 9
             DRIVE_ESC_2: raw_data[9:18],  # next 9
@@ -372,42 +991,65 @@ class Robot():
                 esc_data = split_data[esc_name]
                 parsed_esc_data[esc_name] = {
                     TEMP: esc_data[0],
-                    VOLTAGE: merge_bytes(esc_data[1], esc_data[2]) / 100,
-                    CURRENT: merge_bytes(esc_data[3], esc_data[4]) / 100,
+                    VOLTAGE: merge_bytes(esc_data[1], esc_data[2]),
+                    CURRENT: merge_bytes(esc_data[3], esc_data[4]),
                     CONSUMPTION: merge_bytes(esc_data[5], esc_data[6]),
-                    RPM: int(merge_bytes(esc_data[7], esc_data[8]) * 100 / 6)
+                    RPM: merge_bytes(esc_data[7], esc_data[8])
                 }
 
         for esc_name in [WEAPON_ESC, ARM_ESC]:
             if (self.escs[esc_name].active):
                 esc_data = split_data[esc_name]
-                scale_val = 2042
-                current = merge_bytes(
-                    esc_data[4], esc_data[5]) / scale_val * 50
+                measurements = self.escs[esc_name].measurements
+                current_count = merge_bytes(esc_data[4], esc_data[5])
+                current = measurements[CURRENT].calibration.apply_value(
+                    current_count)
 
                 delta_time_hours = (
                     now - self.timestamps[-2]).total_seconds() / 3600 if len(self.timestamps) > 2 else 0
                 curr_consumption = current * 1000 * delta_time_hours
-                prev_consumption = self.escs[esc_name].measurements[CONSUMPTION].get_current_value(
-                )
+                prev_consumption = measurements[CONSUMPTION].get_current_value()
                 parsed_esc_data[esc_name] = {
-                    TEMP: merge_bytes(esc_data[0], esc_data[1]) / scale_val * 30,
-                    VOLTAGE: merge_bytes(esc_data[2], esc_data[3]) / scale_val * 20,
-                    CURRENT: current,
-                    CONSUMPTION: prev_consumption + curr_consumption,
-                    RPM: int(merge_bytes(
-                        esc_data[6], esc_data[7]) / scale_val * 20416.66 / 7)
+                    TEMP: merge_bytes(esc_data[0], esc_data[1]),
+                    VOLTAGE: merge_bytes(esc_data[2], esc_data[3]),
+                    CURRENT: current_count,
+                    CONSUMPTION: round(prev_consumption + curr_consumption, 2),
+                    RPM: merge_bytes(esc_data[6], esc_data[7])
                 }
 
+        decoded_time = time.perf_counter()
         self.add_parsed_data(parsed_esc_data, split_data[SIGNAL_STRENGTH])
+        self.update_battery_forecast(now)
+        self.apply_retention(now)
+        if capture_time != None:
+            self.latency.record_frame(capture_time, emit_time, received_time,
+                                      decoded_time, time.perf_counter())
+
+    def add_timestamp(self, now):
+        self.timestamps.append(now)
+        # plots and event detection bisect these instead of the datetimes
+        self.seconds.append((now - self.start_time).total_seconds())
+
+    def update_battery_forecast(self, now):
+        self.battery_forecast.add_sample(
+            (now - self.start_time).total_seconds(),
+            self.measurements[TOTAL_CONSUMPTION].get_current_value(),
+            self.measurements[BATTERY_VOLTAGE].get_current_value())
 
     def add_random_values(self):
+        if not self.is_recording:
+            return
+        now = datetime.now()
+        self.add_timestamp(now)
+
         for esc in self:
             for measurement in esc:
                 measurement.add_random_value()
 
         for measurement in self.measurements.values():
             measurement.add_random_value()
+        self.update_battery_forecast(now)
+        self.apply_retention(now)
 
     def add_value(self, esc, measurement, value):
         self.escs[esc].measurements[measurement].add_value(value)
@@ -421,50 +1063,146 @@ class Robot():
         print('MOCK ' + mock_data)
         self.handle_data(mock_data)
 
+    @traced('Robot.repaint')
     def repaint(self):
+        self.detect_events()
+        x_range = self.get_plot_range()
         for esc in self:
             for measurement in esc:
+                measurement.update_alarm()
                 measurement.update_value_bar()
-                measurement.update_plot()
+                measurement.update_plot(self.seconds, x_range)
         for measurement in self.measurements.values():
+            measurement.update_alarm()
             measurement.update_value_label()
-            measurement.update_plot()
+            measurement.update_plot(self.seconds, x_range)
+        self.latency.record_paint()
+        if self.api_server != None:
+            self.api_server.publish(self)
 
     def clear_data(self):
-        for esc in self:
-            for measurement in esc:
-                measurement.clear_values()
+        for measurement in self.get_all_measurements():
+            measurement.clear_values()
+        self.timestamps = []
+        self.seconds = []
+        self.event_engine.reset()
+        self.battery_forecast.reset()
+        self.latency.reset()
+        self.link_quality.reset()
+        self.close_spill()
+        self.session_index.reset()
+        self.view_range = None
+        if self.is_recording:
+            self.session_index.start_segment(None, 0, datetime.now())
         self.repaint()
 
-    def export_to_csv(self, is_auto_saved=False):
-        csv_data = []
-
-        headers = ['Timestamp', 'Seconds from start']
-        for esc in self:
-            for measurement in esc:
-                headers.append(f"{esc.name} {measurement.name}")
-        csv_data.append(headers)
-
-        for i, timestamp in enumerate(self.timestamps):
-            formatted_timestamp = timestamp.strftime('%H_%M_%S_%f')
-            seconds_since_start = round(
-                (timestamp - self.start_time).total_seconds(), 3)
-            data_row = [formatted_timestamp, seconds_since_start]
-
-            for esc in self:
-                for measurement in esc:
-                    data_row.append(measurement.values[i] if len(
-                        measurement.values) > i else -1)
-            csv_data.append(data_row)
+    def get_session_store(self):
+        if self.session_store == None:
+            self.session_store = SessionStore()
+        return self.session_store
+
+    def get_num_samples(self):
+        # global index of the next sample, spilled ones included
+        return (len(self.spill) if self.spill != None else 0) + len(self.timestamps)
+
+    def start_segment(self, name=None):
+        self.is_recording = True
+        return self.session_index.start_segment(name, self.get_num_samples(), datetime.now())
+
+    def pause(self):
+        # frames are dropped until the next segment starts, the serial
+        # reader still keeps them in the raw log
+        self.is_recording = False
+        self.session_index.stop_segment(self.get_num_samples(), datetime.now())
+
+    def add_bookmark(self, name=None):
+        return self.session_index.add_bookmark(name, self.get_num_samples(), datetime.now())
+
+    def find_index(self, time):
+        # global index of the first sample at or after time, by bisecting the
+        # hot timestamps or the fixed width spill rows
+        num_spilled = len(self.spill) if self.spill != None else 0
+        if num_spilled == 0 or (len(self.timestamps) > 0 and time > self.timestamps[0]):
+            return num_spilled + bisect_left(self.timestamps, time)
+        low, high = 0, num_spilled
+        while low < high:
+            middle = (low + high) // 2
+            middle_time, _ = next(self.spill.read_rows(middle, middle + 1))
+            if middle_time < time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_index_range(self, item):
+        # samples of a segment, or of the plot window around a bookmark
+        if isinstance(item, Segment):
+            return item.start_index, item.stop_index if item.stop_index != None else self.get_num_samples()
+        half_window = timedelta(seconds=PLOT_WINDOW_SECONDS / 2)
+        return self.find_index(item.time - half_window), self.find_index(item.time + half_window)
+
+    def get_time_range(self, item):
+        # seconds from start of a segment, or around a bookmark
+        if isinstance(item, Segment):
+            stop_time = item.stop_time if item.stop_time != None else datetime.now()
+            return ((item.start_time - self.start_time).total_seconds(),
+                    (stop_time - self.start_time).total_seconds())
+        seconds = (item.time - self.start_time).total_seconds()
+        return seconds - PLOT_WINDOW_SECONDS / 2, seconds + PLOT_WINDOW_SECONDS / 2
+
+    def get_plot_range(self):
+        if self.view_range != None:
+            return self.view_range
+        return get_live_range(self.seconds)
+
+    def jump_to(self, name):
+        item = self.session_index.find(name)
+        self.view_range = None if item == None else self.get_time_range(item)
+        self.repaint()
 
+    @traced('Robot.export_to_csv')
+    def export_to_csv(self, is_auto_saved=False, formats=(CSV, RAW), segment: Segment = None):
+        # only the snapshot is taken here, files are written by a background
+        # job so the GUI and serial reader keep running. a segment, or the
+        # window around a bookmark, is exported on its own, named after it
+        self.refresh_derived_measurements()
+        self.detect_events()
+
+        esc_measurements = self.get_esc_measurements()
+        headers = [f"{esc.name} {measurement.name}"
+                   for esc in self for measurement in esc]
         now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
         file_name = f"telemetry_{now}_auto_saved.csv" if is_auto_saved else f"telemetry_{now}.csv"
-        with open(file_name, "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerows(csv_data)
-
+        if segment != None:
+            file_name = file_name.replace('.csv', '_' + re.sub(r'\W+', '_', segment.name) + '.csv')
+        snapshot = ExportSnapshot(
+            file_name, self.start_time, headers, list(self.timestamps),
+            [measurement.values.copy() for measurement in esc_measurements],
+            None if self.spill == None else self.spill.get_snapshot(),
+            calibrations=[measurement.calibration for measurement in esc_measurements])
+
+        event_rows = [EVENT_HEADERS]
+        for row in self.event_engine.get_event_rows(self.start_time):
+            row[0] = datetime.fromtimestamp(row[0]).strftime('%H_%M_%S_%f')
+            event_rows.append(row)
+        snapshot.event_rows = event_rows
+        if segment != None:
+            index_range = self.get_index_range(segment)
+            snapshot.set_row_range(*index_range)
+            snapshot.segment_rows = self.session_index.get_rows(self.start_time, *index_range)
+        else:
+            snapshot.segment_rows = self.session_index.get_rows(self.start_time)
+        snapshot.latency = self.latency.get_snapshot()
+        snapshot.link_quality = self.link_quality.get_snapshot()
+        snapshot.memory_rows = [MEMORY_HEADERS] + self.memory.get_rows()
+        if segment == None:
+            # only whole sessions are indexed, see SessionStore.add_session
+            snapshot.session_store = self.get_session_store()
         if hasattr(self, 'serial_reader'):
-            self.serial_reader.export_raw_data()
+            snapshot.set_raw(*self.serial_reader.get_raw_snapshot())
+            snapshot.connection_rows = self.serial_reader.connection.get_rows()
+
+        return self.export_queue.submit(snapshot, list(formats))
 
 
 class TelemetryGUI(QWidget):
@@ -477,14 +1215,14 @@ class TelemetryGUI(QWidget):
 
         self.should_auto_save = True
 
-        self.com_port_dropdown = QComboBox()
-        ports = list_ports.comports()
-        self.port_names = list(map(lambda port: port.name, ports))
-        self.com_port_dropdown.addItems(self.port_names)
+        self.com_port_dropdown = PortDropdown()
 
-        self.use_fake_data = sys.argv[1] if len(sys.argv) >= 2 else False
+        self.use_fake_data = sys.argv[1] if len(
+            sys.argv) >= 2 and sys.argv[1] != SIMULATE_ARG else False
 
         self.initialize_gui()
+        self.latency_overlay = LatencyOverlay(robot.latency, self)
+        self.memory_overlay = MemoryOverlay(robot.memory, self)
 
     def initialize_gui(self):
         self.main_layout = QHBoxLayout()
@@ -500,9 +1238,22 @@ class TelemetryGUI(QWidget):
 
         self.main_layout.addLayout(self.get_robot_column())
 
+        # plot views docked into the dashboard, see open_plot_view
+        self.dock_layout = QVBoxLayout()
+        self.main_layout.addLayout(self.dock_layout)
+
         self.timer = QTimer()
         self.timer.start(1000 if self.use_fake_data else 50)
 
+        self.memory_timer = QTimer()
+        self.memory_timer.timeout.connect(self.sample_memory)
+        self.memory_timer.start(MEMORY_INTERVAL_MS)
+
+        # keeps running while recording is paused
+        self.export_timer = QTimer()
+        self.export_timer.timeout.connect(self.update_export_status)
+        self.export_timer.start(200)
+
         self.start_recording()
 
     def get_robot_column(self):
@@ -536,17 +1287,85 @@ class TelemetryGUI(QWidget):
                     QSizePolicy.Preferred, QSizePolicy.Minimum)
                 robot_column.addWidget(measurement.value_label)
 
-        # self.com_port_dropdown = QComboBox()
-        # ports = list_ports.comports()
-        # self.port_names = list(map(lambda port: port.name, ports))
-        # self.com_port_dropdown.addItems(self.port_names)
+        self.link_quality_label = LinkQualityLabel(self.robot.link_quality)
+        self.link_quality_label.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(self.link_quality_label)
+
+        time_left_name_label = QLabel("Time left")
+        time_left_name_label.setFont(QFont(FONT_FAMILY, 24, QFont.Bold))
+        time_left_name_label.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(time_left_name_label)
+        self.time_left_label = QLabel(format_remaining(None))
+        self.time_left_label.setFont(QFont(FONT_FAMILY, 24, QFont.Normal))
+        self.time_left_label.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(self.time_left_label)
+
+        pg.setConfigOption('background', 'w')
+        self.forecast_graph = pg.PlotWidget()
+        self.forecast_graph.setMaximumHeight(150)
+        robot_column.addWidget(self.forecast_graph)
+
+        # switching keeps the recording, see Robot.set_port
+        self.com_port_dropdown.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        self.com_port_dropdown.activated.connect(
+            lambda index: self.robot.set_port(self.com_port_dropdown.port_names[index]))
+        robot_column.addWidget(self.com_port_dropdown)
+        self.connection_label = QLabel(self.robot.get_connection_status())
+        self.connection_label.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(self.connection_label)
+
+        self.export_format_dropdown = QComboBox()
+        self.export_format_dropdown.addItems(EXPORT_OPTIONS.keys())
+        self.export_format_dropdown.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(self.export_format_dropdown)
 
-        export_button = QPushButton("Export to CSV")
+        export_button = QPushButton("Export")
         export_button.setSizePolicy(
             QSizePolicy.Preferred, QSizePolicy.Minimum)
-        export_button.clicked.connect(self.robot.export_to_csv)
+        export_button.clicked.connect(lambda: self.robot.export_to_csv(
+            formats=EXPORT_OPTIONS[self.export_format_dropdown.currentText()]))
         robot_column.addWidget(export_button)
 
+        self.export_status_label = QLabel("")
+        self.export_status_label.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        robot_column.addWidget(self.export_status_label)
+
+        plot_view_button = QPushButton("Open plot view")
+        plot_view_button.setSizePolicy(
+            QSizePolicy.Preferred, QSizePolicy.Minimum)
+        plot_view_button.clicked.connect(self.open_plot_view)
+        robot_column.addWidget(plot_view_button)
+
+        self.segment_name_edit = QLineEdit()
+        self.segment_name_edit.setPlaceholderText("Segment or bookmark name")
+        robot_column.addWidget(self.segment_name_edit)
+
+        segment_row = QHBoxLayout()
+        new_segment_button = QPushButton("New segment")
+        new_segment_button.clicked.connect(self.new_segment)
+        segment_row.addWidget(new_segment_button)
+        bookmark_button = QPushButton("Bookmark")
+        bookmark_button.clicked.connect(self.add_bookmark)
+        segment_row.addWidget(bookmark_button)
+        robot_column.addLayout(segment_row)
+
+        jump_row = QHBoxLayout()
+        self.jump_dropdown = QComboBox()
+        self.jump_dropdown.currentTextChanged.connect(self.jump_to)
+        jump_row.addWidget(self.jump_dropdown)
+        export_segment_button = QPushButton("Export selection")
+        export_segment_button.clicked.connect(self.export_segment)
+        jump_row.addWidget(export_segment_button)
+        robot_column.addLayout(jump_row)
+        self.update_jump_dropdown()
+
         self.stop_button = QPushButton("Pause recording")
         self.stop_button.setSizePolicy(
             QSizePolicy.Preferred, QSizePolicy.Minimum)
@@ -562,10 +1381,59 @@ class TelemetryGUI(QWidget):
         return robot_column
 
     def update_gui(self):
-        if (self.use_fake_data):
-            # self.robot.mock_handle_data()
-            self.robot.add_random_values()
-        self.robot.repaint()
+        start = time.perf_counter()
+        with TRACER.span('TelemetryGUI.update_gui'):
+            if (self.use_fake_data):
+                # self.robot.mock_handle_data()
+                self.robot.add_random_values()
+            self.robot.repaint()
+            self.update_battery_forecast()
+            self.link_quality_label.refresh()
+            self.connection_label.setText(self.robot.get_connection_status())
+            self.com_port_dropdown.refresh_on_attempt(self.robot.get_connection())
+            self.latency_overlay.refresh()
+        TRACER.check_frame(time.perf_counter() - start)
+
+    def open_plot_view(self):
+        # dense plots of every channel in their own window, sharing the
+        # robot's data with this one
+        return PlotView(self.robot, self.robot.get_plot_channels(),
+                        num_columns=3, dock_layout=self.dock_layout)
+
+    def sample_memory(self):
+        with TRACER.span('TelemetryGUI.sample_memory'):
+            self.robot.memory.sample()
+        self.memory_overlay.refresh()
+
+    def update_export_status(self):
+        job = self.robot.export_queue.get_latest_job()
+        if job != None:
+            self.export_status_label.setText(job.get_status_text())
+
+    def update_battery_forecast(self):
+        forecast = self.robot.battery_forecast
+        self.time_left_label.setText(
+            format_remaining(forecast.get_remaining_seconds()))
+
+        # consumption over the forecast window and where it runs out
+        self.forecast_graph.clear()
+        samples = forecast.get_window_samples()
+        if len(samples) == 0:
+            return
+        seconds, consumption = zip(*samples)
+        self.forecast_graph.plot(seconds, consumption,
+                                 pen=pg.mkPen('k', width=1))
+        empty_time = forecast.get_empty_time()
+        max_x = seconds[-1]
+        if empty_time != None:
+            self.forecast_graph.plot([seconds[-1], empty_time],
+                                     [consumption[-1], forecast.capacity],
+                                     pen=pg.mkPen('r', width=1, style=Qt.DashLine))
+            self.forecast_graph.plot([empty_time], [forecast.capacity], pen=None,
+                                     symbol='x', symbolPen='r', symbolBrush='r')
+            max_x = empty_time
+        self.forecast_graph.getPlotItem().getViewBox().setRange(
+            xRange=(seconds[0], max_x), yRange=(0, forecast.capacity))
 
     def start_recording(self):
         self.timer.timeout.connect(self.update_gui)
@@ -575,26 +1443,85 @@ class TelemetryGUI(QWidget):
 
     def resume_recording(self):
         self.stop_button.clicked.disconnect()
-        self.start_recording()
+        self.stop_button.clicked.connect(self.pause_recording)
+        self.robot.start_segment(self.segment_name_edit.text())
+        self.segment_name_edit.clear()
+        self.recording = True
+        self.stop_button.setText("Pause recording")
+        self.update_jump_dropdown()
 
     def pause_recording(self):
-        self.timer.timeout.disconnect()
+        # the plots stay live, incoming frames are dropped by the robot
+        self.robot.pause()
         self.stop_button.clicked.disconnect()
         self.stop_button.clicked.connect(self.resume_recording)
         self.recording = False
         self.stop_button.setText("Resume recording")
+        self.update_jump_dropdown()
+
+    def new_segment(self):
+        if not self.recording:
+            self.resume_recording()
+            return
+        self.robot.start_segment(self.segment_name_edit.text())
+        self.segment_name_edit.clear()
+        self.update_jump_dropdown()
+
+    def add_bookmark(self):
+        self.robot.add_bookmark(self.segment_name_edit.text())
+        self.segment_name_edit.clear()
+        self.update_jump_dropdown()
+
+    def update_jump_dropdown(self):
+        session_index = self.robot.session_index
+        self.jump_dropdown.blockSignals(True)
+        self.jump_dropdown.clear()
+        self.jump_dropdown.addItem(LIVE_VIEW)
+        self.jump_dropdown.addItems(
+            [item.name for item in session_index.segments + session_index.bookmarks])
+        self.jump_dropdown.blockSignals(False)
+        self.robot.jump_to(None)
+
+    def jump_to(self, name):
+        self.robot.jump_to(None if name == LIVE_VIEW else name)
+
+    def export_segment(self):
+        segment = self.robot.session_index.find(self.jump_dropdown.currentText())
+        if segment != None:
+            self.robot.export_to_csv(
+                formats=EXPORT_OPTIONS[self.export_format_dropdown.currentText()], segment=segment)
 
     def clear_recording(self):
         if self.should_auto_save:
             self.robot.export_to_csv(True)
         self.robot.clear_data()
+        self.update_jump_dropdown()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F3:
+            self.latency_overlay.toggle()
+        elif event.key() == Qt.Key_F4 and TRACER.enabled:
+            TRACER.dump()
+        elif event.key() == Qt.Key_F5:
+            self.memory_overlay.toggle()
+        else:
+            super().keyPressEvent(event)
 
     def closeEvent(self, event):
+        for view in list(self.robot.views):
+            view.close()
         if self.should_auto_save:
             self.robot.export_to_csv(True)
+        self.robot.close_spill()
+        if self.robot.api_server != None:
+            self.robot.api_server.stop()
 
 
 if __name__ == '__main__':
+    is_headless = HEADLESS_ARG in sys.argv[1:]
+    if is_headless:
+        # the measurements still build their widgets
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
     app = QApplication(sys.argv)
 
     escs = [
@@ -604,7 +1531,8 @@ if __name__ == '__main__':
             Measurement(CURRENT, 0, 30),
             Measurement(CONSUMPTION, 0, 3000),
             Measurement(VOLTAGE, 5, 28, False),
-            Measurement(INPUT_SIGNAL, 0, 100, False)
+            Measurement(INPUT_SIGNAL, 0, 100, False),
+            *get_derived_esc_measurements()
         ], active=False),
         ESC(DRIVE_ESC_2, [
             TemperatureMeasurement(TEMP, 25, 100),
@@ -612,7 +1540,8 @@ if __name__ == '__main__':
             Measurement(CURRENT, 0, 30),
             Measurement(CONSUMPTION, 0, 3000),
             Measurement(VOLTAGE, 5, 28, False),
-            Measurement(INPUT_SIGNAL, 0, 100, False)
+            Measurement(INPUT_SIGNAL, 0, 100, False),
+            *get_derived_esc_measurements()
         ], active=False),
         ESC(WEAPON_ESC, [
             TemperatureMeasurement(TEMP, 25, 100),
@@ -620,7 +1549,8 @@ if __name__ == '__main__':
             Measurement(CURRENT, 0, 100),
             Measurement(CONSUMPTION, 0, 3000),
             Measurement(VOLTAGE, 5, 28, False),
-            Measurement(INPUT_SIGNAL, 0, 100, False)
+            Measurement(INPUT_SIGNAL, 0, 100, False),
+            *get_derived_esc_measurements()
         ], active=True),
         ESC(ARM_ESC, [
             TemperatureMeasurement(TEMP, 25, 100),
@@ -628,14 +1558,36 @@ if __name__ == '__main__':
             Measurement(CURRENT, 0, 100),
             Measurement(CONSUMPTION, 0, 3000),
             Measurement(VOLTAGE, 5, 28, False),
-            Measurement(INPUT_SIGNAL, 0, 100, False)
+            Measurement(INPUT_SIGNAL, 0, 100, False),
+            *get_derived_esc_measurements()
         ], active=False)
     ]
 
-    ports = list_ports.comports()
-    avian = Robot('Colossal Avian', escs,
-                  ports[0].name if len(ports) > 0 else None)
-
-    window = TelemetryGUI(avian)
-    window.showMaximized()
+    if SIMULATE_ARG in sys.argv[1:]:
+        from serial_simulator import SerialSimulator
+        simulator = SerialSimulator()
+        simulator.start()
+        port_name = simulator.port_name
+    else:
+        ports = list_ports.comports()
+        port_name = ports[0].name if len(ports) > 0 else None
+    avian = Robot('Colossal Avian', escs, port_name,
+                  RetentionPolicy(run_length=SLOW_MEASUREMENTS))
+
+    avian.api_server = start_from_env()
+
+    if is_headless:
+        def sample_memory():
+            print(avian.memory.sample().get_summary())
+        memory_timer = QTimer()
+        memory_timer.timeout.connect(sample_memory)
+        memory_timer.start(MEMORY_INTERVAL_MS)
+        # Qt does not see Ctrl+C, python handles it whenever the timer runs
+        signal.signal(signal.SIGINT, lambda *args: app.quit())
+        app.aboutToQuit.connect(avian.close_spill)
+        if avian.api_server != None:
+            app.aboutToQuit.connect(avian.api_server.stop)
+    else:
+        window = TelemetryGUI(avian)
+        window.showMaximized()
     sys.exit(app.exec_())
@@ -1,15 +1,30 @@
+import os
+import signal
 import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QComboBox
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal
+from PyQt5.QtCore import QTimer, QThread, pyqtSignal, Qt
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
 import pyqtgraph as pg
-import csv
-import serial
 from serial.tools import list_ports
-from datetime import datetime
+from datetime import datetime, timedelta
+from bisect import bisect_left
 import random
+import threading
+import time
+
+from retention import RetentionPolicy, SpillSegment, RawSpill, summarize
+from alarm_rules import create_alarm_rule
+from framing import FrameParser, parse_frame
+from battery_forecast import BatteryForecast, format_remaining
+from latency import LatencyTracker, LatencyOverlay
+from link_quality import LinkQuality, LinkQualityLabel, spread_capture_times
+from tracing import TRACER, traced
+from export_jobs import ExportQueue, ExportSnapshot, CSV, RAW
+from time_axis import PLOT_WINDOW_SECONDS, get_window, get_live_range, break_gaps
+from serial_connection import SerialConnection, PortDropdown, CONNECTED
+from memory import MemoryMonitor, MemoryOverlay, MEMORY_HEADERS, DEFAULT_BUDGET, LOG_SUFFIX
 
 # font styles
 font_family = 'Bahnschrift'
@@ -36,52 +51,129 @@ TOTAL_CURRENT = 'Total Current'
 TOTAL_CONSUMPTION = 'Total Consumption'
 SIGNAL_STRENGTH = 'Signal Strength'
 
+# the memory report is sampled this often, see memory.py
+MEMORY_INTERVAL_MS = 10000
+# no window, only recording and the memory report: python telemetry_graphs.py headless
+HEADLESS_ARG = 'headless'
+
 
 class SerialReaderThread(QThread):
-    new_data = pyqtSignal(str)
-    timestamps = []
-    raw_data = []
+    # line, its parsed values, capture time and emit time (time.perf_counter)
+    new_data = pyqtSignal(str, object, float, float)
+    # connection state, see serial_connection.py
+    connection_changed = pyqtSignal(str)
 
-    def __init__(self, port, parent=None):
+    def __init__(self, port, retention=None, parent=None):
         super().__init__(parent)
-        self.baudrate = 115200
-        self.serial_port = serial.Serial(port, self.baudrate)
-        self.serial_port.flushInput()
+        self.timestamps = []
+        self.raw_data = []
+        self.retention = retention if retention != None else RetentionPolicy()
+        self.raw_spill = None
+        self.raw_lock = threading.Lock()
+        self.start_time = datetime.now()
+        self.connection = SerialConnection(port)
+        self.connection.on_state_change = self.on_state_change
+        # capture time of the last frame, the next read's frames are spread
+        # after it
+        self.last_frame_time = None
+        self.frame_parser = FrameParser()
+
+    def on_state_change(self, state):
+        # frames after an outage are not spread over it
+        self.last_frame_time = None
+        self.connection_changed.emit(state)
 
     def set_port(self, port):
-        self.serial_port = serial.Serial(port, self.baudrate)
-        self.serial_port.flushInput()
+        # switched by the reader thread before its next read
+        self.connection.set_port(port)
 
     def run(self):
+        # QThreads show up as Dummy-n otherwise
+        threading.current_thread().name = 'SerialReaderThread'
         while True:
-            if self.serial_port.in_waiting:
-                line = self.serial_port.readline().decode().strip()
-                self.new_data.emit(line)
-                now = datetime.now()
+            # waits for data, or reconnects while the port is down
+            data = self.connection.read()
+            if len(data) > 0:
+                with TRACER.span('SerialReaderThread.read'):
+                    self.read_lines(data)
+
+    def read_lines(self, data):
+        capture_time = time.perf_counter()
+        now = datetime.now()
+        lines = self.frame_parser.feed(data)
+        capture_times = iter(self.get_capture_times(lines, capture_time))
+        for line, values in lines:
+            if values != None:
+                self.new_data.emit(line, values, next(capture_times), time.perf_counter())
+            with self.raw_lock:
                 self.timestamps.append(now)
                 self.raw_data.append(line)
-                now_str = f"{now.strftime('%H_%M_%S.')}{round(now.microsecond / 10000):02d}"
-                print(now_str, line)
+                if len(self.raw_data) % self.retention.summary_bucket_size == 0:
+                    self.spill_raw_data(now)
+            now_str = f"{now.strftime('%H_%M_%S.')}{round(now.microsecond / 10000):02d}"
+            print(now_str, line)
+
+    def get_capture_times(self, lines, capture_time):
+        # one per valid frame, a read often holds several
+        num_frames = sum(values != None for _, values in lines)
+        capture_times = spread_capture_times(self.last_frame_time, capture_time, num_frames)
+        if num_frames > 0:
+            self.last_frame_time = capture_time
+        return capture_times
+
+    def spill_raw_data(self, now):
+        cutoff = now - timedelta(seconds=self.retention.hot_window_seconds)
+        num_spilled = bisect_left(self.timestamps, cutoff)
+        if num_spilled == 0:
+            return
 
-    def export_raw_data(self):
-        now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-        file_name = f"avian_data_{now}_raw.csv"
-        with open(file_name, "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerows(self.raw_data)
+        if self.raw_spill == None:
+            self.raw_spill = RawSpill(self.retention.get_spill_file_name(
+                'avian', self.start_time, 'raw.txt'))
+        self.raw_spill.append_lines(
+            self.timestamps[:num_spilled], self.raw_data[:num_spilled])
+        del self.timestamps[:num_spilled]
+        del self.raw_data[:num_spilled]
+
+    def get_raw_snapshot(self):
+        # spilled lines are read later by the export job, without the lock
+        with self.raw_lock:
+            raw_spill = None if self.raw_spill == None else self.raw_spill.get_snapshot()
+            return raw_spill, list(self.raw_data)
+
+    def clear_raw_data(self):
+        with self.raw_lock:
+            self.timestamps = []
+            self.raw_data = []
+            if self.raw_spill != None:
+                self.raw_spill.close()
+                self.raw_spill = None
 
 
 class Avian():
-    def __init__(self, serial_port):
+    def __init__(self, serial_port, battery_capacity=3000, battery_cutoff_voltage=19.8,
+                 retention=None):
+        # older rows are spilled to disk and plotted as min/max summaries,
+        # see retention.py
+        self.retention = retention if retention != None else RetentionPolicy()
+        self.spill: SpillSegment = None
+        self.latency = LatencyTracker()
+        self.link_quality = LinkQuality()
+        self.export_queue = ExportQueue()
         if serial_port != None:
-            self.serial_reader = SerialReaderThread(serial_port)
-            self.serial_reader.new_data.connect(self.handle_data)
-            self.serial_reader.start()
+            self.start_serial_reader(serial_port)
 
         self.data_timestamps = []
         self.seconds_since_start = []
         self.start_time = datetime.now()
 
+        self.battery_capacity = battery_capacity
+        self.battery_forecast = BatteryForecast(
+            battery_capacity, battery_cutoff_voltage)
+        # mAh drawn by the weapon and arm ESCs, integrated from their current
+        # since they do not report consumption
+        self.integrated_consumption = 0.0
+
         self.esc_names = [DRIVE_ESC_1, DRIVE_ESC_2, WEAPON_ESC, ARM_ESC]
         self.esc_measurement_names = [TEMP, RPM, CURRENT, CONSUMPTION, VOLTAGE]
         self.esc_measurement_units = ["°C", "", "A", "mAh", "V"]
@@ -96,6 +188,8 @@ class Avian():
             for measurement_name in self.esc_measurement_names:
                 this_esc_data[measurement_name] = {
                     'values': [],
+                    'summary_x': [],
+                    'summary_values': [],
                     'min': None,
                     'max': None,
                 }
@@ -108,10 +202,65 @@ class Avian():
         for measurement_name in self.robot_measurement_names:
             self.general_data[measurement_name] = {
                 'values': [],
+                'summary_x': [],
+                'summary_values': [],
                 'min': None,
                 'max': None,
             }
 
+        self.memory = MemoryMonitor(DEFAULT_BUDGET, log_file=(
+            f"avian_data_{self.start_time.strftime('%Y_%m_%d_%H_%M_%S')}{LOG_SUFFIX}"))
+        self.add_memory_sources()
+
+    def add_memory_sources(self):
+        memory = self.memory
+        hot_window = self.retention.hot_window_seconds
+        memory.add_source('measurements', lambda: {
+            name: obj['values'] for name, obj in self.get_named_measurement_objs()},
+            per_channel=True, window_seconds=hot_window)
+        # the min/max summaries of spilled rows grow with the session
+        memory.add_source('summaries', lambda: {
+            name: (obj['summary_x'], obj['summary_values'])
+            for name, obj in self.get_named_measurement_objs()},
+            per_channel=True, grows=True)
+        memory.add_source('timestamps', lambda: (self.data_timestamps, self.seconds_since_start),
+                          window_seconds=hot_window)
+        memory.add_source('serial raw', lambda: (
+            self.serial_reader.timestamps, self.serial_reader.raw_data)
+            if hasattr(self, 'serial_reader') else (), window_seconds=hot_window)
+        memory.add_source('battery', lambda: self.battery_forecast,
+                          window_seconds=self.battery_forecast.consumption.window_seconds)
+        memory.add_source('latency', lambda: self.latency)
+        memory.add_source('link quality', lambda: self.link_quality)
+        memory.add_source('export jobs', lambda: self.export_queue.jobs)
+        memory.add_source('tracing', lambda: TRACER.buffer)
+        memory.add_counter('export jobs', lambda: len(self.export_queue.jobs))
+
+    def start_serial_reader(self, port):
+        self.serial_reader = SerialReaderThread(port, self.retention)
+        self.serial_reader.new_data.connect(self.handle_data)
+        self.serial_reader.connection_changed.connect(self.on_connection_changed)
+        self.serial_reader.start()
+
+    def set_port(self, port):
+        # the reader and all data are kept, only the port changes
+        if hasattr(self, 'serial_reader'):
+            self.serial_reader.set_port(port)
+        else:
+            self.start_serial_reader(port)
+
+    def on_connection_changed(self, state):
+        if state == CONNECTED:
+            self.link_quality.restart()
+
+    def get_connection(self):
+        return self.serial_reader.connection if hasattr(self, 'serial_reader') else None
+
+    def get_connection_status(self):
+        if not hasattr(self, 'serial_reader'):
+            return "No port"
+        return self.serial_reader.connection.get_status_text()
+
     def get_esc_names(self):
         return self.esc_names
 
@@ -139,8 +288,32 @@ class Avian():
     def get_all_values(self, measurement, esc=None):
         return self.get_measurement_obj(measurement, esc)['values']
 
-    def get_last_n_values(self, measurement, n, esc=None):
-        return self.get_measurement_obj(measurement, esc)['values'][-n:]
+    def get_named_measurement_objs(self):
+        # (column name, measurement obj) in the exported column order, which
+        # is also the spilled one
+        return [(f"{esc} {measurement}", self.get_measurement_obj(measurement, esc))
+                for esc in self.get_esc_names()
+                for measurement in self.get_esc_measurement_names()] + [
+            (measurement, self.get_measurement_obj(measurement))
+            for measurement in self.robot_measurement_names]
+
+    def get_all_measurement_objs(self):
+        return [obj for _, obj in self.get_named_measurement_objs()]
+
+    def get_window_values(self, measurement, window_seconds=None, esc=None):
+        # (seconds, values) of the last window_seconds, or all of them with
+        # the spilled ones as min/max summaries
+        obj = self.get_measurement_obj(measurement, esc)
+        values = obj['values']
+        seconds = self.seconds_since_start
+        num_values = min(len(values), len(seconds))
+        if window_seconds == None:
+            return (obj['summary_x'] + seconds[:num_values],
+                    obj['summary_values'] + values[:num_values])
+        # only the window is copied, a channel can lag the timestamps
+        first, last = get_window(
+            seconds, *get_live_range(seconds, window_seconds, num_values), num_values)
+        return seconds[first:last], values[first:last]
 
     def get_current_value(self, measurement, esc=None):
         values = self.get_measurement_obj(measurement, esc)['values']
@@ -176,42 +349,26 @@ class Avian():
         if max_value == None or value > max_value:
             obj['max'] = value
 
-    def export_to_csv(self):
+    @traced('Avian.export_to_csv')
+    def export_to_csv(self, formats=(CSV, RAW)):
+        # snapshot here, the files are written by a background job
         timestamp = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-        # TODO: add column for seconds since start
-        csv_data = []
-
-        headers = ['Timestamp', 'Seconds from start']
-        for esc in self.get_esc_names():
-            for measurement in self.get_esc_measurement_names():
-                headers.append(f"{esc} {measurement}")
-        for measurement in self.robot_measurement_names:
-            headers.append(measurement)
-        csv_data.append(headers)
-
-        # one row per timestamp
-        for i in range(len(self.data_timestamps)):
-            data_row = [self.data_timestamps[i].strftime(
-                '%H_%M_%S_%f'), self.seconds_since_start[i]]
-            for esc in self.get_esc_names():
-                for measurement in self.get_esc_measurement_names():
-                    all_values = self.get_all_values(measurement, esc)
-                    data_row.append(all_values[i] if len(
-                        all_values) > i else None)
-
-            for measurement in self.robot_measurement_names:
-                all_values = self.get_all_values(measurement)
-                data_row.append(all_values[i] if len(
-                    all_values) > i else None)
-            csv_data.append(data_row)
-
-        file_name = f"avian_data_{timestamp}.csv"
-        with open(file_name, "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerows(csv_data)
 
+        named_objs = self.get_named_measurement_objs()
+        headers = [name for name, _ in named_objs]
+        columns = [list(obj['values']) for _, obj in named_objs]
+
+        snapshot = ExportSnapshot(f"avian_data_{timestamp}.csv", self.start_time, headers,
+                                  list(self.data_timestamps), columns,
+                                  None if self.spill == None else self.spill.get_snapshot(),
+                                  missing_value=None)
+        snapshot.latency = self.latency.get_snapshot()
+        snapshot.link_quality = self.link_quality.get_snapshot()
+        snapshot.memory_rows = [MEMORY_HEADERS] + self.memory.get_rows()
         if hasattr(self, 'serial_reader'):
-            self.serial_reader.export_raw_data()
+            snapshot.set_raw(*self.serial_reader.get_raw_snapshot())
+            snapshot.connection_rows = self.serial_reader.connection.get_rows()
+        return self.export_queue.submit(snapshot, list(formats))
 
     def print_data(self):
         print(self.data)
@@ -225,12 +382,51 @@ class Avian():
         self.seconds_since_start.append(seconds_since_start)
         return now_timestamp
 
-    def handle_data(self, data):
-        if (not "Data:" in data):
+    def apply_retention(self, now):
+        # spill whole summary buckets of rows older than the hot window
+        bucket_size = self.retention.summary_bucket_size
+        cutoff = now - timedelta(seconds=self.retention.hot_window_seconds)
+        num_old = bisect_left(self.data_timestamps, cutoff)
+        num_spilled = num_old - num_old % bucket_size
+        if num_spilled == 0:
             return
 
+        objs = self.get_all_measurement_objs()
+        if self.spill == None:
+            self.spill = SpillSegment(self.retention.get_spill_file_name(
+                'avian', self.start_time, 'bin'), len(objs))
+        self.spill.append_rows(self.data_timestamps[:num_spilled],
+                               [obj['values'] for obj in objs])
+        seconds = self.seconds_since_start[:num_spilled]
+        for obj in objs:
+            spilled_values = obj['values'][:num_spilled]
+            if len(spilled_values) > 0:
+                summary_x, summary_values = summarize(spilled_values, bucket_size)
+                obj['summary_x'].extend(seconds[x] for x in summary_x)
+                obj['summary_values'].extend(summary_values)
+            del obj['values'][:num_spilled]
+        del self.data_timestamps[:num_spilled]
+        del self.seconds_since_start[:num_spilled]
+
+    def close_spill(self):
+        if self.spill != None:
+            self.spill.close()
+            self.spill = None
+        if hasattr(self, 'serial_reader'):
+            self.serial_reader.clear_raw_data()
+
+    @traced('Avian.handle_data')
+    def handle_data(self, data, data_array=None, capture_time=None, emit_time=None):
+        received_time = time.perf_counter()
+        # the reader parsed its lines already
+        if data_array == None:
+            data_array = parse_frame(data)
+        if data_array == None:
+            return
+        if capture_time != None:
+            self.link_quality.add_frame(capture_time, data_array[34])
+
         now_timestamp = self.add_timestamps()
-        data_array = list(map(lambda str: int(str), data.split()[1:]))
         split_data = {
             DRIVE_ESC_1: data_array[0:9],  # first 9
             DRIVE_ESC_2: data_array[9:18],  # next 9
@@ -269,6 +465,7 @@ class Avian():
                     esc_data[6], esc_data[7]) / scale_val * 20416.66 / 7)
             }
 
+        decoded_time = time.perf_counter()
         for esc in parsed_esc_data:
             for measurement in parsed_esc_data[esc]:
                 parsed_esc_data[esc][measurement] = round(
@@ -289,18 +486,37 @@ class Avian():
                 measurement, round(parsed_robot_data[measurement], 2)
             )
 
+        self.battery_forecast.add_sample(
+            self.seconds_since_start[-1],
+            self.get_forecast_consumption(parsed_esc_data),
+            self.get_current_value(BATTERY_VOLTAGE))
+        if capture_time != None:
+            self.latency.record_frame(capture_time, emit_time, received_time,
+                                      decoded_time, time.perf_counter())
+        self.apply_retention(now_timestamp)
+
+    def get_forecast_consumption(self, parsed_esc_data):
+        # the drive ESCs' own counters plus the integrated weapon and arm
+        # current, so the forecast sees the whole drain
+        if len(self.seconds_since_start) > 1:
+            delta_time_hours = (
+                self.seconds_since_start[-1] - self.seconds_since_start[-2]) / 3600
+            self.integrated_consumption += sum(
+                parsed_esc_data[esc][CURRENT] for esc in [WEAPON_ESC, ARM_ESC]
+            ) * 1000 * delta_time_hours
+        return sum(parsed_esc_data[esc][CONSUMPTION]
+                   for esc in [DRIVE_ESC_1, DRIVE_ESC_2]) + self.integrated_consumption
+
 
 class TelemetryGUI(QWidget):
     def __init__(self):
         super().__init__()
-        self.com_port_dropdown = QComboBox()
-        ports = list_ports.comports()
-        self.port_names = list(map(lambda port: port.name, ports))
-        self.com_port_dropdown.addItems(self.port_names)
+        self.com_port_dropdown = PortDropdown()
+        port_names = self.com_port_dropdown.port_names
 
-        if len(self.port_names) > 0:
-            self.avian = Avian(self.port_names[0])
-            print(f"PORT {self.port_names[0]}")
+        if len(port_names) > 0:
+            self.avian = Avian(port_names[0])
+            print(f"PORT {port_names[0]}")
         else:
             self.avian = Avian(None)
             print("NO PORTS")
@@ -310,14 +526,13 @@ class TelemetryGUI(QWidget):
 
         # OPTIONS
         self.should_show_plots = True
-        self.num_values_to_plot = 50
+        self.plot_window_seconds = PLOT_WINDOW_SECONDS
 
         self.initialize_gui()
 
-    # TODO: hook up properly
     def on_select_port(self, index):
-        selected_port = self.port_names[index]
-        self.avian = Avian(selected_port)
+        # same Avian, so the history and the plots carry on
+        self.avian.set_port(self.com_port_dropdown.port_names[index])
 
     def initialize_gui(self):
         self.main_layout = QHBoxLayout()
@@ -379,6 +594,8 @@ class TelemetryGUI(QWidget):
         self.total_consumption_label = self.create_measurement_display(
             robot_column, SIGNAL_STRENGTH, 'dBm'
         )
+        self.link_quality_label = LinkQualityLabel(self.avian.link_quality)
+        robot_column.addWidget(self.link_quality_label)
 
         # TODO: add clear data button
 
@@ -386,10 +603,15 @@ class TelemetryGUI(QWidget):
         dropdown_title.setFont(measurement_font)
         robot_column.addWidget(dropdown_title)
         robot_column.addWidget(self.com_port_dropdown)
+        self.com_port_dropdown.activated.connect(self.on_select_port)
+        self.connection_label = QLabel(self.avian.get_connection_status())
+        robot_column.addWidget(self.connection_label)
 
         export_button = QPushButton("Export to CSV")
-        export_button.clicked.connect(self.avian.export_to_csv)
+        export_button.clicked.connect(lambda: self.avian.export_to_csv())
         robot_column.addWidget(export_button)
+        self.export_status_label = QLabel("")
+        robot_column.addWidget(self.export_status_label)
 
         # flex
         self.main_layout.setStretch(0, 8)
@@ -398,11 +620,24 @@ class TelemetryGUI(QWidget):
         self.setWindowTitle('Colossal Avian')
         self.setGeometry(100, 100, 500, 300)
 
+        self.latency_overlay = LatencyOverlay(self.avian.latency, self)
+        self.memory_overlay = MemoryOverlay(self.avian.memory, self)
+
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_gui)
         self.timer.start(100)
 
+        self.memory_timer = QTimer()
+        self.memory_timer.timeout.connect(self.sample_memory)
+        self.memory_timer.start(MEMORY_INTERVAL_MS)
+
     def update_gui(self):
+        start = time.perf_counter()
+        with TRACER.span('TelemetryGUI.update_gui'):
+            self.update_displays()
+        TRACER.check_frame(time.perf_counter() - start)
+
+    def update_displays(self):
         if (self.use_fake_data):
             self.avian.add_timestamps()
             for measurement in self.avian.get_robot_measurement_names():
@@ -414,6 +649,7 @@ class TelemetryGUI(QWidget):
                 for measurement in self.avian.get_displayed_esc_measurement_names():
                     self.avian.add_value(
                         measurement, random.randint(0, 100), esc)
+            self.avian.apply_retention(self.avian.data_timestamps[-1])
 
         # update labels and plots
         for measurement in self.avian.get_robot_measurement_names():
@@ -421,6 +657,29 @@ class TelemetryGUI(QWidget):
         for esc in self.avian.get_active_esc_names():
             for measurement in self.avian.get_displayed_esc_measurement_names():
                 self.update_label_and_plot(measurement, esc)
+        self.avian.latency.record_paint()
+        self.latency_overlay.refresh()
+        self.link_quality_label.refresh()
+        self.connection_label.setText(self.avian.get_connection_status())
+        self.com_port_dropdown.refresh_on_attempt(self.avian.get_connection())
+        job = self.avian.export_queue.get_latest_job()
+        if job != None:
+            self.export_status_label.setText(job.get_status_text())
+
+    def sample_memory(self):
+        with TRACER.span('TelemetryGUI.sample_memory'):
+            self.avian.memory.sample()
+        self.memory_overlay.refresh()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F3:
+            self.latency_overlay.toggle()
+        elif event.key() == Qt.Key_F4 and TRACER.enabled:
+            TRACER.dump()
+        elif event.key() == Qt.Key_F5:
+            self.memory_overlay.toggle()
+        else:
+            super().keyPressEvent(event)
 
     def create_measurement_display(self, layout, measurement, units, esc=None):
         name_label = QLabel(measurement)
@@ -453,8 +712,16 @@ class TelemetryGUI(QWidget):
         else:
             plot = None
 
+        alarm_rule = create_alarm_rule(measurement)
+        if alarm_rule != None:
+            def on_alarm_level(level, escalated):
+                value_label.setStyleSheet(level.get_label_style())
+                if escalated and level.alert:
+                    QApplication.beep()
+            alarm_rule.add_action(on_alarm_level)
+
         display_data = {'value_label': value_label, 'units': units, 'min_max_label': min_max_label,
-                        'plot': plot, 'data': data}
+                        'plot': plot, 'data': data, 'alarm_rule': alarm_rule}
         if esc == None:
             self.displayed_data[measurement] = display_data
         else:
@@ -468,24 +735,18 @@ class TelemetryGUI(QWidget):
         value_text = f"{str(value)} {obj['units']}"
         min_max_text = f"{str(self.avian.get_min_value(measurement, esc))} | {str(self.avian.get_max_value(measurement, esc))}"
 
+        # styles only change when the alarm rule changes level
+        if obj['alarm_rule'] != None:
+            obj['alarm_rule'].evaluate(value)
+
         if esc == None:
             self.displayed_data[measurement]['value_label'].setText(value_text)
             if measurement == TOTAL_CONSUMPTION and value != None:
-                percent = round(100 * value / 3000, 2)
+                percent = round(100 * value / self.avian.battery_capacity, 2)
+                time_left = format_remaining(
+                    self.avian.battery_forecast.get_remaining_seconds())
                 self.displayed_data[measurement]['value_label'].setText(
-                    f"{value_text} ({percent}%)"
-                )
-            elif measurement == SIGNAL_STRENGTH and value != None:
-                if value < -90:
-                    style_sheet = 'background-color: red;'
-                elif value < -80:
-                    style_sheet = 'background-color: orange;'
-                elif value < -70:
-                    style_sheet = 'background-color: yellow;'
-                else:
-                    style_sheet = 'color: black;'
-                self.displayed_data[measurement]['value_label'].setStyleSheet(
-                    style_sheet
+                    f"{value_text} ({percent}%, {time_left} left)"
                 )
 
             self.displayed_data[measurement]['min_max_label'].setText(
@@ -495,18 +756,6 @@ class TelemetryGUI(QWidget):
             self.displayed_data[esc][measurement]['value_label'].setText(
                 value_text
             )
-            if measurement == TEMP and value != None:
-                if value >= 85:
-                    style_sheet = 'background-color: red;'
-                elif value >= 75:
-                    style_sheet = 'background-color: orange;'
-                elif value >= 68:
-                    style_sheet = 'background-color: yellow;'
-                else:
-                    style_sheet = 'color: black;'
-                self.displayed_data[esc][measurement]['value_label'].setStyleSheet(
-                    style_sheet
-                )
 
             self.displayed_data[esc][measurement]['min_max_label'].setText(
                 min_max_text
@@ -518,34 +767,66 @@ class TelemetryGUI(QWidget):
         measurements_to_plot_all = [CONSUMPTION,
                                     BATTERY_VOLTAGE, TOTAL_CONSUMPTION, TEMP]
         if self.should_show_plots and measurement != SIGNAL_STRENGTH:
-            if measurement in measurements_to_plot_all:
-                data = self.avian.get_all_values(measurement, esc)
-            else:
-                data = self.avian.get_last_n_values(
-                    measurement, self.num_values_to_plot, esc
-                )
+            seconds, data = self.avian.get_window_values(
+                measurement,
+                None if measurement in measurements_to_plot_all else self.plot_window_seconds,
+                esc
+            )
+            # dropouts are drawn as breaks in the line
+            xs, ys = break_gaps(seconds, data)
 
             pen_options = pg.mkPen('k', width=1)
             if esc == None:
                 self.displayed_data[measurement]['data'] = data
                 self.displayed_data[measurement]['plot'].clear()
                 self.displayed_data[measurement]['plot'].plot(
-                    self.displayed_data[measurement]['data'],
-                    pen=pen_options
+                    xs, ys, pen=pen_options, connect='finite'
                 )
+                if measurement == TOTAL_CONSUMPTION and len(data) > 0:
+                    self.plot_projected_drain(
+                        self.displayed_data[measurement]['plot'], seconds[-1], data[-1])
             else:
                 self.displayed_data[esc][measurement]['data'] = data
                 self.displayed_data[esc][measurement]['plot'].clear()
                 self.displayed_data[esc][measurement]['plot'].plot(
-                    self.displayed_data[esc][measurement]['data'],
-                    pen=pen_options
+                    xs, ys, pen=pen_options, connect='finite'
                 )
 
-    # def closeEvent(self, event):
-        # self.avian.export_to_csv()f
+    def plot_projected_drain(self, plot, last_seconds, last_consumption):
+        # dashed from the latest consumption to the capacity, ending with a
+        # cross where the forecast runs the battery out
+        forecast = self.avian.battery_forecast
+        empty_time = forecast.get_empty_time()
+        if empty_time == None:
+            return
+        plot.plot([last_seconds, empty_time], [last_consumption, forecast.capacity],
+                  pen=pg.mkPen('r', width=1, style=Qt.DashLine))
+        plot.plot([empty_time], [forecast.capacity], pen=None,
+                  symbol='x', symbolPen='r', symbolBrush='r')
+
+    def closeEvent(self, event):
+        # self.avian.export_to_csv()
+        self.avian.close_spill()
 
 
 if __name__ == '__main__':
+    if HEADLESS_ARG in sys.argv[1:]:
+        # records from the first port and prints the memory report
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        app = QApplication(sys.argv)
+        ports = list_ports.comports()
+        avian = Avian(ports[0].name if len(ports) > 0 else None)
+
+        def sample_memory():
+            print(avian.memory.sample().get_summary())
+        memory_timer = QTimer()
+        memory_timer.timeout.connect(sample_memory)
+        memory_timer.start(MEMORY_INTERVAL_MS)
+        # Qt does not see Ctrl+C, python handles it whenever the timer runs
+        signal.signal(signal.SIGINT, lambda *args: app.quit())
+        app.aboutToQuit.connect(avian.close_spill)
+        sys.exit(app.exec_())
+
     app = QApplication(sys.argv)
     window = TelemetryGUI()
     window.show()
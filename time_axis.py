@@ -0,0 +1,32 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# plots show the last this many seconds by default
+PLOT_WINDOW_SECONDS = 10
+# no sample for this long is a dropout and is drawn as a break in the line
+MAX_GAP_SECONDS = 0.5
+
+
+def get_window(seconds, min_seconds, max_seconds, hi=None):
+    # index range of the sorted seconds[:hi] inside the window, O(log n)
+    hi = len(seconds) if hi == None else hi
+    return bisect_left(seconds, min_seconds, 0, hi), bisect_right(seconds, max_seconds, 0, hi)
+
+
+def get_live_range(seconds, window_seconds=PLOT_WINDOW_SECONDS, hi=None):
+    # the window ending at seconds[hi - 1], the newest sample by default
+    hi = len(seconds) if hi == None else hi
+    last = seconds[hi - 1] if hi > 0 else 0
+    return last - window_seconds, last
+
+
+def break_gaps(xs, ys, max_gap=MAX_GAP_SECONDS):
+    # a NaN between samples further apart than max_gap, plotted with
+    # connect='finite' the line stops there instead of bridging the gap
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    gaps = np.flatnonzero(np.diff(xs) > max_gap) + 1
+    if len(gaps) == 0:
+        return xs, ys
+    return np.insert(xs, gaps, np.nan), np.insert(ys, gaps, np.nan)
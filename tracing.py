@@ -0,0 +1,120 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# tracing is decided once at startup so disabled builds pay nothing for
+# decorated functions, e.g. TELEMETRY_TRACE=1 python telemetry_bars.py
+TRACE_ENV = 'TELEMETRY_TRACE'
+# spans kept in memory, the oldest are overwritten
+BUFFER_SIZE = 100000
+# a GUI update slower than this dumps the buffer, at most every DUMP_INTERVAL
+SLOW_FRAME_SECONDS = 0.1
+DUMP_INTERVAL = 10
+
+
+class NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span():
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add(self.name, self.start,
+                        time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class Tracer():
+    def __init__(self, enabled=False, buffer_size=BUFFER_SIZE):
+        self.enabled = enabled
+        # deque appends are atomic, so the reader thread needs no lock
+        self.buffer = deque(maxlen=buffer_size)
+        self.thread_names = {}
+        self.last_dump = None
+
+    def span(self, name, **args):
+        return Span(self, name, args) if self.enabled else NULL_SPAN
+
+    def add(self, name, start_ns, duration_ns, args=None):
+        thread_id = threading.get_ident()
+        if not thread_id in self.thread_names:
+            self.thread_names[thread_id] = threading.current_thread().name
+        self.buffer.append((name, thread_id, start_ns, duration_ns, args))
+
+    def get_chrome_trace(self):
+        # complete ("X") events in microseconds, readable by chrome://tracing
+        # and ui.perfetto.dev
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id,
+                   'args': {'name': thread_name}}
+                  for thread_id, thread_name in list(self.thread_names.items())]
+        for name, thread_id, start_ns, duration_ns, args in list(self.buffer):
+            event = {'name': name, 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                     'ts': start_ns / 1000, 'dur': duration_ns / 1000}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, file_name=None):
+        if file_name == None:
+            now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+            file_name = f"trace_{now}.json"
+        with open(file_name, 'w') as trace_file:
+            json.dump(self.get_chrome_trace(), trace_file)
+        self.last_dump = time.monotonic()
+        print(f"TRACE {file_name}")
+        return file_name
+
+    def check_frame(self, seconds):
+        # keeps the spans leading up to a stutter
+        if not self.enabled or seconds < SLOW_FRAME_SECONDS:
+            return None
+        if self.last_dump != None and time.monotonic() - self.last_dump < DUMP_INTERVAL:
+            return None
+        now = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+        return self.dump(f"trace_{now}_slow.json")
+
+    def clear(self):
+        self.buffer.clear()
+
+
+TRACER = Tracer(os.environ.get(TRACE_ENV, '') not in ('', '0'))
+
+
+def traced(name, get_args=None):
+    # the function itself is returned when tracing is off. get_args maps the
+    # call arguments to the span's args, e.g. lambda self: {'name': self.name}
+    def decorator(function):
+        if not TRACER.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                TRACER.add(name, start, time.perf_counter_ns() - start,
+                           get_args(*args) if get_args != None else None)
+        return wrapper
+    return decorator
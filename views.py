@@ -0,0 +1,170 @@
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QComboBox
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import QTimer, Qt
+import pyqtgraph as pg
+
+from time_axis import PLOT_WINDOW_SECONDS, get_live_range
+from tracing import TRACER
+
+# view window choices, None shows everything recorded
+WINDOW_OPTIONS = {
+    '10 s': PLOT_WINDOW_SECONDS,
+    '30 s': 30,
+    '1 min': 60,
+    '5 min': 300,
+    'All': None,
+}
+REFRESH_MS = 200
+
+
+class ChannelPlot():
+    # one measurement in a view. the curves are kept and only their data
+    # changes, markers are only added for new events
+    def __init__(self, measurement, title):
+        self.measurement = measurement
+        self.graph = pg.PlotWidget(title=title)
+        pen = pg.mkPen('k', width=1)
+        self.marker_pen = pg.mkPen('r', width=1, style=Qt.DashLine)
+        self.summary_curve = self.graph.plot(pen=pen)
+        self.curve = self.graph.plot(pen=pen)
+        self.markers = {}
+        self.graph.getPlotItem().getViewBox().setYRange(
+            measurement.minimum, measurement.maximum)
+
+    def update(self, seconds, x_range):
+        summary, hot, events = self.measurement.get_plot_data(seconds, x_range)
+        if summary != None:
+            self.summary_curve.setData(*summary)
+        else:
+            self.summary_curve.clear()
+        if hot != None:
+            self.curve.setData(*hot, connect='finite')
+        else:
+            self.curve.clear()
+
+        shown = set(id(event) for event in events)
+        for key in [key for key in self.markers if key not in shown]:
+            self.graph.removeItem(self.markers.pop(key))
+        for event in events:
+            if id(event) not in self.markers:
+                marker = pg.InfiniteLine(event.time, pen=self.marker_pen, label=event.name)
+                self.markers[id(event)] = marker
+                self.graph.addItem(marker)
+        self.graph.getPlotItem().getViewBox().setXRange(*x_range, padding=0)
+
+
+class PlotView(QWidget):
+    # plots of some of a robot's measurements, read straight from its
+    # storage. each view has its own layout, refresh rate and time window and
+    # only reads the channels and samples it shows. with a dock_layout the
+    # view can move between its own window (e.g. on a second monitor) and
+    # that layout at runtime, closing it stops its timer.
+    def __init__(self, robot, channels, title='Plots', window_seconds=PLOT_WINDOW_SECONDS,
+                 refresh_ms=REFRESH_MS, num_columns=2, dock_layout=None, docked=False):
+        super().__init__()
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.robot = robot
+        self.window_seconds = window_seconds
+        self.dock_layout = dock_layout
+        self.setWindowTitle(f"{robot.name} {title}")
+        self.setStyleSheet("background-color: white;")
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.addLayout(self.get_header(title))
+
+        # channels are (esc name or None, measurement name)
+        self.plots: list[ChannelPlot] = []
+        grid = QGridLayout()
+        for esc_name, measurement_name in channels:
+            measurement = robot.get_measurement(esc_name, measurement_name)
+            if measurement == None:
+                continue
+            name = measurement_name if esc_name == None else f"{esc_name} {measurement_name}"
+            plot = ChannelPlot(measurement, f"{name} ({measurement.unit})")
+            grid.addWidget(plot.graph, len(self.plots) // num_columns,
+                           len(self.plots) % num_columns)
+            self.plots.append(plot)
+        layout.addLayout(grid)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+        robot.add_view(self)
+
+        if dock_layout != None and docked:
+            dock_layout.addWidget(self)
+        else:
+            self.show()
+        self.update_pop_out_button()
+
+    def get_header(self, title):
+        header = QHBoxLayout()
+        title_label = QLabel(title)
+        title_label.setFont(QFont('Bahnschrift', 14, QFont.Bold))
+        header.addWidget(title_label)
+
+        self.window_dropdown = QComboBox()
+        self.window_dropdown.addItems(WINDOW_OPTIONS.keys())
+        for name, seconds in WINDOW_OPTIONS.items():
+            if seconds == self.window_seconds:
+                self.window_dropdown.setCurrentText(name)
+        self.window_dropdown.currentTextChanged.connect(self.set_window)
+        header.addWidget(self.window_dropdown)
+
+        self.pop_out_button = QPushButton()
+        self.pop_out_button.clicked.connect(self.toggle_pop_out)
+        self.pop_out_button.setVisible(self.dock_layout != None)
+        header.addWidget(self.pop_out_button)
+
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        header.addWidget(close_button)
+        return header
+
+    def set_window(self, name):
+        self.window_seconds = WINDOW_OPTIONS[name]
+        self.refresh()
+
+    def set_refresh_rate(self, refresh_ms):
+        self.timer.start(refresh_ms)
+
+    def is_docked(self):
+        return self.parentWidget() != None
+
+    def toggle_pop_out(self):
+        if self.is_docked():
+            self.dock_layout.removeWidget(self)
+            self.setParent(None)
+            self.show()
+        else:
+            self.dock_layout.addWidget(self)
+        self.update_pop_out_button()
+
+    def update_pop_out_button(self):
+        self.pop_out_button.setText("Pop out" if self.is_docked() else "Dock")
+
+    def get_x_range(self):
+        seconds = self.robot.seconds
+        if self.window_seconds != None:
+            return get_live_range(seconds, self.window_seconds)
+        first = min([plot.measurement.summary_x[0] for plot in self.plots
+                     if len(plot.measurement.summary_x) > 0]
+                    + [seconds[0] if len(seconds) > 0 else 0])
+        return first, seconds[-1] if len(seconds) > 0 else 0
+
+    def refresh(self):
+        # hidden or minimized views cost nothing
+        if not self.isVisible() or self.window().isMinimized():
+            return
+        with TRACER.span('PlotView.refresh', title=self.windowTitle()):
+            x_range = self.get_x_range()
+            for plot in self.plots:
+                plot.update(self.robot.seconds, x_range)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.robot.remove_view(self)
+        if self.is_docked():
+            self.dock_layout.removeWidget(self)
+        super().closeEvent(event)